@@ -3,6 +3,12 @@ ASGI config for clmundo project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Solo lo usan las vistas async de conexión larga (streams SSE y long-polling
+de notificaciones): en producción el servicio ``web_events`` las sirve con
+``gunicorn -k uvicorn_worker.UvicornWorker clmundo.asgi:application`` y nginx
+enruta ahí /api/stream/ y /api/notifications/poll/. El resto de la app sigue
+en WSGI (clmundo/wsgi.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
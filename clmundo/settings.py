@@ -115,6 +115,10 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
+# Media files (vouchers QR pre-generados)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/'  # Cambiar a raíz
@@ -142,13 +146,48 @@ LOGGING = {
     },
 }
 
+# Cache local para desarrollo (en producción se usa Redis)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Celery - en desarrollo las tareas se ejecutan en el mismo proceso
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=True, cast=bool)
+CELERY_TIMEZONE = TIME_ZONE
+
+# Pub/sub de estados de segmentos para los streams SSE; sin URL se usa un
+# broker en memoria (solo sirve con un único proceso, p. ej. runserver)
+SEGMENT_EVENTS_REDIS_URL = config('SEGMENT_EVENTS_REDIS_URL', default='')
+
 # Google Maps API
 GOOGLE_MAPS_API_KEY = config('GOOGLE_MAPS_API_KEY', default='')
 
+# Cache de geocoding (segundos)
+GEOCODING_CACHE_TTL = config('GEOCODING_CACHE_TTL', default=60 * 60 * 24 * 30, cast=int)
+GEOCODING_NEGATIVE_TTL = config('GEOCODING_NEGATIVE_TTL', default=60 * 60 * 24, cast=int)
+GEOCODING_CACHE_SIZE = config('GEOCODING_CACHE_SIZE', default=2048, cast=int)
+
+# Cache de direcciones: grilla del origen (grados) y antigüedad máxima (segundos)
+DIRECTIONS_GRID_DEGREES = 0.001
+DIRECTIONS_MAX_AGE = config('DIRECTIONS_MAX_AGE', default=60 * 15, cast=int)
+
+# Cache de lugares cercanos por tiles geohash (segundos)
+PLACES_CACHE_TTL = config('PLACES_CACHE_TTL', default=60 * 60 * 24, cast=int)
+PLACES_STALE_TTL = config('PLACES_STALE_TTL', default=60 * 60 * 24 * 14, cast=int)
+PLACES_WARM_TYPES = ['restaurant', 'tourist_attraction']
+
 # WhatsApp Business API (usando Twilio)
 TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
 TWILIO_WHATSAPP_FROM = config('TWILIO_WHATSAPP_FROM', default='whatsapp:+14155238886')
+# Envío asíncrono: mensajes por segundo por número de origen y requests simultáneos
+WHATSAPP_SEND_RATE = config('WHATSAPP_SEND_RATE', default=10, cast=float)
+WHATSAPP_MAX_CONCURRENCY = config('WHATSAPP_MAX_CONCURRENCY', default=20, cast=int)
+# Número de WhatsApp del equipo que recibe las alertas de emergencia
+EMERGENCY_STAFF_WHATSAPP = config('EMERGENCY_STAFF_WHATSAPP', default='+56999990000')
 
 # Configuración de ubicaciones por defecto
 DEFAULT_LOCATION = {
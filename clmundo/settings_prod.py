@@ -4,6 +4,7 @@ Django settings for production deployment
 from pathlib import Path
 from decouple import config
 import dj_database_url
+from celery.schedules import crontab
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -185,13 +186,85 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
+# Colas: las emergencias tienen un worker reservado (-Q emergency); el worker
+# general también las consume cuando está libre. Los envíos a Twilio van a
+# "messaging" para no competir con las tareas de mantenimiento ("celery").
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_ROUTES = {
+    'travel.tasks.deliver_outbound_message': {'queue': 'messaging'},
+    'travel.tasks.deliver_notifications': {'queue': 'messaging'},
+    'travel.tasks.send_reminder_batch': {'queue': 'messaging'},
+    'travel.tasks.broadcast_whatsapp': {'queue': 'messaging'},
+    'travel.tasks.send_incident_notification_email': {'queue': 'messaging'},
+}
+# Un worker reserva solo la tarea que ejecuta: una emergencia no espera detrás
+# de tareas ya tomadas por un proceso ocupado
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Tareas periódicas (celery beat con su scheduler por defecto, que lee este dict)
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-unread-counters': {
+        'task': 'travel.tasks.reconcile_unread_counters',
+        'schedule': crontab(minute=30, hour=4),
+    },
+    # Rueda de recordatorios: cada vuelta encola los slots nuevos del horizonte
+    'reminder-time-wheel': {
+        'task': 'travel.tasks.schedule_reminders',
+        'schedule': crontab(minute='*/5'),
+    },
+    # Mensajes salientes trabados en 'sending' por un worker caído
+    'requeue-stale-outbound': {
+        'task': 'travel.tasks.requeue_stale_outbound_messages',
+        'schedule': crontab(minute='*/5'),
+    },
+}
+
+# Recordatorios: horas antes del servicio, tamaño del slot y horizonte de la rueda
+REMINDER_LEAD_HOURS = config('REMINDER_LEAD_HOURS', default=24, cast=int)
+REMINDER_SLOT_MINUTES = config('REMINDER_SLOT_MINUTES', default=5, cast=int)
+REMINDER_HORIZON_HOURS = config('REMINDER_HORIZON_HOURS', default=48, cast=int)
+# Las tareas con ETA de la rueda esperan hasta el horizonte: Redis no debe
+# reentregarlas antes (por defecto lo hace a la hora)
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': (REMINDER_HORIZON_HOURS + 1) * 3600}
+
+# Cache (Redis) - snapshots de cliente y resultados de APIs externas
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default='redis://redis:6379/1'),
+        'KEY_PREFIX': 'clmundo',
+    }
+}
+
+# Pub/sub de cambios de estado de segmentos (streams SSE)
+SEGMENT_EVENTS_REDIS_URL = config('SEGMENT_EVENTS_REDIS_URL', default='redis://redis:6379/2')
+
 # Google Maps API
 GOOGLE_MAPS_API_KEY = config('GOOGLE_MAPS_API_KEY', default='')
 
+# Cache de geocoding (segundos)
+GEOCODING_CACHE_TTL = config('GEOCODING_CACHE_TTL', default=60 * 60 * 24 * 30, cast=int)
+GEOCODING_NEGATIVE_TTL = config('GEOCODING_NEGATIVE_TTL', default=60 * 60 * 24, cast=int)
+GEOCODING_CACHE_SIZE = config('GEOCODING_CACHE_SIZE', default=2048, cast=int)
+
+# Cache de direcciones: grilla del origen (grados) y antigüedad máxima (segundos)
+DIRECTIONS_GRID_DEGREES = 0.001
+DIRECTIONS_MAX_AGE = config('DIRECTIONS_MAX_AGE', default=60 * 15, cast=int)
+
+# Cache de lugares cercanos por tiles geohash (segundos)
+PLACES_CACHE_TTL = config('PLACES_CACHE_TTL', default=60 * 60 * 24, cast=int)
+PLACES_STALE_TTL = config('PLACES_STALE_TTL', default=60 * 60 * 24 * 14, cast=int)
+PLACES_WARM_TYPES = ['restaurant', 'tourist_attraction']
+
 # WhatsApp Business API (usando Twilio)
 TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
 TWILIO_WHATSAPP_FROM = config('TWILIO_WHATSAPP_FROM', default='whatsapp:+14155238886')
+# Envío asíncrono: mensajes por segundo por número de origen y requests simultáneos
+WHATSAPP_SEND_RATE = config('WHATSAPP_SEND_RATE', default=10, cast=float)
+WHATSAPP_MAX_CONCURRENCY = config('WHATSAPP_MAX_CONCURRENCY', default=20, cast=int)
+# Número de WhatsApp del equipo que recibe las alertas de emergencia
+EMERGENCY_STAFF_WHATSAPP = config('EMERGENCY_STAFF_WHATSAPP', default='+56999990000')
 
 # Configuración de ubicaciones por defecto
 DEFAULT_LOCATION = {
@@ -1,16 +1,77 @@
 # travel/admin.py
 from django.contrib import admin
-from .models import Customer, Trip, Service, TripSegment, Incident, Notification
+from .models import Customer, Trip, Service, TripSegment, Incident, Notification, OutboundMessage
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.html import format_html
+from .snapshot import invalidate_customer_snapshot
+from .incident_stats import record_changes, STATE_FIELDS
+from .services import report_export
+from .paginators import EstimatedCountPaginator
+from django.db import transaction
+from django.utils.text import smart_split, unescape_string_literal
+
+class IndexedSearchMixin:
+    """Búsqueda y paginación del changelist pensadas para tablas grandes.
+
+    Cada campo de ``search_fields`` se busca en una rama propia y las ramas se
+    unen con UNION: así cada ``icontains`` filtra una sola tabla y puede usar
+    su índice trigram (migración 0012) en vez de un OR sobre todos los JOIN.
+    El conteo usa la estimación de PostgreSQL y no se calcula el total sin
+    filtros.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_fields = self.get_search_fields(request)
+        if not search_fields or not search_term:
+            return queryset, False
+
+        manager = self.model._default_manager
+        for term in smart_split(search_term):
+            if term.startswith(('"', "'")) and term[0] == term[-1]:
+                term = unescape_string_literal(term)
+            branches = [
+                manager.filter(**{f'{field}__icontains': term}).order_by().values('pk')
+                for field in search_fields
+            ]
+            queryset = queryset.filter(pk__in=branches[0].union(*branches[1:]))
+        # pk__in no duplica filas: no hace falta DISTINCT
+        return queryset, False
+
+class ExportActionsMixin:
+    """Acciones de exporte CSV/XLSX sobre la selección (o todo el filtro con "seleccionar todo")"""
+
+    @admin.action(description='Exportar a CSV')
+    def export_csv(self, request, queryset):
+        _, columns, name = report_export.EXPORTS[report_export.export_key(self.model)]
+        return report_export.csv_response(request, queryset, columns, name)
+
+    @admin.action(description='Exportar a Excel')
+    def export_xlsx(self, request, queryset):
+        # Con "seleccionar todo" se exporta el filtro completo; si no, solo la selección
+        ids = None
+        if request.POST.get('select_across') != '1':
+            ids = list(queryset.values_list('pk', flat=True))
+        token = report_export.start_xlsx_export(
+            request.user, report_export.export_key(self.model), dict(request.GET.lists()), ids
+        )
+        self.message_user(request, format_html(
+            'El Excel se está generando: <a href="{}">descargar</a> en unos momentos.',
+            reverse('staff_export_download', args=[token])
+        ))
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['user', 'phone', 'created_at']
+    list_select_related = ['user']
     search_fields = ['user__first_name', 'user__last_name', 'user__email']
 
 @admin.register(Trip)
-class TripAdmin(admin.ModelAdmin):
+class TripAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['customer', 'destination', 'start_date', 'end_date', 'status']
+    list_select_related = ['customer__user']
     list_filter = ['status', 'start_date', 'destination']
     search_fields = ['customer__user__first_name', 'customer__user__last_name', 'destination']
 
@@ -21,16 +82,41 @@ class ServiceAdmin(admin.ModelAdmin):
     search_fields = ['name', 'location']
 
 @admin.register(TripSegment)
-class TripSegmentAdmin(admin.ModelAdmin):
+class TripSegmentAdmin(IndexedSearchMixin, ExportActionsMixin, admin.ModelAdmin):
     list_display = ['trip', 'service', 'scheduled_datetime', 'status', 'voucher_code']
+    list_select_related = ['trip__customer__user', 'service']
     list_filter = ['status', 'service__service_type', 'scheduled_datetime']
     search_fields = ['trip__customer__user__first_name', 'service__name', 'voucher_code']
     date_hierarchy = 'scheduled_datetime'
+    actions = ['notify_delay_whatsapp', 'export_csv', 'export_xlsx']
+
+    def notify_delay_whatsapp(self, request, queryset):
+        from .tasks import broadcast_whatsapp
+        segment_ids = list(queryset.values_list('id', flat=True))
+        broadcast_whatsapp.delay(segment_ids, 'departure_delay')
+        self.message_user(request, f'Aviso de retraso enviándose a los pasajeros de {len(segment_ids)} servicios')
+    notify_delay_whatsapp.short_description = 'Avisar retraso por WhatsApp'
+
+class OverdueIncidentFilter(admin.SimpleListFilter):
+    """Vencidas según el SLA de su severidad, calculado en la BD"""
+    title = 'SLA'
+    parameter_name = 'sla'
+
+    def lookups(self, request, model_admin):
+        return [('overdue', 'Vencidas'), ('on_time', 'Dentro del SLA')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'overdue':
+            return queryset.filter(is_overdue=True)
+        if self.value() == 'on_time':
+            return queryset.filter(is_overdue=False)
+        return queryset
 
 @admin.register(Incident)
-class IncidentAdmin(admin.ModelAdmin):
-    list_display = ['id', 'title', 'segment', 'category', 'severity', 'status', 'reported_at', 'assigned_to', 'is_resolved']
-    list_filter = ['status', 'severity', 'category', 'reported_at', 'assigned_to']
+class IncidentAdmin(IndexedSearchMixin, ExportActionsMixin, admin.ModelAdmin):
+    list_display = ['id', 'title', 'segment', 'category', 'severity', 'status', 'reported_at', 'assigned_to', 'is_resolved', 'overdue']
+    list_select_related = ['segment__trip__customer__user', 'segment__service', 'assigned_to']
+    list_filter = [OverdueIncidentFilter, 'status', 'severity', 'category', 'reported_at', 'assigned_to']
     search_fields = ['title', 'description', 'segment__trip__customer__user__first_name', 
                     'segment__trip__customer__user__last_name']
     readonly_fields = ['reported_at', 'response_time']
@@ -54,13 +140,28 @@ class IncidentAdmin(admin.ModelAdmin):
         })
     )
     
-    actions = ['mark_resolved', 'assign_to_me', 'escalate_severity']
+    actions = ['mark_resolved', 'assign_to_me', 'escalate_severity', 'export_csv', 'export_xlsx']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_sla()
+
+    @admin.display(boolean=True, description='Vencida', ordering='sla_deadline')
+    def overdue(self, obj):
+        return obj.is_overdue
     
     def mark_resolved(self, request, queryset):
-        count = queryset.filter(status__in=['open', 'in_progress']).update(
-            status='resolved',
-            resolved_at=timezone.now()
-        )
+        pending = queryset.filter(status__in=['open', 'in_progress'])
+        customer_ids = set(pending.values_list('segment__trip__customer_id', flat=True))
+        now = timezone.now()
+        with transaction.atomic():
+            # update() no emite signals: los rollups se ajustan a mano
+            before = list(pending.select_for_update().values(*STATE_FIELDS))
+            count = pending.update(
+                status='resolved',
+                resolved_at=now
+            )
+            record_changes([(state, {**state, 'status': 'resolved', 'resolved_at': now}) for state in before])
+        invalidate_customer_snapshot(*customer_ids)
         self.message_user(request, f'{count} incidencias marcadas como resueltas')
     mark_resolved.short_description = 'Marcar como resueltas'
     
@@ -70,6 +171,14 @@ class IncidentAdmin(admin.ModelAdmin):
     assign_to_me.short_description = 'Asignar a mí'
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['customer', 'title', 'read', 'created_at']
+    list_select_related = ['customer__user']
     list_filter = ['read', 'created_at']
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'customer', 'queue', 'status', 'attempts', 'created_at', 'started_at', 'sent_at']
+    list_select_related = ['customer__user']
+    list_filter = ['queue', 'status', 'kind', 'created_at']
+    readonly_fields = ['provider_id', 'attempts', 'created_at', 'started_at', 'sent_at']
@@ -2,9 +2,21 @@
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from asgiref.sync import sync_to_async
 import json
-from .models import TripSegment, Notification
+import math
+from .models import TripSegment, OutboundMessage
+from .outbound import delivery_info
+from .monitoring import queue_lag
+from .notifications import (
+    queue_notification, mark_notifications_read, notification_page,
+    wait_for_notifications, encode_cursor, FEED_PAGE_SIZE
+)
+
+# Espera máxima de un long-poll (segundos)
+LONG_POLL_TIMEOUT = 25
 
 @csrf_exempt
 @login_required
@@ -25,17 +37,78 @@ def get_segment_status(request, segment_id):
 def emergency_contact(request):
     """Endpoint para contacto de emergencia"""
     if request.method == 'POST':
-        customer = request.user.customer
+        customer = request.customer
         data = json.loads(request.body)
         
         # Crear notificación de emergencia
-        Notification.objects.create(
-            customer=customer,
-            title="Contacto de emergencia activado",
-            message="Hemos recibido tu solicitud de emergencia. Te contactaremos inmediatamente."
+        queue_notification(
+            customer.pk,
+            "Contacto de emergencia activado",
+            "Hemos recibido tu solicitud de emergencia. Te contactaremos inmediatamente."
         )
         
         # En producción aquí activarías protocolos de emergencia
         return JsonResponse({'success': True, 'message': 'Emergencia reportada'})
     
     return JsonResponse({'success': False})
+
+
+@login_required
+def delivery_status(request, message_id):
+    """Estado de entrega de un mensaje encolado por el cliente (WhatsApp)"""
+    message = get_object_or_404(OutboundMessage, id=message_id, customer=request.customer)
+    return JsonResponse(delivery_info(message))
+
+@login_required
+def queue_metrics(request):
+    """Espera en las colas de mensajería (staff): verificar la latencia de emergencias bajo carga"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'No tienes permisos'}, status=403)
+    return JsonResponse({'queues': queue_lag(), 'generated_at': timezone.now().isoformat()})
+
+
+def _serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'read': notification.read,
+        'created_at': notification.created_at.isoformat(),
+        'cursor': encode_cursor(notification),
+    }
+
+@login_required
+def notifications_feed(request):
+    """Feed de notificaciones paginado por cursor; marca como leída solo la página devuelta"""
+    customer = request.customer
+    try:
+        limit = int(request.GET.get('limit', FEED_PAGE_SIZE))
+        notifications, next_cursor = notification_page(customer.pk, request.GET.get('cursor'), limit)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    data = [_serialize_notification(n) for n in notifications]
+    unread_ids = [n.id for n in notifications if not n.read]
+    if unread_ids:
+        mark_notifications_read(customer.pk, unread_ids)
+    
+    return JsonResponse({'notifications': data, 'next_cursor': next_cursor})
+
+@login_required
+async def notifications_poll(request):
+    """Long-poll: responde apenas hay notificaciones más nuevas que ``after``"""
+    customer_id = await sync_to_async(lambda: request.customer.pk)()
+    after = request.GET.get('after') or None
+    try:
+        timeout = float(request.GET.get('timeout', LONG_POLL_TIMEOUT))
+        if not math.isfinite(timeout):
+            raise ValueError(f'timeout inválido: {timeout}')
+        timeout = min(max(timeout, 0), LONG_POLL_TIMEOUT)
+        notifications = await wait_for_notifications(customer_id, after, timeout)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    return JsonResponse({
+        'notifications': [_serialize_notification(n) for n in notifications],
+        'cursor': encode_cursor(notifications[-1]) if notifications else after,
+    })
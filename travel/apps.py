@@ -8,3 +8,5 @@ class TravelConfig(AppConfig):
     
     def ready(self):
         import travel.signals
+        # Registrar y validar los templates de WhatsApp al iniciar
+        import travel.services.whatsapp_templates
@@ -1,10 +1,7 @@
 # travel/context_processors.py
 
-from datetime import date
-
 def travel_context(request):
     """Contexto global mejorado para templates"""
-    from datetime import date
     from django.conf import settings
     
     context = {
@@ -22,23 +19,18 @@ def travel_context(request):
     
     if request.user.is_authenticated:
         try:
-            customer = request.user.customer
-            context['unread_notifications'] = customer.notifications.filter(read=False).count()
+            snapshot = getattr(request, 'customer_snapshot', None)
+            if snapshot is None:
+                from .snapshot import get_customer_snapshot
+                snapshot = get_customer_snapshot(request.user.customer.pk)
+            
+            context['unread_notifications'] = snapshot.unread_notifications
             
             # Incidencias no resueltas
-            from .models import Incident
-            context['unread_incidents'] = Incident.objects.filter(
-                segment__trip__customer=customer,
-                status__in=['open', 'in_progress']
-            ).count()
+            context['unread_incidents'] = snapshot.unread_incidents
             
             # Viaje activo
-            today = date.today()
-            active_trip = customer.trips.filter(
-                start_date__lte=today,
-                end_date__gte=today
-            ).first()
-            context['active_trip'] = active_trip
+            context['active_trip'] = snapshot.active_trip
             
         except Exception:
             context['unread_notifications'] = 0
@@ -0,0 +1,66 @@
+# travel/dashboard.py
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import TripSegment, Incident
+from .utils import day_range
+
+# Vida del fragmento cacheado del tablero (segundos); los cambios de
+# segmentos e incidencias lo invalidan antes
+OPERATIONS_BOARD_TTL = getattr(settings, 'OPERATIONS_BOARD_TTL', 20)
+BOARD_FRAGMENT = 'operations_board'
+
+
+def operations_board(day):
+    """Listas y métricas del tablero de operaciones de un día (3 consultas)"""
+    start, end = day_range(day)
+    todays_segments = TripSegment.objects.filter(scheduled_datetime__gte=start, scheduled_datetime__lt=end)
+
+    # Una sola consulta para ambas columnas; se reparte en Python
+    arrivals, in_progress = [], []
+    segments = todays_segments.filter(
+        Q(service__service_type='flight') | Q(status='en_route')
+    ).select_related('trip__customer__user', 'service').order_by('scheduled_datetime', 'id')
+    for segment in segments:
+        if segment.service.service_type == 'flight':
+            arrivals.append(segment)
+        if segment.status == 'en_route':
+            in_progress.append(segment)
+
+    active_incidents = list(Incident.objects.filter(
+        resolved_at__isnull=True,
+        segment__scheduled_datetime__gte=start,
+        segment__scheduled_datetime__lt=end
+    ).select_related('segment__trip__customer__user', 'segment__service'))
+
+    # Métricas con agregación condicional en una pasada
+    flights = Q(service__service_type='flight')
+    metrics = todays_segments.aggregate(
+        total_arrivals=Count('id', filter=flights),
+        confirmed_arrivals=Count('id', filter=flights & Q(status='confirmed')),
+        pending_arrivals=Count('id', filter=flights & Q(status='pending')),
+    )
+    metrics['incidents_count'] = len(active_incidents)
+
+    return {
+        'arrivals_today': arrivals,
+        'in_progress': in_progress,
+        'active_incidents': active_incidents,
+        'metrics': metrics,
+    }
+
+
+def board_cache_key(day):
+    return make_template_fragment_key(BOARD_FRAGMENT, [day.isoformat()])
+
+
+def invalidate_operations_board(*datetimes):
+    """Descartar el fragmento cacheado de los días de las fechas dadas"""
+    days = {
+        timezone.localdate(value if timezone.is_aware(value) else timezone.make_aware(value))
+        for value in datetimes if value
+    }
+    if days:
+        cache.delete_many([board_cache_key(day) for day in days])
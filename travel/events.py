@@ -0,0 +1,163 @@
+# travel/events.py
+"""Eventos de estado de segmentos para los streams SSE.
+
+Los cambios de estado se publican al confirmar la transacción en dos
+canales: el del viaje (viajeros) y el del día del servicio (operaciones).
+En producción el broker es Redis pub/sub, así cualquier worker ASGI recibe
+los eventos publicados desde otros procesos (web, Celery); sin Redis se usa
+un broker en memoria válido solo dentro del mismo proceso (desarrollo, tests).
+El long-polling de notificaciones (travel/notifications.py) usa el mismo
+broker con un canal por cliente.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def trip_channel(trip_id):
+    return f'segments:trip:{trip_id}'
+
+
+def day_channel(day):
+    return f'segments:day:{day.isoformat()}'
+
+
+def segment_event(segment_id, trip_id, status, status_display, scheduled_datetime, previous_status=None):
+    """Mensaje publicado para un cambio de estado"""
+    return {
+        'segment_id': segment_id,
+        'trip_id': trip_id,
+        'status': status,
+        'status_display': status_display,
+        'previous_status': previous_status,
+        'scheduled_datetime': scheduled_datetime.isoformat(),
+        'published_at': timezone.now().isoformat(),
+    }
+
+
+class MemoryBroker:
+    """Broker dentro del proceso: entrega a colas asyncio de los suscriptores"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channels, message):
+        with self._lock:
+            targets = {sub for channel in channels for sub in self._subscribers[channel]}
+        for loop, queue in targets:
+            # publish() corre en hilos síncronos; la cola vive en el event loop
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+    def subscribe(self, channels):
+        return _MemorySubscription(self, channels)
+
+
+class _MemorySubscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = list(channels)
+        self.queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        entry = (asyncio.get_running_loop(), self.queue)
+        with self.broker._lock:
+            for channel in self.channels:
+                self.broker._subscribers[channel].add(entry)
+        self._entry = entry
+        return self
+
+    async def __aexit__(self, *exc_info):
+        with self.broker._lock:
+            for channel in self.channels:
+                self.broker._subscribers[channel].discard(self._entry)
+
+    async def get(self, timeout):
+        """Siguiente mensaje, o None si pasa ``timeout`` sin eventos"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RedisBroker:
+    """Broker sobre Redis pub/sub (compartido entre procesos y servidores)"""
+
+    def __init__(self, url):
+        self.url = url
+        self._client = None
+
+    def publish(self, channels, message):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url)
+        data = json.dumps(message)
+        pipeline = self._client.pipeline(transaction=False)
+        for channel in channels:
+            pipeline.publish(channel, data)
+        pipeline.execute()
+
+    def subscribe(self, channels):
+        return _RedisSubscription(self.url, channels)
+
+
+class _RedisSubscription:
+    def __init__(self, url, channels):
+        self.url = url
+        self.channels = list(channels)
+
+    async def __aenter__(self):
+        import redis.asyncio as aioredis
+        self.client = aioredis.Redis.from_url(self.url)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(*self.channels)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        url = getattr(settings, 'SEGMENT_EVENTS_REDIS_URL', None)
+        _broker = RedisBroker(url) if url else MemoryBroker()
+    return _broker
+
+
+def publish_segment_events(events):
+    """Publicar eventos (dicts de segment_event); nunca rompe el flujo que los emite"""
+    broker = get_broker()
+    for event in events:
+        try:
+            scheduled = datetime.fromisoformat(event['scheduled_datetime'])
+            if timezone.is_naive(scheduled):
+                scheduled = timezone.make_aware(scheduled)
+            day = timezone.localdate(scheduled)
+            broker.publish([trip_channel(event['trip_id']), day_channel(day)], event)
+        except Exception:
+            logger.exception(f"Error publicando evento de segmento {event['segment_id']}")
+
+
+def publish_on_commit(*events):
+    """Publicar cuando la transacción actual se confirme"""
+    if events:
+        transaction.on_commit(lambda: publish_segment_events(events))
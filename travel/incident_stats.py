@@ -0,0 +1,156 @@
+# travel/incident_stats.py
+"""Rollups de estadísticas de incidencias para el dashboard de staff.
+
+Cada incidencia aporta a IncidentStatRollup según su estado (ver
+``contributions``): reportadas por categoría y severidad, conteo por estado,
+resoluciones con histograma de horas y calificaciones del cliente. Al
+guardar se aplica la diferencia entre el aporte anterior y el nuevo, en la
+misma transacción, y el comando ``backfill_incident_stats`` reconstruye la
+tabla con la misma función. El dashboard lee unas pocas filas agregadas en
+vez de recorrer toda la tabla de incidencias.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import IncidentStatRollup
+from .utils import day_range
+
+STATE_FIELDS = ('reported_at', 'category', 'severity', 'status', 'resolved_at', 'customer_satisfaction')
+RESOLVED_STATUSES = ('resolved', 'closed')
+
+# Bucket único del período 'all' (totales históricos)
+ALL_TIME = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+# Histograma de horas hasta la resolución: (límite superior, clave)
+RESOLUTION_BINS = (
+    (1, '0-1'),
+    (4, '1-4'),
+    (12, '4-12'),
+    (24, '12-24'),
+    (48, '24-48'),
+    (None, '48+'),
+)
+
+
+def resolution_bin(hours):
+    for limit, label in RESOLUTION_BINS:
+        if limit is None or hours < limit:
+            return label
+
+
+def buckets(value):
+    """(período, inicio del bucket) de una fecha: hora y día locales, y el total"""
+    local = timezone.localtime(value if timezone.is_aware(value) else timezone.make_aware(value))
+    return (
+        ('hour', local.replace(minute=0, second=0, microsecond=0)),
+        ('day', day_range(local.date())[0]),
+        ('all', ALL_TIME),
+    )
+
+
+def incident_state(incident):
+    return {field: getattr(incident, field) for field in STATE_FIELDS}
+
+
+def saved_state(incident):
+    """Estado tal como quedó guardado en la BD (antes de los cambios en memoria)"""
+    state = incident_state(incident)
+    for field in incident.changed_fields:
+        state[field] = incident.loaded_value(field)
+    return state
+
+
+def contributions(state):
+    """Aporte de una incidencia: lista de (métrica, clave, fecha, count, total)"""
+    reported = state['reported_at']
+    items = [
+        ('reported', f"category:{state['category']}", reported, 1, 0),
+        ('reported', f"severity:{state['severity']}", reported, 1, 0),
+        ('status', state['status'], reported, 1, 0),
+    ]
+    resolved = state['resolved_at']
+    if state['status'] in RESOLVED_STATUSES and resolved:
+        hours = (resolved - reported).total_seconds() / 3600
+        items.append(('resolved', resolution_bin(hours), resolved, 1, hours))
+    if state['customer_satisfaction'] is not None:
+        items.append(('satisfaction', '', reported, 1, state['customer_satisfaction']))
+    return items
+
+
+def accumulate(deltas, state, sign=1):
+    for metric, key, value, count, total in contributions(state):
+        for period, bucket in buckets(value):
+            current_count, current_total = deltas[(period, bucket, metric, key)]
+            deltas[(period, bucket, metric, key)] = (current_count + sign * count, current_total + sign * total)
+
+
+def apply_deltas(deltas):
+    """Sumar los deltas a las filas del rollup, creándolas si no existen"""
+    # Orden fijo: dos transacciones concurrentes bloquean filas en el mismo orden
+    for period, bucket, metric, key in sorted(deltas):
+        count, total = deltas[(period, bucket, metric, key)]
+        if not count and not total:
+            continue
+        rows = IncidentStatRollup.objects.filter(period=period, bucket=bucket, metric=metric, key=key)
+        if rows.update(count=F('count') + count, total=F('total') + total):
+            continue
+        try:
+            with transaction.atomic():
+                IncidentStatRollup.objects.create(
+                    period=period, bucket=bucket, metric=metric, key=key, count=count, total=total
+                )
+        except IntegrityError:
+            # Otra transacción creó la fila entre el UPDATE y el INSERT
+            rows.update(count=F('count') + count, total=F('total') + total)
+
+
+def record_changes(transitions):
+    """Aplicar transiciones (estado anterior, estado nuevo); None para altas y bajas"""
+    deltas = defaultdict(lambda: (0, 0.0))
+    for old_state, new_state in transitions:
+        if old_state:
+            accumulate(deltas, old_state, -1)
+        if new_state:
+            accumulate(deltas, new_state, 1)
+    apply_deltas(deltas)
+
+
+def dashboard_stats(today=None, category_days=7):
+    """Estadísticas del dashboard de incidencias en una consulta sobre el rollup"""
+    today = today or timezone.localdate()
+    today_start = day_range(today)[0]
+    since = day_range(today - timedelta(days=category_days))[0]
+
+    rows = IncidentStatRollup.objects.filter(
+        Q(period='all', metric__in=['status', 'satisfaction'])
+        | Q(period='day', bucket=today_start, metric='resolved')
+        | Q(period='day', bucket__gte=since, bucket__lte=today_start, metric='reported', key__startswith='category:')
+    ).values_list('period', 'metric', 'key', 'count', 'total')
+
+    statuses = defaultdict(int)
+    categories = defaultdict(int)
+    resolved_today = 0
+    satisfaction_count, satisfaction_total = 0, 0.0
+    for period, metric, key, count, total in rows:
+        if metric == 'status':
+            statuses[key] += count
+        elif metric == 'satisfaction':
+            satisfaction_count += count
+            satisfaction_total += total
+        elif metric == 'resolved':
+            resolved_today += count
+        else:
+            categories[key.split(':', 1)[1]] += count
+
+    return {
+        'total_open': statuses['open'],
+        'total_in_progress': statuses['in_progress'],
+        'resolved_today': resolved_today,
+        'avg_satisfaction': satisfaction_total / satisfaction_count if satisfaction_count else 0,
+        'category_stats': sorted(
+            ({'category': category, 'count': count} for category, count in categories.items() if count),
+            key=lambda row: -row['count']
+        ),
+    }
@@ -0,0 +1,40 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from travel.models import Incident, IncidentStatRollup
+from travel.incident_stats import STATE_FIELDS, accumulate
+
+
+class Command(BaseCommand):
+    help = 'Reconstruir los rollups de estadísticas de incidencias desde la tabla de incidencias'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Incidencias leídas por lote (default: 2000)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Filas de rollup por INSERT masivo (default: 1000)')
+
+    def handle(self, *args, **options):
+        # Mismo cálculo que el mantenimiento incremental; en memoria solo
+        # quedan los buckets, no las incidencias
+        deltas = defaultdict(lambda: (0, 0.0))
+        incidents = 0
+        rows = Incident.objects.order_by().values(*STATE_FIELDS)
+        for state in rows.iterator(chunk_size=options['chunk_size']):
+            accumulate(deltas, state)
+            incidents += 1
+
+        rollups = [
+            IncidentStatRollup(period=period, bucket=bucket, metric=metric, key=key, count=count, total=total)
+            for (period, bucket, metric, key), (count, total) in deltas.items()
+            if count or total
+        ]
+
+        # Reemplazo atómico: el dashboard nunca ve la tabla a medio llenar
+        with transaction.atomic():
+            IncidentStatRollup.objects.all().delete()
+            IncidentStatRollup.objects.bulk_create(rollups, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rollups reconstruidos: {incidents} incidencias, {len(rollups)} filas')
+        )
@@ -3,6 +3,8 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from travel.models import Notification, Incident
+from travel.services.geocoding_cache import geocoding_cache
+from travel.services.report_export import purge_old_exports
 
 class Command(BaseCommand):
     help = 'Limpiar datos antiguos del sistema'
@@ -22,8 +24,15 @@ class Command(BaseCommand):
         )
         incidents_count = old_incidents.count()
         
+        # Eliminar entradas vencidas del cache de geocoding
+        geocoding_count = geocoding_cache.purge_expired()
+        
+        # Eliminar exportes XLSX ya vencidos
+        exports_count = purge_old_exports()
+        
         self.stdout.write(
             self.style.SUCCESS(
-                f'Limpieza completada: {old_count} notificaciones y {incidents_count} incidencias procesadas'
+                f'Limpieza completada: {old_count} notificaciones, {incidents_count} incidencias, '
+                f'{geocoding_count} direcciones geocodificadas y {exports_count} exportes procesados'
             )
         )
@@ -2,24 +2,27 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from travel.models import TripSegment
-from travel.tasks import send_reminder_email
+from travel import reminders
+from travel.tasks import dispatch_reminders
+from travel.utils import day_range
 
 class Command(BaseCommand):
-    help = 'Enviar recordatorios diarios para servicios próximos'
+    help = ('Enviar ahora los recordatorios pendientes de mañana. La rueda de '
+            'recordatorios (tasks.schedule_reminders) ya los envía a su hora; '
+            'este comando queda para envíos manuales y no duplica los ya enviados')
 
     def handle(self, *args, **options):
-        tomorrow = timezone.now().date() + timedelta(days=1)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        tomorrow_start, tomorrow_end = day_range(tomorrow)
         
-        segments_tomorrow = TripSegment.objects.filter(
-            scheduled_datetime__date=tomorrow,
-            status__in=['confirmed', 'pending']
-        )
+        # Solo ids: las tareas cargan el resto por lote
+        segment_ids = reminders.claim(reminders.pending_reminders().filter(
+            scheduled_datetime__gte=tomorrow_start,
+            scheduled_datetime__lt=tomorrow_end
+        ))
         
-        for segment in segments_tomorrow:
-            send_reminder_email.delay(segment.id)
-            self.stdout.write(f'Recordatorio programado para {segment.trip.customer.user.email}')
+        batches = dispatch_reminders(segment_ids)
         
         self.stdout.write(
-            self.style.SUCCESS(f'Programados {segments_tomorrow.count()} recordatorios')
+            self.style.SUCCESS(f'Programados {len(segment_ids)} recordatorios en {batches} lotes')
         )
@@ -1,35 +1,173 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from googlemaps import exceptions as maps_errors
 from django.core.management.base import BaseCommand
 from travel.models import TripSegment
 from travel.services.google_maps import GoogleMapsService
+from travel.services.geocoding_cache import geocoding_cache, normalize_address
+
+
+def is_rate_limited(error):
+    """Detectar errores de cuota/rate limit de la API por su tipo, no por el texto
+    (un mensaje que repite una dirección con "429" no debe pausar a todos)"""
+    if isinstance(error, maps_errors.HTTPError):
+        return error.status_code == 429
+    return isinstance(error, maps_errors._OverQueryLimit)
+
+
+class RateLimiter:
+    """Pausa compartida entre workers cuando la API responde con rate limit"""
+
+    def __init__(self, base_delay=1.0, max_delay=60.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def backoff(self, attempt):
+        delay = min(self.base_delay * (2 ** attempt), self.max_delay)
+        delay += random.uniform(0, delay / 2)
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
 
 class Command(BaseCommand):
     help = 'Actualizar coordenadas de segmentos usando Google Maps'
 
-    def handle(self, *args, **options):
+    max_retries = 5
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Consultas de geocoding concurrentes (default: 8)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Segmentos por UPDATE masivo (default: 500)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Geocodificar sin guardar cambios')
+
+    def get_geocoder(self):
+        """Función dirección -> resultado; propaga los errores para poder reintentar"""
         maps_service = GoogleMapsService()
-        
         if not maps_service.is_available():
+            return None
+        return maps_service.geocode_remote
+
+    def handle(self, *args, **options):
+        geocoder = self.get_geocoder()
+
+        if geocoder is None:
             self.stdout.write(self.style.ERROR('Google Maps API no disponible'))
             return
-        
+
+        started = time.monotonic()
+
+        # Agrupar segmentos por dirección normalizada: cada dirección se consulta una vez
+        segments_by_address = defaultdict(list)
+        addresses = {}
         segments = TripSegment.objects.filter(
             pickup_latitude__isnull=True,
             pickup_location__isnull=False
-        ).exclude(pickup_location='')
-        
-        updated_count = 0
-        for segment in segments:
-            coords = maps_service.geocode_address(segment.pickup_location)
-            if coords:
-                segment.pickup_latitude = coords['lat']
-                segment.pickup_longitude = coords['lng']
-                segment.save(update_fields=['pickup_latitude', 'pickup_longitude'])
-                updated_count += 1
-                
-                self.stdout.write(f"✅ {segment.service.name}: {coords['formatted_address']}")
-            else:
-                self.stdout.write(f"❌ No se pudo geocodificar: {segment.pickup_location}")
-        
+        ).exclude(pickup_location='').values_list('id', 'pickup_location')
+
+        for segment_id, pickup_location in segments.iterator(chunk_size=2000):
+            key = normalize_address(pickup_location)
+            if not key:
+                continue
+            segments_by_address[key].append(segment_id)
+            addresses.setdefault(key, pickup_location)
+
+        total_segments = sum(len(ids) for ids in segments_by_address.values())
+        self.stdout.write(f'{total_segments} segmentos, {len(addresses)} direcciones únicas')
+
+        # Primero el cache (memoria + BD), luego la API solo para las faltantes
+        cached = geocoding_cache.get_many(addresses.values())
+        results = {normalize_address(address): result for address, result in cached.items()}
+        missing = [address for key, address in addresses.items() if key not in results]
+        self.stdout.write(f'{len(results)} en cache, {len(missing)} por geocodificar')
+
+        fetched, failed = self._geocode_concurrently(geocoder, missing, options['workers'])
+        results.update({normalize_address(address): result for address, result in fetched.items()})
+
+        if not options['dry_run']:
+            geocoding_cache.set_many(fetched)
+
+        updated_count = self._write_coordinates(
+            segments_by_address, results, options['batch_size'], options['dry_run']
+        )
+
+        for address in failed:
+            self.stdout.write(f"❌ No se pudo geocodificar: {address}")
+
+        elapsed = time.monotonic() - started
+        rate = len(missing) / elapsed if elapsed else 0
+        prefix = '[dry-run] ' if options['dry_run'] else ''
         self.stdout.write(
-            self.style.SUCCESS(f'Actualizados {updated_count} segmentos con coordenadas')
-        )
\ No newline at end of file
+            self.style.SUCCESS(
+                f'{prefix}Actualizados {updated_count} segmentos con coordenadas '
+                f'en {elapsed:.1f}s ({rate:.1f} direcciones/s vía API)'
+            )
+        )
+
+    def _geocode_concurrently(self, geocoder, addresses, workers):
+        """Geocodificar direcciones en un pool acotado, con backoff ante rate limit"""
+        limiter = RateLimiter()
+        fetched, failed = {}, []
+
+        def resolve(address):
+            for attempt in range(self.max_retries):
+                limiter.wait()
+                try:
+                    return geocoder(address)
+                except Exception as e:
+                    if not is_rate_limited(e) or attempt == self.max_retries - 1:
+                        raise
+                    limiter.backoff(attempt)
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = {executor.submit(resolve, address): address for address in addresses}
+            for future in as_completed(futures):
+                address = futures[future]
+                try:
+                    fetched[address] = future.result()
+                except Exception as e:
+                    self.stderr.write(f'Error geocodificando {address}: {e}')
+                    failed.append(address)
+
+        return fetched, failed
+
+    def _write_coordinates(self, segments_by_address, results, batch_size, dry_run):
+        """Escribir coordenadas con bulk_update por lotes"""
+        updated_count = 0
+        batch = []
+
+        for key, segment_ids in segments_by_address.items():
+            result = results.get(key)
+            if not result:
+                continue
+            for segment_id in segment_ids:
+                batch.append(TripSegment(
+                    id=segment_id,
+                    pickup_latitude=result['lat'],
+                    pickup_longitude=result['lng']
+                ))
+
+            if len(batch) >= batch_size:
+                updated_count += self._flush(batch, dry_run)
+                batch = []
+
+        if batch:
+            updated_count += self._flush(batch, dry_run)
+        return updated_count
+
+    def _flush(self, batch, dry_run):
+        if not dry_run:
+            TripSegment.objects.bulk_update(batch, ['pickup_latitude', 'pickup_longitude'])
+        return len(batch)
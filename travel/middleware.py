@@ -1,25 +1,46 @@
 # travel/middleware.py
 
 from django.utils.deprecation import MiddlewareMixin
-from django.contrib.auth.models import User
+from django.utils.functional import SimpleLazyObject
 from .models import Customer
+from .snapshot import get_customer_snapshot
+
+CUSTOMER_SESSION_KEY = '_customer_id'
+
+
+def get_customer(request):
+    """Obtener el Customer del usuario autenticado, creándolo si no existe"""
+    customer_id = request.session.get(CUSTOMER_SESSION_KEY)
+    customer = None
+    
+    if customer_id:
+        customer = Customer.objects.filter(pk=customer_id, user_id=request.user.pk).first()
+    
+    if customer is None:
+        # Primer request de la sesión: crear customer automáticamente si no existe
+        customer, created = Customer.objects.get_or_create(
+            user=request.user,
+            defaults={'phone': '', 'emergency_contact': ''}
+        )
+        request.session[CUSTOMER_SESSION_KEY] = customer.pk
+    
+    # Reutilizar el usuario ya cargado por la autenticación (evita el JOIN con auth_user)
+    customer.user = request.user
+    return customer
+
 
 class EnsureCustomerMiddleware(MiddlewareMixin):
     """Asegurar que todo usuario autenticado tenga un Customer asociado"""
     
     def process_request(self, request):
         if request.user.is_authenticated:
-            try:
-                # Intentar acceder al customer
-                customer = request.user.customer
-            except Customer.DoesNotExist:
-                # Crear customer automáticamente si no existe
-                Customer.objects.create(
-                    user=request.user,
-                    phone='',
-                    emergency_contact=''
+            # El customer se carga solo si la vista lo usa; su id queda en la sesión
+            request.customer = SimpleLazyObject(lambda: get_customer(request))
+            
+            # Snapshot compartido por vistas y context processors (se calcula una sola vez)
+            request.customer_snapshot = SimpleLazyObject(
+                lambda: get_customer_snapshot(
+                    request.session.get(CUSTOMER_SESSION_KEY) or request.customer.pk
                 )
-            except AttributeError:
-                # El usuario no tiene el atributo customer (relación no configurada)
-                pass
-        return None
\ No newline at end of file
+            )
+        return None
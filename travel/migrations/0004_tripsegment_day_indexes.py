@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0003_customer_whatsapp_notifications_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tripsegment',
+            index=models.Index(fields=['scheduled_datetime', 'status'], name='segment_sched_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripsegment',
+            index=models.Index(fields=['trip', 'scheduled_datetime'], name='segment_trip_sched_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0005_notification_channels'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tripsegment',
+            name='status',
+            field=models.CharField(choices=[('confirmed', 'Confirmado'), ('pending', 'Pendiente'), ('en_route', 'En camino'), ('delayed', 'Atrasado'), ('completed', 'Completado'), ('cancelled', 'Cancelado')], default='confirmed', max_length=20),
+        ),
+    ]
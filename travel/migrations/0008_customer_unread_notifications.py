@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_counts(apps, schema_editor):
+    Customer = apps.get_model('travel', 'Customer')
+    Notification = apps.get_model('travel', 'Notification')
+    unread = Notification.objects.filter(
+        customer=OuterRef('pk'), read=False
+    ).order_by().values('customer').annotate(total=Count('id')).values('total')
+    Customer.objects.update(unread_notifications=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0007_geocodedaddress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['customer', 'read'], name='notification_customer_read_idx'),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0008_customer_unread_notifications'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='notification_feed_idx'),
+        ),
+    ]
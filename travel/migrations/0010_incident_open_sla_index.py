@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0009_notification_feed_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(condition=models.Q(('status__in', ('open', 'in_progress'))), fields=['reported_at', 'severity'], name='incident_open_sla_idx'),
+        ),
+    ]
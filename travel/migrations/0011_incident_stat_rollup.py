@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0010_incident_open_sla_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncidentStatRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hora'), ('day', 'Día'), ('all', 'Total')], max_length=4)),
+                ('bucket', models.DateTimeField(help_text="Inicio de la hora o del día (fecha fija para 'all')")),
+                ('metric', models.CharField(max_length=20)),
+                ('key', models.CharField(blank=True, max_length=40)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.FloatField(default=0, help_text='Suma asociada (horas de resolución, calificaciones)')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'metric', 'key'), name='incident_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# (tabla, columna) buscadas con icontains desde el admin. El índice cubre la
+# misma expresión que genera Django en PostgreSQL, UPPER(columna::text) LIKE
+# UPPER('%término%'), para que el planner lo use con comodín inicial.
+TRIGRAM_COLUMNS = [
+    ('auth_user', 'first_name'),
+    ('auth_user', 'last_name'),
+    ('auth_user', 'email'),
+    ('travel_trip', 'destination'),
+    ('travel_service', 'name'),
+    ('travel_tripsegment', 'voucher_code'),
+    ('travel_incident', 'title'),
+    ('travel_incident', 'description'),
+]
+
+
+def index_name(table, column):
+    return f'{table}_{column}_trgm'
+
+
+def drop_invalid_index(schema_editor, name):
+    """Un CREATE INDEX CONCURRENTLY interrumpido deja el índice marcado inválido;
+    IF NOT EXISTS lo daría por creado, así que se borra antes de reintentar."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', [name])
+        row = cursor.fetchone()
+    if row is not None and not row[0]:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY {name}')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Solo PostgreSQL (pg_trgm); en SQLite la búsqueda queda sin índice
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # CONCURRENTLY no bloquea escrituras en tablas con datos (no admite transacción)
+    for table, column in TRIGRAM_COLUMNS:
+        drop_invalid_index(schema_editor, index_name(table, column))
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(table, column)} '
+            f'ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {index_name(table, column)}')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('travel', '0011_incident_stat_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0012_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripsegment',
+            name='reminder_sent_for',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0014_outbound_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='email_delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='whatsapp_delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, help_text='Entrega completa por canales externos', null=True),
+        ),
+    ]
@@ -1,8 +1,46 @@
 # travel/models.py
+from datetime import timedelta
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+class TrackedFieldsMixin:
+    """Guarda los valores cargados desde la BD para detectar cambios sin releer la fila"""
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, names=None):
+        # Solo los campos realmente cargados (evita consultas por campos diferidos)
+        loaded = getattr(self, '_loaded_values', {})
+        for name in self.tracked_fields:
+            if name in self.__dict__ and (names is None or name in names):
+                loaded[name] = self.__dict__[name]
+        self._loaded_values = loaded
+
+    def loaded_value(self, name):
+        """Valor del campo tal como se leyó de la BD (None si no se cargó)"""
+        return getattr(self, '_loaded_values', {}).get(name)
+
+    @property
+    def changed_fields(self):
+        """Campos seguidos cuyo valor cambió desde que se cargó o guardó la instancia"""
+        loaded = getattr(self, '_loaded_values', {})
+        return {name for name, value in loaded.items() if self.__dict__.get(name) != value}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Los signals post_save ya vieron los cambios; desde aquí el estado guardado es la base
+        self._snapshot_tracked_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot_tracked_fields(kwargs.get('fields'))
+
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=20, blank=True)
@@ -12,11 +50,24 @@ class Customer(models.Model):
         # Preferencias de comunicación
     whatsapp_notifications = models.BooleanField(default=True, help_text="Recibir notificaciones por WhatsApp")
     whatsapp_reminders = models.BooleanField(default=True, help_text="Recibir recordatorios por WhatsApp")
+    # Contador desnormalizado; se reconcilia periódicamente con reconcile_unread_counters
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
     
+    def save(self, *args, **kwargs):
+        # El contador solo cambia con UPDATE ... F(): un save completo de una fila
+        # existente (admin, perfil) pisaría incrementos concurrentes con su copia vieja
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'unread_notifications'
+            ]
+        super().save(*args, **kwargs)
+
     def send_whatsapp(self, template_name: str, variables: dict):
         """Enviar mensaje de WhatsApp si está habilitado"""
         if self.whatsapp_notifications and self.phone:
-            return whatsapp_service.send_template_message(
+            from .services.whatsapp import WhatsAppService
+            return WhatsAppService().send_template_message(
                 self.phone, template_name, variables
             )
         return {'success': False, 'error': 'WhatsApp not enabled'}
@@ -64,7 +115,9 @@ class Service(models.Model):
     def __str__(self):
         return self.name
 
-class TripSegment(models.Model):
+class TripSegment(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('status', 'scheduled_datetime')
+
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='segments')
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
     scheduled_datetime = models.DateTimeField()
@@ -78,6 +131,7 @@ class TripSegment(models.Model):
         ('confirmed', 'Confirmado'),
         ('pending', 'Pendiente'),
         ('en_route', 'En camino'),
+        ('delayed', 'Atrasado'),
         ('completed', 'Completado'),
         ('cancelled', 'Cancelado'),
     ], default='confirmed')
@@ -94,6 +148,9 @@ class TripSegment(models.Model):
     directions_distance = models.CharField(max_length=50, blank=True, help_text="Distancia estimada")
     last_directions_update = models.DateTimeField(null=True, blank=True)
     
+    # Fecha del servicio para la que ya se envió el recordatorio (ver travel/reminders.py)
+    reminder_sent_for = models.DateTimeField(null=True, blank=True, editable=False)
+    
     @property
     def has_coordinates(self):
         return (self.pickup_latitude is not None and 
@@ -102,7 +159,8 @@ class TripSegment(models.Model):
     def update_coordinates(self):
         """Actualizar coordenadas usando Google Maps"""
         if self.pickup_location:
-            coords = maps_service.geocode_address(self.pickup_location)
+            from .services.google_maps import GoogleMapsService
+            coords = GoogleMapsService().geocode_address(self.pickup_location)
             if coords:
                 self.pickup_latitude = coords['lat']
                 self.pickup_longitude = coords['lng']
@@ -110,11 +168,64 @@ class TripSegment(models.Model):
 
     class Meta:
         ordering = ['scheduled_datetime']
+        indexes = [
+            # Consultas por día (rango semiabierto) filtrando por estado
+            models.Index(fields=['scheduled_datetime', 'status'], name='segment_sched_status_idx'),
+            # Itinerario de un viaje ordenado por fecha
+            models.Index(fields=['trip', 'scheduled_datetime'], name='segment_trip_sched_idx'),
+        ]
 
     def __str__(self):
         return f"{self.trip.customer} - {self.service.name} ({self.scheduled_datetime.date()})"
 
-class Incident(models.Model):
+# Estados en que una incidencia sigue abierta (cuentan para el SLA)
+OPEN_INCIDENT_STATUSES = ('open', 'in_progress')
+
+
+class IncidentQuerySet(models.QuerySet):
+    def open(self):
+        return self.filter(status__in=OPEN_INCIDENT_STATUSES)
+
+    def with_sla(self, now=None):
+        """Anotar ``sla_deadline`` e ``is_overdue`` calculados en la BD"""
+        now = now or timezone.now()
+        deadline = models.Case(
+            *[
+                models.When(severity=severity, then=models.F('reported_at') + timedelta(hours=hours))
+                for severity, hours in Incident.SLA_HOURS.items()
+            ],
+            default=models.F('reported_at') + timedelta(hours=Incident.SLA_HOURS['low']),
+            output_field=models.DateTimeField(),
+        )
+        return self.annotate(sla_deadline=deadline).annotate(is_overdue=models.Case(
+            models.When(
+                models.Q(status__in=OPEN_INCIDENT_STATUSES, sla_deadline__lt=now),
+                then=models.Value(True)
+            ),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+    def overdue(self, now=None):
+        """Incidencias abiertas con el SLA vencido.
+
+        Se filtra por ``reported_at`` contra el límite de cada severidad (no
+        contra la expresión anotada) para recorrer solo el índice parcial de
+        incidencias abiertas: el SLA más corto acota el rango y cada severidad
+        lo recorta.
+        """
+        now = now or timezone.now()
+        by_severity = models.Q()
+        for severity, hours in Incident.SLA_HOURS.items():
+            by_severity |= models.Q(severity=severity, reported_at__lt=now - timedelta(hours=hours))
+        shortest = min(Incident.SLA_HOURS.values())
+        return self.open().filter(by_severity, reported_at__lt=now - timedelta(hours=shortest))
+
+
+class Incident(TrackedFieldsMixin, models.Model):
+    # Además del estado, los campos que alimentan IncidentStatRollup
+    tracked_fields = ('status', 'severity', 'category', 'resolved_at', 'customer_satisfaction')
+
     SEVERITY_CHOICES = [
         ('low', 'Baja'),
         ('medium', 'Media'),
@@ -129,6 +240,14 @@ class Incident(models.Model):
         ('closed', 'Cerrada'),
     ]
     
+    # Horas máximas sin resolver según severidad
+    SLA_HOURS = {
+        'critical': 4,
+        'high': 12,
+        'medium': 24,
+        'low': 48,
+    }
+    
     CATEGORY_CHOICES = [
         ('transport', 'Transporte'),
         ('accommodation', 'Alojamiento'),
@@ -174,9 +293,19 @@ class Incident(models.Model):
     # Archivos adjuntos (para futuro)
     evidence_description = models.TextField(blank=True, help_text="Descripción de evidencias (fotos, videos)")
     
+    objects = IncidentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-reported_at']
-        
+        indexes = [
+            # Incidencias abiertas por antigüedad: cálculo de vencidas según SLA
+            models.Index(
+                fields=['reported_at', 'severity'],
+                condition=models.Q(status__in=OPEN_INCIDENT_STATUSES),
+                name='incident_open_sla_idx'
+            ),
+        ]
+
     @property
     def is_resolved(self):
         return self.status in ['resolved', 'closed']
@@ -193,33 +322,114 @@ class Incident(models.Model):
     
     @property
     def is_overdue(self):
-        """Verificar si está vencida (más de 24h sin resolver para alta/crítica)"""
+        """Vencida según el SLA de su severidad (usa la anotación de with_sla si existe)"""
+        if '_is_overdue' in self.__dict__:
+            return self._is_overdue
         if self.is_resolved:
             return False
-        
-        hours_passed = self.response_time
-        
-        if self.severity == 'critical':
-            return hours_passed > 4  # 4 horas para crítica
-        elif self.severity == 'high':
-            return hours_passed > 12  # 12 horas para alta
-        elif self.severity == 'medium':
-            return hours_passed > 24  # 24 horas para media
-        else:
-            return hours_passed > 48  # 48 horas para baja
+
+        return self.response_time > self.SLA_HOURS.get(self.severity, self.SLA_HOURS['low'])
+
+    @is_overdue.setter
+    def is_overdue(self, value):
+        # Django asigna aquí la anotación de IncidentQuerySet.with_sla()
+        self._is_overdue = value
 
     def __str__(self):
         return f"{self.title} - {self.segment.trip.customer.user.get_full_name()}"
 
-class Notification(models.Model):
+class IncidentStatRollup(models.Model):
+    """Agregados de incidencias por hora, día y totales (ver travel/incident_stats.py)"""
+    PERIOD_CHOICES = [
+        ('hour', 'Hora'),
+        ('day', 'Día'),
+        ('all', 'Total'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField(help_text="Inicio de la hora o del día (fecha fija para 'all')")
+    metric = models.CharField(max_length=20)
+    key = models.CharField(max_length=40, blank=True)
+    count = models.BigIntegerField(default=0)
+    total = models.FloatField(default=0, help_text="Suma asociada (horas de resolución, calificaciones)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'bucket', 'metric', 'key'], name='incident_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} {self.metric}:{self.key} = {self.count}"
+
+class Notification(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('read',)
+
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='notifications')
     title = models.CharField(max_length=200)
     message = models.TextField()
     read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Canales de entrega adicionales a la app ('email', 'whatsapp')
+    channels = models.JSONField(default=list, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True, help_text="Entrega completa por canales externos")
+    # Entrega por canal: un reintento solo reenvía los canales sin fecha
+    email_delivered_at = models.DateTimeField(null=True, blank=True)
+    whatsapp_delivered_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', 'read'], name='notification_customer_read_idx'),
+            models.Index(fields=['customer', '-created_at', '-id'], name='notification_feed_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.customer} - {self.title}"
\ No newline at end of file
+        return f"{self.customer} - {self.title}"
+
+class OutboundMessage(models.Model):
+    """Mensaje de WhatsApp encolado desde una vista; el cliente consulta su estado por API"""
+    STATUS_CHOICES = [
+        ('queued', 'En cola'),
+        ('sending', 'Enviando'),
+        ('sent', 'Enviado'),
+        ('failed', 'Fallido'),
+    ]
+
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='outbound_messages')
+    kind = models.CharField(max_length=50, help_text="Template o motivo del mensaje")
+    queue = models.CharField(max_length=20)
+    recipient = models.CharField(max_length=20)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    provider_id = models.CharField(max_length=64, blank=True, help_text="SID del mensaje en Twilio")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Primera vez que un worker tomó el mensaje: started_at - created_at es la espera en cola
+    started_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['queue', 'status', 'created_at'], name='outbound_queue_status_idx'),
+            models.Index(fields=['queue', 'started_at'], name='outbound_queue_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} → {self.recipient} ({self.status})"
+
+class GeocodedAddress(models.Model):
+    """Cache persistente de geocoding (clave: dirección normalizada)"""
+    address_key = models.CharField(max_length=255, unique=True)
+    address = models.CharField(max_length=255)
+    found = models.BooleanField(default=True, help_text="False si Google no encontró la dirección")
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    formatted_address = models.CharField(max_length=255, blank=True)
+    place_id = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.address
+
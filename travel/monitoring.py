@@ -1,27 +1,37 @@
 # travel/monitoring.py
 import logging
+import math
+from datetime import timedelta
+from django.db.models import Count, Min
 from django.utils import timezone
-from .models import TripSegment
+from .models import TripSegment, OutboundMessage
+from .outbound import QUEUES, stale_sending
+from .utils import day_range
+from .services.geocoding_cache import geocoding_cache
 
 # Configurar logger
 logger = logging.getLogger('clmundo')
 
+# Mensajes recientes por cola considerados para los percentiles de espera
+QUEUE_LAG_SAMPLE = 1000
+
 def log_segment_status_change(segment, old_status, new_status):
     """Log cambios de estado de segmentos"""
     logger.info(
         f"Segment {segment.id} status changed: {old_status} -> {new_status} "
-        f"for customer {segment.trip.customer.user.email}"
+        f"for trip {segment.trip_id}"
     )
 
 def check_system_health():
     """Verificar salud del sistema"""
-    today = timezone.now().date()
+    now = timezone.now()
+    today_start, today_end = day_range()
     
     # Verificar segmentos sin actualizar
     stale_segments = TripSegment.objects.filter(
-        scheduled_datetime__date=today,
-        status='pending',
-        scheduled_datetime__lt=timezone.now()
+        scheduled_datetime__gte=today_start,
+        scheduled_datetime__lt=min(now, today_end),
+        status='pending'
     )
     
     if stale_segments.exists():
@@ -30,6 +40,51 @@ def check_system_health():
     return {
         'stale_segments': stale_segments.count(),
         'total_segments_today': TripSegment.objects.filter(
-            scheduled_datetime__date=today
-        ).count()
+            scheduled_datetime__gte=today_start,
+            scheduled_datetime__lt=today_end
+        ).count(),
+        'geocoding_cache': dict(geocoding_cache.stats),
+        'message_queues': queue_lag()
     }
+
+def _percentile(values, percent):
+    # Nearest-rank sobre una lista ordenada
+    if not values:
+        return None
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+def queue_lag(window=timedelta(hours=1), now=None):
+    """Espera en cola (segundos) de los mensajes salientes, por cola.
+
+    ``pending``/``oldest_pending_seconds`` muestran el atraso actual; los
+    percentiles, la espera que tuvieron los mensajes tomados en la ventana.
+    ``stale_sending`` cuenta los trabados en 'sending' (se registra un warning).
+    """
+    now = now or timezone.now()
+    stale = dict(
+        stale_sending(now).order_by().values('queue').annotate(count=Count('id')).values_list('queue', 'count')
+    )
+    stats = {}
+    for queue in QUEUES:
+        if stale.get(queue):
+            logger.warning(f"{stale[queue]} outbound messages stuck in 'sending' on queue {queue}")
+
+        pending = OutboundMessage.objects.filter(
+            queue=queue, status='queued', started_at__isnull=True
+        ).aggregate(count=Count('id'), oldest=Min('created_at'))
+        
+        started = OutboundMessage.objects.filter(
+            queue=queue, started_at__gte=now - window
+        ).order_by('-started_at').values_list('created_at', 'started_at')[:QUEUE_LAG_SAMPLE]
+        lags = sorted((started_at - created_at).total_seconds() for created_at, started_at in started)
+        
+        stats[queue] = {
+            'pending': pending['count'],
+            'oldest_pending_seconds': (now - pending['oldest']).total_seconds() if pending['oldest'] else 0,
+            'samples': len(lags),
+            'p50': _percentile(lags, 50),
+            'p95': _percentile(lags, 95),
+            'max': lags[-1] if lags else None,
+            'stale_sending': stale.get(queue, 0),
+        }
+    return stats
@@ -0,0 +1,254 @@
+# travel/notifications.py
+import base64
+import logging
+import threading
+import time
+import weakref
+from collections import Counter
+from datetime import datetime
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from .events import get_broker
+from .models import Customer, Notification
+from .snapshot import invalidate_customer_snapshot
+
+logger = logging.getLogger(__name__)
+
+IN_APP = 'in_app'
+EMAIL = 'email'
+WHATSAPP = 'whatsapp'
+
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+_local = threading.local()
+
+
+class _Anchor:
+    """Callback vacío que cada evento registra en ``transaction.on_commit``.
+
+    Si el savepoint donde se emitió el evento hace rollback, Django descarta
+    sus callbacks; el outbox guarda solo una referencia débil al ancla y así
+    sabe, al hacer commit, qué eventos siguen vigentes.
+    """
+
+    def __call__(self):
+        pass
+
+
+def _always():
+    return True
+
+
+class NotificationOutbox:
+    """Notificaciones pendientes de la transacción actual.
+
+    Se insertan con un solo ``bulk_create`` al hacer commit; la entrega por
+    email/WhatsApp queda en manos de la tarea ``deliver_notifications``. Los
+    eventos emitidos dentro de un savepoint que luego hizo rollback se omiten.
+    """
+
+    def __init__(self, transactional=True):
+        self.transactional = transactional
+        self.events = {}
+
+    def add(self, customer_id, title, message, channels, dedupe_key):
+        if self.transactional:
+            anchor = _Anchor()
+            transaction.on_commit(anchor)
+            alive = weakref.ref(anchor)
+        else:
+            alive = _always
+        key = (customer_id, dedupe_key or (title, message))
+        event = self.events.setdefault(key, {
+            'customer_id': customer_id,
+            'title': title,
+            'message': message,
+            'sources': [],
+        })
+        # Mismo evento emitido por varios receivers: se unen los canales vigentes
+        event['sources'].append((alive, set(channels)))
+
+    def confirmed_events(self):
+        """(evento, canales) de los eventos con al menos un emisor no revertido"""
+        for event in self.events.values():
+            channels = [channels for alive, channels in event['sources'] if alive()]
+            if channels:
+                yield event, set().union(*channels)
+
+    def __call__(self):
+        """Vaciar el buffer (se ejecuta en transaction.on_commit)"""
+        current = getattr(_local, 'outbox', None)
+        if current is not None and current() is self:
+            _local.outbox = None
+        events = list(self.confirmed_events())
+        if not events:
+            return []
+
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create([
+                Notification(
+                    customer_id=event['customer_id'],
+                    title=event['title'],
+                    message=event['message'],
+                    channels=sorted(channels - {IN_APP}),
+                ) for event, channels in events
+            ])
+            # bulk_create no dispara signals: el contador se ajusta aquí
+            adjust_unread_counts(Counter(n.customer_id for n in notifications))
+        invalidate_customer_snapshot(*{n.customer_id for n in notifications})
+        # Ya se está en on_commit: avisar directo a los long-polls
+        publish_feed({n.customer_id for n in notifications})
+
+        pending_ids = [n.id for n in notifications if n.channels]
+        if pending_ids:
+            from .tasks import deliver_notifications
+            deliver_notifications.delay(pending_ids)
+        return notifications
+
+
+def adjust_unread_counts(deltas):
+    """Sumar/restar al contador de no leídas: {customer_id: delta}.
+
+    Un UPDATE por cada delta distinto (normalmente uno solo), resuelto en la
+    base de datos con F() para no perder incrementos concurrentes.
+    """
+    by_delta = {}
+    for customer_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(customer_id)
+
+    for delta, customer_ids in by_delta.items():
+        Customer.objects.filter(pk__in=customer_ids).update(
+            unread_notifications=Greatest(F('unread_notifications') + delta, 0)
+        )
+
+
+def mark_notifications_read(customer_id, notification_ids=None):
+    """Marcar como leídas (todas o las indicadas) y descontar del contador"""
+    notifications = Notification.objects.filter(customer_id=customer_id, read=False)
+    if notification_ids is not None:
+        notifications = notifications.filter(id__in=notification_ids)
+
+    with transaction.atomic():
+        # update() devuelve solo las filas que cambiaron: dos requests
+        # concurrentes no descuentan la misma notificación dos veces
+        updated = notifications.update(read=True)
+        adjust_unread_counts({customer_id: -updated})
+    if updated:
+        invalidate_customer_snapshot(customer_id)
+    return updated
+
+
+def encode_cursor(notification):
+    """Cursor opaco para la posición (created_at, id) de una notificación"""
+    raw = f'{notification.created_at.isoformat()}|{notification.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) de un cursor; ValueError si es inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, notification_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(notification_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Cursor inválido: {cursor}') from e
+
+
+def notification_page(customer_id, cursor=None, limit=FEED_PAGE_SIZE):
+    """Página de notificaciones (más recientes primero) y cursor de la siguiente.
+
+    Paginación por keyset sobre (created_at, id): cada página es un rango del
+    índice notification_feed_idx, sin OFFSET.
+    """
+    limit = max(1, min(limit, FEED_MAX_PAGE_SIZE))
+    notifications = Notification.objects.filter(customer_id=customer_id).order_by('-created_at', '-id')
+    if cursor:
+        created_at, notification_id = decode_cursor(cursor)
+        notifications = notifications.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=notification_id)
+        )
+
+    page = list(notifications[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def notifications_after(customer_id, cursor, limit=FEED_MAX_PAGE_SIZE):
+    """Notificaciones más nuevas que el cursor, en orden cronológico"""
+    notifications = Notification.objects.filter(customer_id=customer_id)
+    if cursor:
+        created_at, notification_id = decode_cursor(cursor)
+        notifications = notifications.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=notification_id)
+        )
+    return list(notifications.order_by('created_at', 'id')[:limit])
+
+
+def feed_channel(customer_id):
+    return f'notifications:customer:{customer_id}'
+
+
+def publish_feed(customer_ids):
+    """Avisar a los long-polls de esos clientes que hay notificaciones nuevas"""
+    try:
+        get_broker().publish([feed_channel(customer_id) for customer_id in customer_ids], {'new': True})
+    except Exception:
+        logger.exception("Error publicando aviso de notificaciones")
+
+
+def touch_feed(*customer_ids):
+    """Igual que publish_feed, pero al confirmar la transacción actual"""
+    customer_ids = [customer_id for customer_id in customer_ids if customer_id]
+    if customer_ids:
+        transaction.on_commit(partial(publish_feed, customer_ids))
+
+
+async def wait_for_notifications(customer_id, cursor, timeout):
+    """Long-poll: esperar hasta ``timeout`` segundos por notificaciones nuevas.
+
+    La espera es una suscripción al canal del cliente en el broker de eventos
+    (travel/events.py): no ocupa un hilo y la base de datos se lee solo al
+    inicio y cuando llega un aviso.
+    """
+    deadline = time.monotonic() + timeout
+    # Suscribirse antes de consultar: un aviso entre ambos pasos no se pierde
+    async with get_broker().subscribe([feed_channel(customer_id)]) as subscription:
+        while True:
+            notifications = await sync_to_async(notifications_after)(customer_id, cursor)
+            if notifications:
+                return notifications
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            await subscription.get(remaining)
+
+
+def _current_outbox():
+    # Solo Django (su lista on_commit) retiene el outbox: si la transacción o
+    # el savepoint donde se creó hace rollback, la referencia débil muere
+    outbox = _local.outbox() if getattr(_local, 'outbox', None) is not None else None
+    if outbox is None:
+        outbox = NotificationOutbox()
+        transaction.on_commit(outbox)
+        _local.outbox = weakref.ref(outbox)
+    return outbox
+
+
+def queue_notification(customer_id, title, message, channels=(IN_APP,), dedupe_key=None):
+    """Encolar una notificación para el cliente.
+
+    Dentro de una transacción se acumula y se inserta al hacer commit;
+    fuera de una transacción se inserta de inmediato.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        outbox = NotificationOutbox(transactional=False)
+        outbox.add(customer_id, title, message, channels, dedupe_key)
+        return outbox()
+
+    _current_outbox().add(customer_id, title, message, channels, dedupe_key)
+    return None
@@ -0,0 +1,62 @@
+# travel/outbound.py
+"""Mensajes salientes fuera del request.
+
+Las vistas registran un OutboundMessage, encolan su entrega y responden 202
+con la URL de estado; la llamada a Twilio ocurre en un worker. Las
+emergencias van a una cola propia con un worker reservado
+(docker-compose.prod.yml), así un backlog de recordatorios o broadcasts no
+las retrasa.
+"""
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from .models import OutboundMessage
+
+EMERGENCY_QUEUE = 'emergency'
+MESSAGING_QUEUE = 'messaging'
+QUEUES = (EMERGENCY_QUEUE, MESSAGING_QUEUE)
+
+# Un mensaje en 'sending' por más de esto quedó de un worker caído a mitad del
+# envío (los reintentos normales terminan en segundos)
+SENDING_TIMEOUT = timedelta(minutes=getattr(settings, 'OUTBOUND_SENDING_TIMEOUT_MINUTES', 10))
+
+
+def enqueue(message_id, queue):
+    from .tasks import deliver_outbound_message
+    deliver_outbound_message.apply_async((message_id,), queue=queue)
+
+
+def queue_whatsapp(customer, recipient, body, kind, queue=MESSAGING_QUEUE):
+    """Registrar un WhatsApp y encolar su entrega al confirmar la transacción"""
+    message = OutboundMessage.objects.create(
+        customer=customer,
+        recipient=recipient,
+        body=body,
+        kind=kind,
+        queue=queue
+    )
+    transaction.on_commit(partial(enqueue, message.id, queue))
+    return message
+
+
+def stale_sending(now=None):
+    """Mensajes trabados en 'sending' más allá de SENDING_TIMEOUT"""
+    now = now or timezone.now()
+    return OutboundMessage.objects.filter(status='sending', started_at__lt=now - SENDING_TIMEOUT)
+
+
+def delivery_info(message):
+    """Estado de entrega para el cliente (sin destinatario ni texto)"""
+    return {
+        'id': message.id,
+        'kind': message.kind,
+        'status': message.status,
+        'status_display': message.get_status_display(),
+        'created_at': message.created_at.isoformat(),
+        'sent_at': message.sent_at.isoformat() if message.sent_at else None,
+        'error': message.error if message.status == 'failed' else '',
+        'status_url': reverse('delivery_status', args=[message.id]),
+    }
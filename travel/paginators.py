@@ -0,0 +1,47 @@
+# travel/paginators.py
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# Bajo este umbral el COUNT(*) exacto es barato y se prefiere
+ESTIMATED_COUNT_THRESHOLD = 10_000
+
+
+def estimate_count(queryset):
+    """Filas estimadas por PostgreSQL para la tabla completa (None si no aplica).
+
+    Solo sin filtros: se usa la estadística de la tabla (pg_class.reltuples),
+    que no recorre la tabla. Con filtros la estimación del planner puede
+    errar por órdenes de magnitud (páginas vacías o inexistentes, "Seleccionar
+    los N" con un N falso), así que se deja el conteo exacto.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    # -1 (PostgreSQL 14+) o 0 si la tabla nunca se analizó
+    return row[0] if row and row[0] > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginador que evita el COUNT(*) exacto del listado completo de tablas grandes.
+
+    Para listados de millones de filas sin filtrar el total exacto solo sirve
+    para mostrar el número de páginas; una estimación alcanza y responde en
+    milisegundos. Con filtros o búsqueda se cuenta exacto.
+    """
+    threshold = ESTIMATED_COUNT_THRESHOLD
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate > self.threshold:
+                return estimate
+        return super().count
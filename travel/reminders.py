@@ -0,0 +1,98 @@
+# travel/reminders.py
+"""Rueda de tiempo de recordatorios.
+
+Cada segmento se recuerda REMINDER_LEAD_HOURS antes del servicio. Las horas
+de recordatorio se agrupan en slots de REMINDER_SLOT_MINUTES; una vuelta
+periódica (tasks.schedule_reminders) encola con ETA una tarea por slot con
+recordatorios dentro del horizonte, así los envíos siguen la distribución
+horaria de los servicios en vez de concentrarse en un batch diario.
+
+La tarea de cada slot vuelve a consultar al ejecutarse: un segmento
+reprogramado se recuerda en el slot de su nueva hora, y ``reminder_sent_for``
+(la fecha para la que ya se envió) evita duplicados aunque una tarea se
+entregue dos veces.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from .models import TripSegment
+
+REMINDER_LEAD = timedelta(hours=getattr(settings, 'REMINDER_LEAD_HOURS', 24))
+REMINDER_SLOT = timedelta(minutes=getattr(settings, 'REMINDER_SLOT_MINUTES', 5))
+REMINDER_HORIZON = timedelta(hours=getattr(settings, 'REMINDER_HORIZON_HOURS', 48))
+REMINDER_STATUSES = ('confirmed', 'pending')
+
+
+def slot_start(moment):
+    """Inicio del slot que contiene ``moment`` (UTC, alineado a REMINDER_SLOT)"""
+    seconds = REMINDER_SLOT.total_seconds()
+    timestamp = moment.timestamp()
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
+
+def pending_reminders():
+    """Segmentos activos sin recordatorio enviado para su fecha actual"""
+    return TripSegment.objects.filter(
+        status__in=REMINDER_STATUSES
+    ).exclude(reminder_sent_for=F('scheduled_datetime'))
+
+
+def due_between(start, end):
+    """Pendientes cuya hora de recordatorio cae en [start, end)"""
+    return pending_reminders().filter(
+        scheduled_datetime__gte=start + REMINDER_LEAD,
+        scheduled_datetime__lt=end + REMINDER_LEAD
+    )
+
+
+def overdue(now):
+    """Pendientes cuyo slot ya pasó pero el servicio aún no ocurre (reprogramados, rueda detenida)"""
+    return pending_reminders().filter(
+        scheduled_datetime__gt=now,
+        scheduled_datetime__lt=slot_start(now) + REMINDER_LEAD
+    )
+
+
+def slots_in_horizon(now):
+    """Slots desde el actual hasta el horizonte que tienen algún recordatorio pendiente"""
+    scheduled = due_between(slot_start(now), now + REMINDER_HORIZON).order_by().values_list(
+        'scheduled_datetime', flat=True
+    )
+    return sorted({slot_start(value - REMINDER_LEAD) for value in scheduled.iterator()})
+
+
+def claim(segments):
+    """Marcar los segmentos como recordados y devolver sus ids.
+
+    Con SKIP LOCKED dos tareas concurrentes nunca reclaman el mismo segmento.
+    El envío ocurre después; los que no se pudieron enviar se devuelven con
+    ``release`` y la rueda los retoma como atrasados.
+    """
+    with transaction.atomic():
+        ids = list(segments.order_by().select_for_update(skip_locked=True).values_list('id', flat=True))
+        TripSegment.objects.filter(id__in=ids).update(reminder_sent_for=F('scheduled_datetime'))
+    return ids
+
+
+def release(segment_ids):
+    """Deshacer el claim de recordatorios que no se enviaron"""
+    segment_ids = list(segment_ids)
+    if segment_ids:
+        TripSegment.objects.filter(id__in=segment_ids).update(reminder_sent_for=None)
+    return len(segment_ids)
+
+
+def _slot_key(slot):
+    return f'reminder-slot:{slot.isoformat()}'
+
+
+def mark_slot_scheduled(slot):
+    """True solo la primera vez: cada slot se encola una vez por horizonte"""
+    timeout = int((REMINDER_HORIZON + 2 * REMINDER_SLOT).total_seconds())
+    return cache.add(_slot_key(slot), True, timeout=timeout)
+
+
+def release_slot(slot):
+    cache.delete(_slot_key(slot))
@@ -0,0 +1,72 @@
+# travel/services/directions_cache.py
+import time
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .geocoding_cache import normalize_address
+
+# ~110 m de latitud: orígenes cercanos comparten la misma ruta cacheada
+DIRECTIONS_GRID_DEGREES = getattr(settings, 'DIRECTIONS_GRID_DEGREES', 0.001)
+# Antigüedad máxima para servir una ruta sin refrescarla (segundos)
+DIRECTIONS_MAX_AGE = getattr(settings, 'DIRECTIONS_MAX_AGE', 60 * 15)
+# Tiempo que una ruta vencida se sigue sirviendo mientras se refresca
+DIRECTIONS_STALE_TTL = getattr(settings, 'DIRECTIONS_STALE_TTL', 60 * 60 * 24)
+
+
+def quantize_origin(origin: str) -> str:
+    """Llevar un origen "lat,lng" a la celda de la grilla; otras cadenas se normalizan"""
+    try:
+        lat, lng = (float(value) for value in origin.split(','))
+    except (ValueError, AttributeError):
+        return normalize_address(origin)
+
+    grid = DIRECTIONS_GRID_DEGREES
+    return f'{round(lat / grid) * grid:.5f},{round(lng / grid) * grid:.5f}'
+
+
+def directions_key(origin: str, destination_key: str, mode: str) -> str:
+    return f'directions:{quantize_origin(origin)}:{destination_key}:{mode}'
+
+
+def fetch_directions(maps_service, origin: str, destination: str, mode: str = 'driving',
+                     destination_key: str = None, segment_id: int = None) -> Optional[Dict]:
+    """Consultar la API y guardar el resultado (y el resumen en el segmento)"""
+    directions = maps_service.get_directions(origin, destination, mode=mode)
+
+    # Las rutas mock (sin API o con error) no se cachean
+    if directions and not directions.get('is_mock'):
+        key = directions_key(origin, destination_key or normalize_address(destination), mode)
+        cache.set(key, {'directions': directions, 'fetched_at': time.time()}, DIRECTIONS_STALE_TTL)
+
+        if segment_id:
+            from ..models import TripSegment
+            TripSegment.objects.filter(pk=segment_id).update(
+                directions_duration=directions['duration'][:50],
+                directions_distance=directions['distance'][:50],
+                last_directions_update=timezone.now()
+            )
+    return directions
+
+
+def get_directions(maps_service, origin: str, destination: str, mode: str = 'driving',
+                   destination_key: str = None, segment_id: int = None) -> Tuple[Optional[Dict], Dict]:
+    """Obtener direcciones desde el cache; las vencidas se refrescan en segundo plano.
+
+    Devuelve (direcciones, metadatos del cache).
+    """
+    destination_key = destination_key or normalize_address(destination)
+    key = directions_key(origin, destination_key, mode)
+
+    entry = cache.get(key)
+    if entry:
+        age = int(time.time() - entry['fetched_at'])
+        stale = age >= DIRECTIONS_MAX_AGE
+        # Solo un refresco en curso por ruta
+        if stale and cache.add(f'{key}:refreshing', 1, 60):
+            from ..tasks import refresh_directions
+            refresh_directions.delay(origin, destination, mode, destination_key, segment_id)
+        return entry['directions'], {'hit': True, 'age': age, 'stale': stale}
+
+    directions = fetch_directions(maps_service, origin, destination, mode, destination_key, segment_id)
+    return directions, {'hit': False, 'age': 0, 'stale': False}
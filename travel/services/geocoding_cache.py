@@ -0,0 +1,177 @@
+# travel/services/geocoding_cache.py
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from django.utils import timezone
+
+
+def normalize_address(address: str) -> str:
+    """Normalizar una dirección para usarla como clave de cache"""
+    normalized = unicodedata.normalize('NFKC', address or '').casefold()
+    return ' '.join(normalized.replace(',', ' , ').split()).strip(' ,.')[:255]
+
+
+class GeocodingCache:
+    """Cache de geocoding en dos niveles: LRU en memoria + tabla GeocodedAddress.
+
+    Los resultados negativos (dirección no encontrada) también se guardan,
+    con un TTL más corto, para no repetir consultas que van a fallar.
+    """
+
+    def __init__(self, max_size: int = None, ttl: int = None, negative_ttl: int = None):
+        self.max_size = max_size or getattr(settings, 'GEOCODING_CACHE_SIZE', 2048)
+        self.ttl = ttl or getattr(settings, 'GEOCODING_CACHE_TTL', 60 * 60 * 24 * 30)
+        self.negative_ttl = negative_ttl or getattr(settings, 'GEOCODING_NEGATIVE_TTL', 60 * 60 * 24)
+        self.stats = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ttl_for(self, result: Optional[Dict]) -> int:
+        return self.ttl if result else self.negative_ttl
+
+    def get(self, address: str) -> Tuple[bool, Optional[Dict]]:
+        """Devuelve (encontrado_en_cache, resultado)"""
+        key = normalize_address(address)
+        if not key:
+            return True, None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return True, entry[1]
+
+        from ..models import GeocodedAddress
+        row = GeocodedAddress.objects.filter(address_key=key).first()
+        if row:
+            result = self._row_to_result(row)
+            age = (timezone.now() - row.updated_at).total_seconds()
+            if age < self._ttl_for(result):
+                self.stats['db_hits'] += 1
+                self._remember(key, result, self._ttl_for(result) - age)
+                return True, result
+
+        self.stats['misses'] += 1
+        return False, None
+
+    def set(self, address: str, result: Optional[Dict]):
+        """Guardar un resultado (None = dirección no encontrada)"""
+        key = normalize_address(address)
+        if not key:
+            return
+
+        from ..models import GeocodedAddress
+        GeocodedAddress.objects.update_or_create(
+            address_key=key,
+            defaults={
+                'address': address[:255],
+                'found': result is not None,
+                'latitude': result['lat'] if result else None,
+                'longitude': result['lng'] if result else None,
+                'formatted_address': (result or {}).get('formatted_address', '')[:255],
+                'place_id': (result or {}).get('place_id', '')[:255],
+            }
+        )
+        self._remember(key, result, self._ttl_for(result))
+
+    def get_many(self, addresses) -> Dict[str, Optional[Dict]]:
+        """Resultados cacheados para varias direcciones (solo los aciertos)"""
+        found, pending = {}, {}
+        for address in addresses:
+            key = normalize_address(address)
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.stats['memory_hits'] += 1
+                found[address] = entry[1]
+            elif key:
+                pending[key] = address
+
+        from ..models import GeocodedAddress
+        keys = list(pending)
+        now = timezone.now()
+        db_hits = 0
+        for start in range(0, len(keys), 500):
+            for row in GeocodedAddress.objects.filter(address_key__in=keys[start:start + 500]):
+                result = self._row_to_result(row)
+                age = (now - row.updated_at).total_seconds()
+                if age < self._ttl_for(result):
+                    db_hits += 1
+                    found[pending[row.address_key]] = result
+                    self._remember(row.address_key, result, self._ttl_for(result) - age)
+
+        self.stats['db_hits'] += db_hits
+        self.stats['misses'] += len(pending) - db_hits
+        return found
+
+    def set_many(self, results: Dict[str, Optional[Dict]]):
+        """Guardar varios resultados con un upsert por lote"""
+        from ..models import GeocodedAddress
+        rows = {}
+        for address, result in results.items():
+            key = normalize_address(address)
+            if key:
+                rows[key] = GeocodedAddress(
+                    address_key=key,
+                    address=address[:255],
+                    found=result is not None,
+                    latitude=result['lat'] if result else None,
+                    longitude=result['lng'] if result else None,
+                    formatted_address=(result or {}).get('formatted_address', '')[:255],
+                    place_id=(result or {}).get('place_id', '')[:255],
+                )
+                self._remember(key, result, self._ttl_for(result))
+
+        GeocodedAddress.objects.bulk_create(
+            rows.values(),
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['address_key'],
+            update_fields=['address', 'found', 'latitude', 'longitude',
+                           'formatted_address', 'place_id', 'updated_at']
+        )
+
+    def purge_expired(self) -> int:
+        """Eliminar de la tabla las entradas vencidas"""
+        from ..models import GeocodedAddress
+        now = timezone.now()
+        deleted, _ = GeocodedAddress.objects.filter(
+            found=True, updated_at__lt=now - timedelta(seconds=self.ttl)
+        ).delete()
+        negative, _ = GeocodedAddress.objects.filter(
+            found=False, updated_at__lt=now - timedelta(seconds=self.negative_ttl)
+        ).delete()
+        return deleted + negative
+
+    def clear(self):
+        """Vaciar el nivel en memoria (la tabla se mantiene)"""
+        with self._lock:
+            self._entries.clear()
+        self.stats.clear()
+
+    def _remember(self, key: str, result: Optional[Dict], ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _row_to_result(row) -> Optional[Dict]:
+        if not row.found:
+            return None
+        return {
+            'lat': row.latitude,
+            'lng': row.longitude,
+            'formatted_address': row.formatted_address,
+            'place_id': row.place_id,
+        }
+
+
+# Instancia compartida por proceso
+geocoding_cache = GeocodingCache()
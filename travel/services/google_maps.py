@@ -1,8 +1,13 @@
 # travel/services/google_maps.py
+import time
 import googlemaps
 import requests
 from django.conf import settings
 from typing import Dict, List, Optional, Tuple
+from .geocoding_cache import geocoding_cache
+
+# Segundos hasta que un next_page_token de Places es válido
+PLACES_PAGE_TOKEN_DELAY = 2
 
 class GoogleMapsService:
     """Servicio para integración con Google Maps API"""
@@ -19,23 +24,37 @@ class GoogleMapsService:
         return self.client is not None
     
     def geocode_address(self, address: str) -> Optional[Dict]:
-        """Obtener coordenadas de una dirección"""
+        """Obtener coordenadas de una dirección (con cache en memoria y en BD)"""
+        cached, result = geocoding_cache.get(address)
+        if cached:
+            return result
+        
         if not self.is_available():
             return None
         
         try:
-            geocode_result = self.client.geocode(address)
-            if geocode_result:
-                location = geocode_result[0]['geometry']['location']
-                return {
-                    'lat': location['lat'],
-                    'lng': location['lng'],
-                    'formatted_address': geocode_result[0]['formatted_address'],
-                    'place_id': geocode_result[0]['place_id']
-                }
+            result = self.geocode_remote(address)
         except Exception as e:
+            # Errores transitorios (red, cuota) no se cachean
             print(f"Error en geocoding: {e}")
             return None
+        
+        geocoding_cache.set(address, result)
+        return result
+    
+    def geocode_remote(self, address: str) -> Optional[Dict]:
+        """Consulta directa a la API de geocoding (sin cache, propaga los errores)"""
+        geocode_result = self.client.geocode(address)
+        if not geocode_result:
+            return None
+        
+        location = geocode_result[0]['geometry']['location']
+        return {
+            'lat': location['lat'],
+            'lng': location['lng'],
+            'formatted_address': geocode_result[0]['formatted_address'],
+            'place_id': geocode_result[0]['place_id']
+        }
     
     def reverse_geocode(self, lat: float, lng: float) -> Optional[Dict]:
         """Obtener dirección de coordenadas"""
@@ -106,7 +125,8 @@ class GoogleMapsService:
                     'duration': '15 min'
                 }
             ],
-            'polyline': ''
+            'polyline': '',
+            'is_mock': True
         }
     
     def find_nearby_places(self, lat: float, lng: float, place_type: str = 'restaurant', radius: int = 1500) -> List[Dict]:
@@ -115,30 +135,51 @@ class GoogleMapsService:
             return self._get_mock_places(place_type)
         
         try:
-            places_result = self.client.places_nearby(
-                location=(lat, lng),
-                radius=radius,
-                type=place_type,
-                language='es'
-            )
-            
-            places = []
-            for place in places_result['results'][:10]:  # Máximo 10 resultados
-                places.append({
-                    'name': place['name'],
-                    'rating': place.get('rating', 0),
-                    'price_level': place.get('price_level', 0),
-                    'vicinity': place['vicinity'],
-                    'place_id': place['place_id'],
-                    'types': place['types'],
-                    'photo_reference': place.get('photos', [{}])[0].get('photo_reference') if place.get('photos') else None
-                })
-            
-            return places
+            return self.search_nearby_places(lat, lng, place_type, radius)[:10]  # Máximo 10 resultados
         except Exception as e:
             print(f"Error buscando lugares: {e}")
             return self._get_mock_places(place_type)
     
+    def search_nearby_places(self, lat: float, lng: float, place_type: str, radius: int,
+                             pages: int = 1) -> List[Dict]:
+        """Consulta directa a Places API (propaga los errores, sin fallback mock).
+        
+        Con ``pages`` > 1 sigue ``next_page_token`` (20 resultados por página,
+        hasta 3); cada token tarda unos segundos en activarse, así que pedir
+        varias páginas es para tareas en segundo plano.
+        """
+        places_result = self.client.places_nearby(
+            location=(lat, lng),
+            radius=radius,
+            type=place_type,
+            language='es'
+        )
+        results = places_result['results']
+        for _ in range(pages - 1):
+            token = places_result.get('next_page_token')
+            if not token:
+                break
+            time.sleep(PLACES_PAGE_TOKEN_DELAY)
+            places_result = self.client.places_nearby(page_token=token)
+            results = results + places_result['results']
+        
+        places = []
+        for place in results:
+            location = place['geometry']['location']
+            places.append({
+                'name': place['name'],
+                'rating': place.get('rating', 0),
+                'price_level': place.get('price_level', 0),
+                'vicinity': place['vicinity'],
+                'place_id': place['place_id'],
+                'types': place['types'],
+                'lat': location['lat'],
+                'lng': location['lng'],
+                'photo_reference': place.get('photos', [{}])[0].get('photo_reference') if place.get('photos') else None
+            })
+        
+        return places
+    
     def _get_mock_places(self, place_type: str) -> List[Dict]:
         """Lugares mock para desarrollo"""
         mock_places = {
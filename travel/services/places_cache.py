@@ -0,0 +1,175 @@
+# travel/services/places_cache.py
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Tiempo en que un tile se considera fresco y tiempo máximo que se conserva
+# para seguir respondiendo si la API falla o se agota la cuota (segundos)
+PLACES_CACHE_TTL = getattr(settings, 'PLACES_CACHE_TTL', 60 * 60 * 24)
+PLACES_STALE_TTL = getattr(settings, 'PLACES_STALE_TTL', 60 * 60 * 24 * 14)
+
+# Radio máximo de búsqueda (metros) -> precisión del geohash de los tiles.
+# Cada request usa un solo tile (el que contiene al usuario), consultado desde
+# su centro con el radio del bucket más media diagonal: los tiles son chicos
+# frente al radio para que la búsqueda se parezca a la del propio usuario.
+RADIUS_BUCKETS = [
+    (1000, 7),   # tiles de ~150 x 150 m
+    (1500, 7),
+    (2000, 7),
+    (3000, 6),   # tiles de ~1,2 x 0,6 km
+    (5000, 6),
+    (10000, 5),  # tiles de ~4,9 x 4,9 km
+    (20000, 5),
+]
+# Páginas de 20 resultados que se piden por tile (Places entrega hasta 3)
+PLACES_MAX_PAGES = getattr(settings, 'PLACES_MAX_PAGES', 3)
+MAX_RESULTS = 10
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_M = 6371000
+
+
+def geohash_encode(lat: float, lng: float, precision: int) -> str:
+    """Codificar coordenadas como geohash"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, value = (lng_range, lng) if even else (lat_range, lat)
+        middle = (target[0] + target[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            target[0] = middle
+        else:
+            target[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def geohash_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Límites (lat_min, lat_max, lng_min, lng_max) de un geohash"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            target = lng_range if even else lat_range
+            middle = (target[0] + target[1]) / 2
+            if (value >> shift) & 1:
+                target[0] = middle
+            else:
+                target[1] = middle
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Distancia en metros entre dos puntos"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def radius_bucket(radius: int) -> Tuple[int, int]:
+    """(radio del bucket, precisión del geohash) para un radio pedido"""
+    for bucket, precision in RADIUS_BUCKETS:
+        if radius <= bucket:
+            return bucket, precision
+    return RADIUS_BUCKETS[-1]
+
+
+def tile_for(lat: float, lng: float, radius: int) -> Tuple[str, int]:
+    """(tile, radio del bucket) que sirve un request en (lat, lng, radius)"""
+    bucket, precision = radius_bucket(radius)
+    return geohash_encode(lat, lng, precision), bucket
+
+
+def tile_search(tile: str, bucket: int) -> Tuple[float, float, int]:
+    """Centro y radio de la consulta de un tile.
+
+    El radio suma media diagonal del tile al del bucket, así el círculo
+    consultado contiene el de cualquier usuario dentro del tile.
+    """
+    lat_min, lat_max, lng_min, lng_max = geohash_bbox(tile)
+    center_lat, center_lng = (lat_min + lat_max) / 2, (lng_min + lng_max) / 2
+    return center_lat, center_lng, bucket + int(haversine(center_lat, center_lng, lat_max, lng_max)) + 1
+
+
+def _tile_key(tile: str, place_type: str, bucket: int) -> str:
+    return f'places:{tile}:{place_type}:{bucket}'
+
+
+def fetch_tile(maps_service, tile: str, place_type: str, bucket: int,
+               pages: int = PLACES_MAX_PAGES) -> Optional[List[Dict]]:
+    """Consultar la API para un tile y guardar el resultado (None si falla)"""
+    center_lat, center_lng, search_radius = tile_search(tile, bucket)
+    try:
+        places = maps_service.search_nearby_places(center_lat, center_lng, place_type, search_radius, pages=pages)
+    except Exception as e:
+        logger.warning(f"Error buscando lugares (tile {tile}): {e}")
+        return None
+
+    cache.set(
+        _tile_key(tile, place_type, bucket),
+        {'places': places, 'fetched_at': time.time(), 'complete': pages >= PLACES_MAX_PAGES},
+        PLACES_STALE_TTL
+    )
+    return places
+
+
+def get_tile_places(maps_service, tile: str, place_type: str, bucket: int) -> Optional[List[Dict]]:
+    """Lugares de un tile desde el cache.
+
+    Un tile nuevo se consulta en el request con una sola página; las páginas
+    restantes y los refrescos de tiles vencidos se completan en segundo plano
+    (con la cuota agotada se sigue sirviendo la copia vencida).
+    """
+    key = _tile_key(tile, place_type, bucket)
+    entry = cache.get(key)
+    if entry is None:
+        places = fetch_tile(maps_service, tile, place_type, bucket, pages=1)
+        if places is None or PLACES_MAX_PAGES <= 1:
+            return places
+        entry = {'places': places, 'fetched_at': time.time(), 'complete': False}
+
+    stale = time.time() - entry['fetched_at'] >= PLACES_CACHE_TTL
+    # Solo un refresco en curso por tile
+    if (stale or not entry['complete']) and cache.add(f'{key}:refreshing', 1, 60):
+        from ..tasks import refresh_places_tile
+        refresh_places_tile.delay(tile, place_type, bucket)
+    return entry['places']
+
+
+def nearby_places(maps_service, lat: float, lng: float, place_type: str = 'restaurant',
+                  radius: int = 1500) -> List[Dict]:
+    """Lugares cercanos desde el tile que contiene la ubicación"""
+    if not maps_service.is_available():
+        return maps_service._get_mock_places(place_type)
+
+    tile, bucket = tile_for(lat, lng, radius)
+    nearby = []
+    for place in get_tile_places(maps_service, tile, place_type, bucket) or []:
+        distance = haversine(lat, lng, place['lat'], place['lng'])
+        if distance <= radius:
+            nearby.append(dict(place, distance=round(distance / 1000, 1)))
+
+    return sorted(nearby, key=lambda place: place['distance'])[:MAX_RESULTS]
+
+
+def warm_location(maps_service, lat: float, lng: float, place_types: List[str], radius: int = 1500) -> int:
+    """Precargar el tile de una ubicación; devuelve cuántos tiles se consultaron"""
+    tile, bucket = tile_for(lat, lng, radius)
+    for place_type in place_types:
+        fetch_tile(maps_service, tile, place_type, bucket)
+    return len(place_types)
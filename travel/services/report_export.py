@@ -0,0 +1,281 @@
+# travel/services/report_export.py
+"""Exportes CSV/XLSX de incidencias y segmentos para reportería.
+
+Las filas se leen con ``values_list().iterator()`` (cursor del lado del
+servidor en PostgreSQL) y se escriben a medida que llegan: la memoria no
+crece con el tamaño del exporte. El CSV se emite por trozos, con iterador
+async cuando el request llega por ASGI (un iterador síncrono se acumularía
+entero antes de enviarse). El XLSX se arma en una tarea Celery con el modo
+write-only de openpyxl; el request solo recibe el link de descarga.
+"""
+import csv
+import logging
+import secrets
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from itertools import islice
+from typing import AsyncIterator, Iterator, Optional
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest, QueryDict, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from ..models import Incident, TripSegment
+
+logger = logging.getLogger(__name__)
+
+# Filas leídas de la BD por vuelta del cursor
+EXPORT_CHUNK_SIZE = 2000
+# Tope de filas por hoja de Excel (el formato admite 1.048.576)
+XLSX_SHEET_ROWS = 1_000_000
+# Prefijos que Excel interpreta como fórmula (inyección en CSV)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Los XLSX generados quedan disponibles este tiempo (segundos)
+XLSX_EXPORT_TTL = 60 * 60 * 24
+XLSX_EXPORT_DIR = 'exports'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class Column:
+    def __init__(self, header, lookup, choices=None):
+        self.header = header
+        self.lookup = lookup
+        self.labels = dict(choices) if choices else None
+
+
+INCIDENT_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Reportada', 'reported_at'),
+    Column('Título', 'title'),
+    Column('Categoría', 'category', Incident.CATEGORY_CHOICES),
+    Column('Severidad', 'severity', Incident.SEVERITY_CHOICES),
+    Column('Estado', 'status', Incident.STATUS_CHOICES),
+    Column('Nombre cliente', 'segment__trip__customer__user__first_name'),
+    Column('Apellido cliente', 'segment__trip__customer__user__last_name'),
+    Column('Servicio', 'segment__service__name'),
+    Column('Voucher', 'segment__voucher_code'),
+    Column('Pasajeros afectados', 'affected_passengers'),
+    Column('Asignada a', 'assigned_to__username'),
+    Column('Resuelta', 'resolved_at'),
+    Column('Satisfacción', 'customer_satisfaction'),
+]
+
+SEGMENT_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Voucher', 'voucher_code'),
+    Column('Programado', 'scheduled_datetime'),
+    Column('Estado', 'status', TripSegment._meta.get_field('status').choices),
+    Column('Servicio', 'service__name'),
+    Column('Tipo', 'service__service_type'),
+    Column('Destino viaje', 'trip__destination'),
+    Column('Nombre cliente', 'trip__customer__user__first_name'),
+    Column('Apellido cliente', 'trip__customer__user__last_name'),
+    Column('Email cliente', 'trip__customer__user__email'),
+    Column('Punto de encuentro', 'pickup_location'),
+    Column('Destino', 'destination_location'),
+    Column('Proveedor', 'provider'),
+]
+
+# Nombre en la URL -> (modelo, columnas, prefijo del archivo)
+EXPORTS = {
+    'incidents': (Incident, INCIDENT_COLUMNS, 'incidencias'),
+    'segments': (TripSegment, SEGMENT_COLUMNS, 'segmentos'),
+}
+
+
+def export_key(model):
+    """Nombre del exporte (clave de EXPORTS) para un modelo"""
+    return next(key for key, (export_model, _, _) in EXPORTS.items() if export_model is model)
+
+
+def iter_rows(queryset, columns) -> Iterator[list]:
+    """Filas ya formateadas (etiquetas de choices, fechas locales sin zona)"""
+    rows = queryset.values_list(*[column.lookup for column in columns])
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        values = []
+        for column, value in zip(columns, row):
+            if column.labels is not None:
+                value = column.labels.get(value, value)
+            elif isinstance(value, datetime):
+                # Excel no admite fechas con zona horaria
+                value = timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+            values.append(value)
+        yield values
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class CsvEncoder:
+    """Convierte bloques de filas en trozos de texto CSV"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.buffer = StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def _flush(self) -> str:
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+    def header(self) -> str:
+        # BOM para que Excel abra el UTF-8 con acentos correctos
+        self.buffer.write('\ufeff')
+        self.writer.writerow([column.header for column in self.columns])
+        return self._flush()
+
+    def encode(self, rows) -> str:
+        self.writer.writerows([[_csv_cell(value) for value in row] for row in rows])
+        return self._flush()
+
+
+def stream_csv(queryset, columns) -> Iterator[str]:
+    """CSV emitido en trozos de EXPORT_CHUNK_SIZE filas"""
+    encoder = CsvEncoder(columns)
+    yield encoder.header()
+    rows = iter_rows(queryset, columns)
+    while True:
+        chunk = list(islice(rows, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        yield encoder.encode(chunk)
+
+
+async def astream_csv(queryset, columns) -> AsyncIterator[str]:
+    """Versión async de stream_csv: cada bloque de filas se lee en el hilo de la BD"""
+    encoder = CsvEncoder(columns)
+    yield encoder.header()
+    rows = iter_rows(queryset, columns)
+    next_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)))
+    while chunk := await next_chunk():
+        yield encoder.encode(chunk)
+
+
+def write_xlsx(queryset, columns, destination):
+    """Escribir el XLSX en modo write-only: cada fila va directo a disco"""
+    workbook = Workbook(write_only=True)
+    headers = [column.header for column in columns]
+    sheet, sheet_rows = None, XLSX_SHEET_ROWS
+    for row in iter_rows(queryset, columns):
+        if sheet_rows >= XLSX_SHEET_ROWS:
+            sheet = workbook.create_sheet(f'Datos {len(workbook.worksheets) + 1}')
+            sheet.append(headers)
+            sheet_rows = 0
+        sheet.append(row)
+        sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet('Datos 1').append(headers)
+    workbook.save(destination)
+
+
+def export_filename(name, export_format):
+    return f'{name}-{timezone.localtime():%Y%m%d-%H%M}.{export_format}'
+
+
+def csv_response(request, queryset, columns, name):
+    """Descarga CSV en streaming; iterador async si el request llegó por ASGI"""
+    if isinstance(request, ASGIRequest):
+        content = astream_csv(queryset, columns)
+    else:
+        content = stream_csv(queryset, columns)
+    response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(name, "csv")}"'
+    return response
+
+
+def changelist_queryset(request, model):
+    """Queryset con los filtros del changelist del admin (list_filter, q, fechas, orden).
+
+    Lanza IncorrectLookupParameters si los parámetros no son válidos.
+    """
+    return admin.site.get_model_admin(model).get_changelist_instance(request).queryset
+
+
+def _job_key(token):
+    return f'report-export:{token}'
+
+
+def start_xlsx_export(user, name, params, ids=None) -> str:
+    """Encolar un exporte XLSX y devolver su token de descarga.
+
+    ``params`` son los parámetros GET del changelist ({clave: [valores]});
+    ``ids`` limita el exporte a una selección del admin.
+    """
+    from ..tasks import export_report_xlsx
+
+    token = secrets.token_urlsafe(16)
+    cache.set(_job_key(token), {
+        'user_id': user.pk,
+        'status': 'pending',
+        'filename': export_filename(EXPORTS[name][2], 'xlsx'),
+    }, XLSX_EXPORT_TTL)
+    export_report_xlsx.delay(token, name, user.pk, params, ids)
+    return token
+
+
+def export_job(token, user) -> Optional[dict]:
+    """Estado de un exporte XLSX; solo lo ve quien lo pidió"""
+    job = cache.get(_job_key(token))
+    if job is None or job['user_id'] != user.pk:
+        return None
+    return job
+
+
+def build_xlsx_export(token, name, user_id, params, ids=None):
+    """Generar el XLSX de un exporte encolado (se ejecuta en la tarea)"""
+    job = cache.get(_job_key(token))
+    if job is None:
+        return None
+
+    # El changelist se rearma con los mismos parámetros y permisos del usuario
+    model, columns, _ = EXPORTS[name]
+    request = HttpRequest()
+    request.method = 'GET'
+    request.GET = QueryDict(mutable=True)
+    for key, values in params.items():
+        request.GET.setlist(key, values)
+    request.user = User.objects.get(pk=user_id)
+    try:
+        queryset = changelist_queryset(request, model)
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        with tempfile.TemporaryFile() as output:
+            write_xlsx(queryset, columns, output)
+            output.seek(0)
+            job['path'] = default_storage.save(f'{XLSX_EXPORT_DIR}/{token}/{job["filename"]}', File(output))
+        job['status'] = 'done'
+    except Exception as e:
+        logger.exception(f"Error generando exporte {name} ({token})")
+        job.update(status='failed', error=str(e))
+    cache.set(_job_key(token), job, XLSX_EXPORT_TTL)
+    return job
+
+
+def purge_old_exports(max_age=XLSX_EXPORT_TTL) -> int:
+    """Borrar los XLSX generados hace más de ``max_age`` segundos"""
+    if not default_storage.exists(XLSX_EXPORT_DIR):
+        return 0
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    deleted = 0
+    directories, _ = default_storage.listdir(XLSX_EXPORT_DIR)
+    for directory in directories:
+        _, files = default_storage.listdir(f'{XLSX_EXPORT_DIR}/{directory}')
+        for filename in files:
+            path = f'{XLSX_EXPORT_DIR}/{directory}/{filename}'
+            if default_storage.get_modified_time(path) < cutoff:
+                default_storage.delete(path)
+                deleted += 1
+    return deleted
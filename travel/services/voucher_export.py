@@ -0,0 +1,218 @@
+# travel/services/voucher_export.py
+import hashlib
+import os
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image
+from . import vouchers
+
+# Segmentos que se preparan (y renderizan en paralelo) por vuelta
+EXPORT_CHUNK_SIZE = 50
+
+# Página A4 en puntos
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+QR_SIZE = 300
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_workers() -> int:
+    return getattr(settings, 'VOUCHER_RENDER_WORKERS', min(4, os.cpu_count() or 1))
+
+
+def render_executor(reset: bool = False) -> ProcessPoolExecutor:
+    """Pool de procesos del proceso web, creado al primer uso y compartido entre requests"""
+    global _executor
+    with _executor_lock:
+        if _executor is None or reset:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=render_workers())
+        return _executor
+
+
+def export_version(segments, export_format: str) -> Tuple[str, List[int]]:
+    """(hash del export, ids de los segmentos en orden): el hash cambia si cambia algún voucher.
+
+    La lista de ids es la que manda al emitir el export, así la cantidad de
+    páginas declarada no depende de altas o bajas posteriores.
+    """
+    digest = hashlib.sha256(export_format.encode())
+    segment_ids = []
+    for segment in segments.iterator(chunk_size=EXPORT_CHUNK_SIZE * 4):
+        content_hash, _ = vouchers.voucher_version(segment)
+        digest.update(f'{segment.voucher_code}:{content_hash};'.encode())
+        segment_ids.append(segment.id)
+    return digest.hexdigest()[:16], segment_ids
+
+
+def iter_vouchers(segments, segment_ids) -> Iterator[Tuple[int, Optional[object], Optional[bytes]]]:
+    """(id, segmento, PNG) por cada id, en orden; segmento y PNG son None si ya no existe.
+
+    Los segmentos se leen por lotes de ids y los QR faltantes se renderizan en
+    el pool de procesos compartido.
+    """
+    for start in range(0, len(segment_ids), EXPORT_CHUNK_SIZE):
+        chunk_ids = segment_ids[start:start + EXPORT_CHUNK_SIZE]
+        found = segments.in_bulk(chunk_ids)
+        chunk = [found[segment_id] for segment_id in chunk_ids if segment_id in found]
+        try:
+            entries = vouchers.ensure_vouchers(chunk, render_executor())
+        except BrokenProcessPool:
+            # Un proceso del pool murió (OOM, señal): se recrea y se reintenta el lote
+            entries = vouchers.ensure_vouchers(chunk, render_executor(reset=True))
+
+        paths = {segment.id: path for segment, path, _ in entries}
+        for segment_id in chunk_ids:
+            if segment_id not in found:
+                yield segment_id, None, None
+                continue
+            with default_storage.open(paths[segment_id], 'rb') as image:
+                yield segment_id, found[segment_id], image.read()
+
+
+class _StreamBuffer:
+    """Destino de escritura sin seek: zipfile escribe aquí y el generador vacía"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(segments, segment_ids) -> Iterator[bytes]:
+    """ZIP con un PNG por voucher, emitido archivo por archivo (omite segmentos ya borrados)"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        index = 0
+        for _, segment, png in iter_vouchers(segments, segment_ids):
+            if segment is None:
+                continue
+            index += 1
+            info = zipfile.ZipInfo(
+                f'{index:03d}-{segment.voucher_code}.png',
+                date_time=timezone.localtime(segment.scheduled_datetime).timetuple()[:6]
+            )
+            # Los PNG ya vienen comprimidos
+            archive.writestr(info, png, compress_type=zipfile.ZIP_STORED)
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+def _pdf_text(value: str) -> bytes:
+    escaped = value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(' + escaped.encode('cp1252', errors='replace') + b')'
+
+
+def _pdf_page_content(segment) -> bytes:
+    payload = vouchers.voucher_payload(segment)
+    lines = [
+        (20, payload['voucher_code']),
+        (14, payload['service']),
+        (12, payload['date']),
+        (12, payload['customer']),
+        (12, payload['location']),
+    ]
+    commands = [b'BT', b'72 760 Td']
+    for size, text in lines:
+        commands.append(b'/F1 %d Tf %s Tj 0 -%d Td' % (size, _pdf_text(text or ''), size + 8))
+    commands.append(b'ET')
+    x = (PAGE_WIDTH - QR_SIZE) // 2
+    commands.append(b'q %d 0 0 %d %d 200 cm /Im1 Do Q' % (QR_SIZE, QR_SIZE, x))
+    return b'\n'.join(commands)
+
+
+def _pdf_missing_page_content() -> bytes:
+    return b'BT 72 760 Td /F1 14 Tf %s Tj ET' % _pdf_text('Voucher no disponible: el servicio fue eliminado')
+
+
+def stream_pdf(segments, segment_ids) -> Iterator[bytes]:
+    """PDF de una página por id de ``segment_ids``, escrito objeto por objeto.
+
+    Los números de objeto se asignan de antemano (catálogo, árbol de páginas,
+    fuente y luego página/imagen/contenido por voucher), así el árbol de
+    páginas se emite al inicio y solo los offsets se acumulan hasta el final.
+    Las páginas salen de la misma lista de ids que se declara en /Kids: un
+    segmento borrado entre medio deja una página de aviso en vez de un PDF
+    inválido.
+    """
+    offsets = []
+    position = 0
+
+    def emit(data: bytes) -> bytes:
+        nonlocal position
+        position += len(data)
+        return data
+
+    def obj(number: int, body: bytes, stream: bytes = None) -> bytes:
+        offsets.append(position)
+        data = b'%d 0 obj\n' % number + body
+        if stream is not None:
+            data += b'\nstream\n' + stream + b'\nendstream'
+        return emit(data + b'\nendobj\n')
+
+    yield emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    yield obj(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    page_count = len(segment_ids)
+    kids = b' '.join(b'%d 0 R' % (4 + 3 * i) for i in range(page_count))
+    yield obj(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, page_count))
+    yield obj(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    for index, (_, segment, png) in enumerate(iter_vouchers(segments, segment_ids)):
+        page, image_number, content = 4 + 3 * index, 5 + 3 * index, 6 + 3 * index
+        if segment is None:
+            yield obj(page, (
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT, content)
+            ))
+            # Se mantiene la numeración de objetos: el de la imagen queda vacío
+            yield obj(image_number, b'null')
+            text = zlib.compress(_pdf_missing_page_content())
+            yield obj(content, b'<< /Filter /FlateDecode /Length %d >>' % len(text), text)
+            continue
+
+        image = Image.open(BytesIO(png)).convert('1')
+        # Modo '1' empaquetado por filas: 1 bit por pixel, 0 = negro
+        bitmap = zlib.compress(image.tobytes())
+        yield obj(page, (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R >> /XObject << /Im1 %d 0 R >> >> '
+            b'/Contents %d 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT, image_number, content)
+        ))
+        yield obj(image_number, (
+            b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+            b'/BitsPerComponent 1 /Filter /FlateDecode /Length %d >>' % (image.width, image.height, len(bitmap))
+        ), bitmap)
+        text = zlib.compress(_pdf_page_content(segment))
+        yield obj(content, b'<< /Filter /FlateDecode /Length %d >>' % len(text), text)
+
+    xref_offset = position
+    xref = [b'xref', b'0 %d' % (len(offsets) + 1), b'0000000000 65535 f ']
+    xref += [b'%010d 00000 n ' % offset for offset in offsets]
+    yield emit(b'\n'.join(xref) + b'\n')
+    yield emit(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(offsets) + 1, xref_offset))
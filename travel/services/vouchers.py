@@ -0,0 +1,101 @@
+# travel/services/vouchers.py
+import hashlib
+import json
+from typing import Dict, Iterable, List, Tuple
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from ..utils import generate_qr_png
+
+VOUCHER_DIR = 'vouchers'
+# Tiempo que se recuerda que un PNG ya existe en el storage (segundos)
+VOUCHER_EXISTS_TTL = 60 * 60 * 24
+
+
+def voucher_payload(segment) -> Dict:
+    """Datos codificados en el QR del voucher"""
+    return {
+        'voucher_code': segment.voucher_code,
+        'service': segment.service.name,
+        'date': segment.scheduled_datetime.strftime('%Y-%m-%d %H:%M'),
+        'customer': segment.trip.customer.user.get_full_name(),
+        'location': segment.pickup_location,
+    }
+
+
+def encode_payload(payload: Dict) -> str:
+    """JSON canónico: mismo contenido, mismos bytes y mismo hash"""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def voucher_version(segment) -> Tuple[str, str]:
+    """(hash del contenido, JSON del QR) de un segmento"""
+    data = encode_payload(voucher_payload(segment))
+    return hashlib.sha256(data.encode()).hexdigest()[:16], data
+
+
+def voucher_path(voucher_code: str, content_hash: str) -> str:
+    return f'{VOUCHER_DIR}/{voucher_code}/{content_hash}.png'
+
+
+def ensure_voucher(segment) -> Tuple[str, str]:
+    """Ruta en el storage y hash del PNG del voucher, renderizándolo solo si no existe"""
+    content_hash, data = voucher_version(segment)
+    path = voucher_path(segment.voucher_code, content_hash)
+
+    if not is_rendered(path):
+        store_voucher(segment.voucher_code, path, generate_qr_png(data))
+    return path, content_hash
+
+
+def ensure_vouchers(segments: Iterable, executor=None) -> List[Tuple[object, str, str]]:
+    """Versión por lote de ensure_voucher: (segmento, ruta, hash) en el mismo orden.
+
+    Los QR faltantes se renderizan con ``executor.map`` (p. ej. un pool de
+    procesos) y los ya generados se reutilizan desde el storage.
+    """
+    entries, pending = [], []
+    for segment in segments:
+        content_hash, data = voucher_version(segment)
+        path = voucher_path(segment.voucher_code, content_hash)
+        entries.append((segment, path, content_hash))
+        if not is_rendered(path):
+            pending.append((segment.voucher_code, path, data))
+
+    render = executor.map if executor is not None and len(pending) > 1 else map
+    images = render(generate_qr_png, [data for _, _, data in pending])
+    for (voucher_code, path, _), png in zip(pending, images):
+        store_voucher(voucher_code, path, png)
+    return entries
+
+
+def is_rendered(path: str) -> bool:
+    exists_key = f'voucher-png:{path}'
+    if cache.get(exists_key) or default_storage.exists(path):
+        cache.set(exists_key, True, VOUCHER_EXISTS_TTL)
+        return True
+    return False
+
+
+def store_voucher(voucher_code: str, path: str, png: bytes):
+    """Guardar el PNG de una versión y descartar las anteriores"""
+    saved = default_storage.save(path, ContentFile(png))
+    if saved != path:
+        # Otro proceso lo generó en paralelo; el storage renombró la copia
+        default_storage.delete(saved)
+    cache.set(f'voucher-png:{path}', True, VOUCHER_EXISTS_TTL)
+    _delete_old_versions(voucher_code, keep=path)
+
+
+def _delete_old_versions(voucher_code: str, keep: str):
+    """Eliminar los PNG de versiones anteriores del mismo voucher"""
+    directory = f'{VOUCHER_DIR}/{voucher_code}'
+    try:
+        _, files = default_storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for name in files:
+        path = f'{directory}/{name}'
+        if path != keep:
+            default_storage.delete(path)
+            cache.delete(f'voucher-png:{path}')
@@ -3,6 +3,7 @@ from twilio.rest import Client
 from django.conf import settings
 from typing import Optional, Dict
 import logging
+from .whatsapp_templates import registry as templates, TemplateError, TemplateNotFound
 
 logger = logging.getLogger(__name__)
 
@@ -55,56 +56,26 @@ class WhatsAppService:
             logger.error(f"Error sending WhatsApp message: {e}")
             return {'success': False, 'error': str(e)}
     
-    def send_template_message(self, to_phone: str, template_name: str, variables: Dict) -> Dict:
+    def send_template_message(self, to_phone: str, template_name: str, variables: Dict,
+                              language: Optional[str] = None) -> Dict:
         """Enviar mensaje usando template pre-aprobado"""
-        templates = {
-            'itinerary_reminder': """
-🌟 *AndesTravel - Recordatorio*
-
-Hola {name}! 
-
-Tu actividad de mañana:
-📍 *{service_name}*
-⏰ {datetime}
-📍 {location}
-
-Código voucher: *{voucher_code}*
-
-¿Dudas? Responde a este mensaje 📱
-            """,
-            
-            'incident_update': """
-🔧 *Actualización de tu caso #{incident_id}*
-
-Hola {name},
-
-Tu incidencia "*{incident_title}*" ha sido actualizada:
-
-Status: *{status}*
-{resolution_notes}
-
-Gracias por tu paciencia 🙏
-            """,
-            
-            'emergency_contact': """
-🚨 *AndesTravel - Soporte de Emergencia*
-
-Hola {name},
-
-Hemos recibido tu solicitud de contacto de emergencia.
-
-Un miembro de nuestro equipo te contactará en los próximos 5 minutos.
-
-Para emergencias médicas llama inmediatamente al 131 📞
-            """
-        }
-        
-        if template_name not in templates:
+        try:
+            message = self.render_template(template_name, variables, language)
+        except TemplateError as e:
+            return {'success': False, 'error': str(e)}
+        if message is None:
             return {'success': False, 'error': 'Template not found'}
         
-        message = templates[template_name].format(**variables)
         return self.send_message(to_phone, message)
     
+    def render_template(self, template_name: str, variables: Dict, language: Optional[str] = None) -> Optional[str]:
+        """Texto del template con sus variables (None si no existe; TemplateError si faltan variables)"""
+        try:
+            template = templates.get(template_name, language)
+        except TemplateNotFound:
+            return None
+        return template.render(variables)
+    
     def _format_phone(self, phone: str) -> str:
         """Formatear número de teléfono para WhatsApp"""
         # Remover espacios y caracteres especiales
@@ -0,0 +1,212 @@
+# travel/services/whatsapp_async.py
+"""Envío masivo de WhatsApp con el cliente HTTP asíncrono de Twilio.
+
+Un lote de mensajes comparte una sesión aiohttp (pool de conexiones) y se
+envía en paralelo con concurrencia acotada. Cada número de origen tiene su
+token bucket para no superar el throughput que Twilio permite por remitente;
+las respuestas 429/503 se reintentan con backoff exponencial.
+
+El límite de tasa aplica dentro de un lote (una tarea); varias tareas en
+paralelo suman sus tasas.
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from aiohttp import ClientSession, TCPConnector
+from aiohttp_retry import ExponentialRetry, RetryClient
+from django.conf import settings
+from django.utils import timezone
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.rest import Client
+from .whatsapp import WhatsAppService
+from .whatsapp_templates import registry as templates
+
+logger = logging.getLogger(__name__)
+
+TWILIO_API_URL = 'https://api.twilio.com'
+# Mensajes por segundo y ráfaga máxima por número de origen
+WHATSAPP_SEND_RATE = getattr(settings, 'WHATSAPP_SEND_RATE', 10)
+WHATSAPP_SEND_BURST = getattr(settings, 'WHATSAPP_SEND_BURST', WHATSAPP_SEND_RATE)
+# Requests simultáneos a Twilio (también el tamaño del pool de conexiones)
+WHATSAPP_MAX_CONCURRENCY = getattr(settings, 'WHATSAPP_MAX_CONCURRENCY', 20)
+WHATSAPP_MAX_RETRIES = getattr(settings, 'WHATSAPP_MAX_RETRIES', 3)
+WHATSAPP_TIMEOUT = getattr(settings, 'WHATSAPP_TIMEOUT', 10)
+
+
+class TokenBucket:
+    """Limitador de tasa: ``rate`` mensajes por segundo con ráfagas de hasta ``capacity``"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Con el lock tomado los que esperan salen en orden de llegada
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated_at is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class PooledTwilioHttpClient(AsyncTwilioHttpClient):
+    """Cliente HTTP asíncrono de Twilio con pool acotado y reintentos ante 429/503.
+
+    ``base_url`` reemplaza https://api.twilio.com (servidor Twilio falso en pruebas).
+    """
+
+    def __init__(self, base_url: str = '', concurrency: int = WHATSAPP_MAX_CONCURRENCY,
+                 max_retries: int = WHATSAPP_MAX_RETRIES, timeout: float = WHATSAPP_TIMEOUT):
+        super().__init__(pool_connections=False, timeout=timeout)
+        self.base_url = base_url.rstrip('/')
+        # Solo se reintenta lo que Twilio no procesó: un POST repetido duplicaría el mensaje
+        self.session = RetryClient(
+            client_session=ClientSession(connector=TCPConnector(limit=concurrency)),
+            retry_options=ExponentialRetry(
+                attempts=max_retries, statuses={429, 503}, retry_all_server_errors=False
+            )
+        )
+
+    async def request(self, method, url, *args, timeout=None, **kwargs):
+        if self.base_url and url.startswith(TWILIO_API_URL):
+            url = self.base_url + url[len(TWILIO_API_URL):]
+        return await super().request(method, url, *args, timeout=timeout or self.timeout, **kwargs)
+
+
+class AsyncWhatsAppSender:
+    """Remitente asíncrono: usar como ``async with`` para abrir y cerrar el pool HTTP"""
+
+    def __init__(self, service: Optional[WhatsAppService] = None, rate: float = None,
+                 burst: float = None, concurrency: int = None):
+        self.service = service or WhatsAppService()
+        self.rate = rate or WHATSAPP_SEND_RATE
+        self.burst = burst or (WHATSAPP_SEND_BURST if rate is None else rate)
+        self.concurrency = concurrency or WHATSAPP_MAX_CONCURRENCY
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.buckets = {}
+        self.http_client = None
+        self.client = None
+
+    def is_available(self) -> bool:
+        return self.service.is_available()
+
+    async def __aenter__(self):
+        self.http_client = PooledTwilioHttpClient(
+            base_url=getattr(settings, 'TWILIO_API_BASE_URL', ''),
+            concurrency=self.concurrency
+        )
+        self.client = Client(self.service.account_sid, self.service.auth_token, http_client=self.http_client)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.http_client.close()
+
+    def bucket(self, from_whatsapp: str) -> TokenBucket:
+        if from_whatsapp not in self.buckets:
+            self.buckets[from_whatsapp] = TokenBucket(self.rate, self.burst)
+        return self.buckets[from_whatsapp]
+
+    async def send(self, to_phone: str, message: str, from_whatsapp: Optional[str] = None) -> Dict:
+        """Enviar un mensaje (mismo resultado que WhatsAppService.send_message)"""
+        from_whatsapp = from_whatsapp or self.service.from_whatsapp
+        await self.bucket(from_whatsapp).acquire()
+        async with self.semaphore:
+            try:
+                message_obj = await self.client.messages.create_async(
+                    from_=from_whatsapp,
+                    to=f'whatsapp:{self.service._format_phone(to_phone)}',
+                    body=message
+                )
+            except Exception as e:
+                logger.error(f"Error sending WhatsApp message: {e}")
+                return {'success': False, 'error': str(e)}
+
+        return {
+            'success': True,
+            'message_sid': message_obj.sid,
+            'status': message_obj.status
+        }
+
+    async def send_many(self, messages: Iterable[Tuple[str, str]]) -> List[Dict]:
+        return await asyncio.gather(*(self.send(phone, body) for phone, body in messages))
+
+
+async def _send_all(sender, messages):
+    async with sender:
+        return await sender.send_many(messages)
+
+
+def send_many(messages: Iterable[Tuple[str, str]], **options) -> List[Dict]:
+    """Enviar [(teléfono, texto), ...] en paralelo y esperar los resultados (en el mismo orden).
+
+    Bloquea hasta terminar: llamar desde tareas o código síncrono, no desde
+    una corrutina.
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+
+    sender = AsyncWhatsAppSender(**options)
+    if not sender.is_available():
+        logger.warning("WhatsApp service not available - missing credentials")
+        return [{'success': False, 'error': 'Service not configured'} for _ in messages]
+
+    return asyncio.run(_send_all(sender, messages))
+
+
+def segment_variables(segment) -> Dict:
+    """Variables de template de un segmento (con trip, customer, user y service ya cargados)"""
+    return {
+        'name': segment.trip.customer.user.first_name,
+        'service_name': segment.service.name,
+        'datetime': timezone.localtime(segment.scheduled_datetime).strftime('%d/%m/%Y %H:%M'),
+        'location': segment.pickup_location or 'Por confirmar',
+        'voucher_code': segment.voucher_code
+    }
+
+
+def whatsapp_recipients(segments, opt_in: str = 'whatsapp_notifications') -> List:
+    """Segmentos cuyo pasajero tiene teléfono y acepta ``opt_in``"""
+    return [
+        segment for segment in segments
+        if segment.trip.customer.phone and getattr(segment.trip.customer, opt_in)
+    ]
+
+
+def segment_messages(segments, template_name: str, opt_in: str = 'whatsapp_notifications',
+                     language: Optional[str] = None) -> List[Tuple[str, str]]:
+    """(teléfono, texto) para los pasajeros con teléfono que aceptan ``opt_in``,
+    en el mismo orden que ``whatsapp_recipients``"""
+    recipients = whatsapp_recipients(segments, opt_in)
+    bodies = templates.render_many(template_name, (segment_variables(segment) for segment in recipients), language)
+    return [(segment.trip.customer.phone, body) for segment, body in zip(recipients, bodies)]
+
+
+def broadcast(segment_ids, template_name: str, opt_in: str = 'whatsapp_notifications',
+              language: Optional[str] = None, **options) -> Dict:
+    """Enviar ``template_name`` a los pasajeros de los segmentos.
+
+    Devuelve {'sent', 'failed', 'skipped'}; los omitidos no tienen teléfono o
+    no aceptan ese tipo de mensajes.
+    """
+    from ..models import TripSegment
+
+    # Template inexistente: falla antes de consultar o enviar nada
+    templates.get(template_name, language)
+    segments = list(TripSegment.objects.filter(
+        id__in=segment_ids
+    ).select_related('trip__customer__user', 'service'))
+    messages = segment_messages(segments, template_name, opt_in, language)
+    results = send_many(messages, **options)
+
+    sent = sum(1 for result in results if result['success'])
+    return {'sent': sent, 'failed': len(results) - sent, 'skipped': len(segments) - len(results)}
@@ -0,0 +1,199 @@
+# travel/services/whatsapp_templates.py
+"""Registro de templates de WhatsApp.
+
+Cada template se registra una vez al importar el módulo (``TravelConfig.ready``
+lo carga al iniciar): se parsea, se valida contra las variables declaradas y
+queda precompilado como lista de trozos literales con los índices donde van
+las variables. Renderizar es llenar esos índices y unir, sin volver a
+parsear el texto.
+
+Las variantes por idioma se buscan por código exacto ("pt-br"), luego por
+idioma base ("pt") y por último en LANGUAGE_CODE.
+"""
+from string import Formatter
+from typing import Dict, Iterable, List, Optional
+from django.conf import settings
+
+
+class TemplateError(ValueError):
+    """Template mal definido o variables faltantes al renderizar"""
+
+
+class TemplateNotFound(TemplateError):
+    pass
+
+
+class WhatsAppTemplate:
+    """Template precompilado: ``parts`` con literales y ``slots`` (índice, variable)"""
+
+    def __init__(self, name: str, text: str, variables: Iterable[str], language: str):
+        self.name = name
+        self.language = language
+        self.variables = frozenset(variables)
+        self.parts = []
+        self.slots = []
+
+        for literal, field, format_spec, conversion in Formatter().parse(text):
+            if literal:
+                self.parts.append(literal)
+            if field is None:
+                continue
+            # Solo {variable}: formatos y accesos obligarían a volver a str.format
+            if not field.isidentifier() or format_spec or conversion:
+                raise TemplateError(f"{name} ({language}): placeholder no soportado {{{field}}}")
+            self.slots.append((len(self.parts), field))
+            self.parts.append(None)
+
+        used = {field for _, field in self.slots}
+        if used != self.variables:
+            raise TemplateError(
+                f"{name} ({language}): variables declaradas {sorted(self.variables)} "
+                f"y usadas {sorted(used)} no coinciden"
+            )
+
+    def render(self, values: Dict) -> str:
+        parts = self.parts[:]
+        try:
+            for index, field in self.slots:
+                parts[index] = str(values[field])
+        except KeyError:
+            missing = sorted(self.variables.difference(values))
+            raise TemplateError(f"{self.name}: faltan variables {', '.join(missing)}") from None
+        return ''.join(parts)
+
+
+class TemplateRegistry:
+    def __init__(self):
+        self.templates = {}
+
+    def register(self, name: str, text: str, variables: Iterable[str], language: Optional[str] = None):
+        language = (language or settings.LANGUAGE_CODE).lower()
+        template = WhatsAppTemplate(name, text, variables, language)
+        self.templates[(name, language)] = template
+        return template
+
+    def get(self, name: str, language: Optional[str] = None) -> WhatsAppTemplate:
+        default = settings.LANGUAGE_CODE.lower()
+        language = (language or default).lower()
+        for code in (language, language.split('-')[0], default):
+            template = self.templates.get((name, code))
+            if template is not None:
+                return template
+        raise TemplateNotFound(f'Template not found: {name}')
+
+    def render(self, name: str, values: Dict, language: Optional[str] = None) -> str:
+        return self.get(name, language).render(values)
+
+    def render_many(self, name: str, rows: Iterable[Dict], language: Optional[str] = None) -> List[str]:
+        """Renderizar el mismo template para muchas filas (broadcasts): una búsqueda, un loop"""
+        render = self.get(name, language).render
+        return [render(values) for values in rows]
+
+
+registry = TemplateRegistry()
+register = registry.register
+
+
+register('itinerary_reminder', """
+🌟 *AndesTravel - Recordatorio*
+
+Hola {name}! 
+
+Tu actividad de mañana:
+📍 *{service_name}*
+⏰ {datetime}
+📍 {location}
+
+Código voucher: *{voucher_code}*
+
+¿Dudas? Responde a este mensaje 📱
+            """, ['name', 'service_name', 'datetime', 'location', 'voucher_code'], language='es')
+
+register('itinerary_reminder', """
+🌟 *AndesTravel - Reminder*
+
+Hi {name}!
+
+Your activity tomorrow:
+📍 *{service_name}*
+⏰ {datetime}
+📍 {location}
+
+Voucher code: *{voucher_code}*
+
+Questions? Reply to this message 📱
+            """, ['name', 'service_name', 'datetime', 'location', 'voucher_code'], language='en')
+
+register('incident_update', """
+🔧 *Actualización de tu caso #{incident_id}*
+
+Hola {name},
+
+Tu incidencia "*{incident_title}*" ha sido actualizada:
+
+Status: *{status}*
+{resolution_notes}
+
+Gracias por tu paciencia 🙏
+            """, ['incident_id', 'name', 'incident_title', 'status', 'resolution_notes'], language='es')
+
+register('incident_update', """
+🔧 *Update on your case #{incident_id}*
+
+Hi {name},
+
+Your incident "*{incident_title}*" has been updated:
+
+Status: *{status}*
+{resolution_notes}
+
+Thank you for your patience 🙏
+            """, ['incident_id', 'name', 'incident_title', 'status', 'resolution_notes'], language='en')
+
+register('emergency_contact', """
+🚨 *AndesTravel - Soporte de Emergencia*
+
+Hola {name},
+
+Hemos recibido tu solicitud de contacto de emergencia.
+
+Un miembro de nuestro equipo te contactará en los próximos 5 minutos.
+
+Para emergencias médicas llama inmediatamente al 131 📞
+            """, ['name'], language='es')
+
+register('emergency_contact', """
+🚨 *AndesTravel - Emergency Support*
+
+Hi {name},
+
+We have received your emergency contact request.
+
+A member of our team will contact you within the next 5 minutes.
+
+For medical emergencies call 131 immediately 📞
+            """, ['name'], language='en')
+
+register('departure_delay', """
+⏳ *AndesTravel - Aviso de retraso*
+
+Hola {name},
+
+Tu actividad *{service_name}* programada para el {datetime} presenta un retraso.
+
+Te avisaremos apenas tengamos la nueva hora de salida.
+
+Código voucher: *{voucher_code}*
+            """, ['name', 'service_name', 'datetime', 'voucher_code'], language='es')
+
+register('departure_delay', """
+⏳ *AndesTravel - Delay notice*
+
+Hi {name},
+
+Your activity *{service_name}* scheduled for {datetime} is delayed.
+
+We will let you know as soon as we have the new departure time.
+
+Voucher code: *{voucher_code}*
+            """, ['name', 'service_name', 'datetime', 'voucher_code'], language='en')
@@ -1,44 +1,71 @@
 # travel/signals.py
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
-from .models import TripSegment, Incident, Notification
+from django.db import transaction
+from .models import Trip, TripSegment, Incident, Notification
+from .snapshot import invalidate_customer_snapshot
+from .notifications import queue_notification, adjust_unread_counts, touch_feed, IN_APP, EMAIL, WHATSAPP
+from .monitoring import log_segment_status_change
+from .events import publish_on_commit, segment_event
+from .dashboard import invalidate_operations_board
+from .incident_stats import record_changes, incident_state, saved_state
 from django.utils import timezone
+from functools import partial
 
 @receiver(post_save, sender=TripSegment)
 def segment_status_notification(sender, instance, created, **kwargs):
     """Crear notificación cuando cambia el estado de un segmento"""
-    if not created and instance.status == 'en_route':
-        Notification.objects.create(
-            customer=instance.trip.customer,
-            title=f"¡Tu {instance.service.get_service_type_display().lower()} está en camino!",
-            message=f"{instance.service.name} llegará pronto. Revisa los detalles en tu itinerario."
+    if created or 'status' not in instance.changed_fields:
+        return
+    
+    log_segment_status_change(instance, instance.loaded_value('status'), instance.status)
+    publish_on_commit(segment_event(
+        instance.pk, instance.trip_id, instance.status, instance.get_status_display(),
+        instance.scheduled_datetime, previous_status=instance.loaded_value('status')
+    ))
+    
+    if instance.status == 'en_route':
+        queue_notification(
+            instance.trip.customer_id,
+            f"¡Tu {instance.service.get_service_type_display().lower()} está en camino!",
+            f"{instance.service.name} llegará pronto. Revisa los detalles en tu itinerario.",
+            channels=(IN_APP, WHATSAPP),
+            dedupe_key=f'segment:{instance.pk}:en_route'
         )
-    elif not created and instance.status == 'completed':
-        Notification.objects.create(
-            customer=instance.trip.customer,
-            title=f"{instance.service.name} completado",
-            message=f"¡Esperamos que hayas disfrutado tu {instance.service.get_service_type_display().lower()}!"
+    elif instance.status == 'completed':
+        queue_notification(
+            instance.trip.customer_id,
+            f"{instance.service.name} completado",
+            f"¡Esperamos que hayas disfrutado tu {instance.service.get_service_type_display().lower()}!",
+            dedupe_key=f'segment:{instance.pk}:completed'
         )
 
-@receiver(post_save, sender=Incident)
-def incident_notification(sender, instance, created, **kwargs):
-    """Crear notificación cuando se reporta una incidencia"""
+@receiver(post_save, sender=TripSegment)
+def pregenerate_voucher(sender, instance, created, **kwargs):
+    """Generar el QR del voucher en segundo plano al crear el segmento"""
     if created:
-        Notification.objects.create(
-            customer=instance.segment.trip.customer,
-            title="Incidencia reportada",
-            message=f"Hemos recibido tu reporte sobre '{instance.title}'. Te contactaremos pronto."
-        )
+        from .tasks import generate_voucher
+        segment_id = instance.pk
+        transaction.on_commit(lambda: generate_voucher.delay(segment_id))
+
+@receiver(post_save, sender=TripSegment)
+def schedule_segment_reminder(sender, instance, created, **kwargs):
+    """Ubicar el recordatorio en la rueda al crear o reprogramar el segmento"""
+    if created or 'scheduled_datetime' in instance.changed_fields:
+        from .tasks import reschedule_reminder
+        transaction.on_commit(partial(reschedule_reminder, instance.pk))
 
 @receiver(post_save, sender=Incident)
 def incident_created_notification(sender, instance, created, **kwargs):
     """Notificar cuando se crea una nueva incidencia"""
     if created:
         # Notificación para el cliente
-        Notification.objects.create(
-            customer=instance.segment.trip.customer,
-            title="Incidencia reportada",
-            message=f"Hemos recibido tu reporte: '{instance.title}'. Código de seguimiento: #{instance.id}"
+        queue_notification(
+            instance.segment.trip.customer_id,
+            "Incidencia reportada",
+            f"Hemos recibido tu reporte: '{instance.title}'. Código de seguimiento: #{instance.id}",
+            channels=(IN_APP, EMAIL),
+            dedupe_key=f'incident:{instance.pk}:created'
         )
         
         # TODO: Notificar al equipo de soporte vía email/SMS
@@ -47,29 +74,80 @@ def incident_created_notification(sender, instance, created, **kwargs):
 @receiver(pre_save, sender=Incident)
 def incident_status_change_notification(sender, instance, **kwargs):
     """Notificar cambios de estado"""
-    if instance.pk:  # Solo para incidencias existentes
-        try:
-            old_instance = Incident.objects.get(pk=instance.pk)
-            
-            # Si cambió el estado
-            if old_instance.status != instance.status:
-                status_messages = {
-                    'in_progress': 'Nuestro equipo está trabajando en resolver tu caso',
-                    'resolved': 'Tu incidencia ha sido resuelta',
-                    'closed': 'Tu caso ha sido cerrado'
-                }
-                
-                if instance.status in status_messages:
-                    Notification.objects.create(
-                        customer=instance.segment.trip.customer,
-                        title=f"Actualización incidencia #{instance.id}",
-                        message=status_messages[instance.status]
-                    )
-            
-            # Si se resuelve, marcar fecha
-            if (old_instance.status != 'resolved' and instance.status == 'resolved' 
-                and not instance.resolved_at):
-                instance.resolved_at = timezone.now()
-                
-        except Incident.DoesNotExist:
-            pass
\ No newline at end of file
+    # Solo para incidencias existentes; el estado anterior viene de from_db
+    if not instance.pk or 'status' not in instance.changed_fields:
+        return
+    
+    status_messages = {
+        'in_progress': 'Nuestro equipo está trabajando en resolver tu caso',
+        'resolved': 'Tu incidencia ha sido resuelta',
+        'closed': 'Tu caso ha sido cerrado'
+    }
+    
+    if instance.status in status_messages:
+        queue_notification(
+            instance.segment.trip.customer_id,
+            f"Actualización incidencia #{instance.id}",
+            status_messages[instance.status],
+            channels=(IN_APP, WHATSAPP),
+            dedupe_key=f'incident:{instance.pk}:update'
+        )
+    
+    # Si se resuelve, marcar fecha
+    if instance.status == 'resolved' and not instance.resolved_at:
+        instance.resolved_at = timezone.now()
+
+@receiver(post_save, sender=Incident)
+def rollup_incident_stats_on_save(sender, instance, created, **kwargs):
+    """Mover el aporte de la incidencia en los rollups según lo que cambió"""
+    if created:
+        record_changes([(None, incident_state(instance))])
+    elif instance.changed_fields:
+        record_changes([(saved_state(instance), incident_state(instance))])
+
+@receiver(post_delete, sender=Incident)
+def rollup_incident_stats_on_delete(sender, instance, **kwargs):
+    record_changes([(saved_state(instance), None)])
+
+@receiver(post_save, sender=Notification)
+def count_unread_on_save(sender, instance, created, **kwargs):
+    """Mantener Customer.unread_notifications en altas y cambios de 'read' fila a fila"""
+    if created:
+        touch_feed(instance.customer_id)
+        delta = 0 if instance.read else 1
+    elif 'read' in instance.changed_fields:
+        delta = -1 if instance.read else 1
+    else:
+        return
+    adjust_unread_counts({instance.customer_id: delta})
+
+@receiver(post_delete, sender=Notification)
+def count_unread_on_delete(sender, instance, **kwargs):
+    if not instance.read:
+        adjust_unread_counts({instance.customer_id: -1})
+
+@receiver([post_save, post_delete], sender=Notification)
+@receiver([post_save, post_delete], sender=Trip)
+def invalidate_snapshot_for_customer(sender, instance, **kwargs):
+    """Invalidar el snapshot cacheado cuando cambian notificaciones o viajes"""
+    # Al confirmar: invalidando antes, un request concurrente reconstruiría el
+    # snapshot con los datos previos y quedaría cacheado hasta SNAPSHOT_TIMEOUT
+    transaction.on_commit(partial(invalidate_customer_snapshot, instance.customer_id))
+
+@receiver([post_save, post_delete], sender=Incident)
+def invalidate_caches_for_incident(sender, instance, **kwargs):
+    """Invalidar el snapshot del cliente y el tablero del día de la incidencia"""
+    # Un save sin cambios (post_delete no trae 'created') no toca ningún cache
+    if kwargs.get('created') is False and not instance.changed_fields:
+        return
+    # Segmento y viaje ya cargados por las vistas y los otros receivers: sin consulta extra
+    segment = instance.segment
+    transaction.on_commit(partial(invalidate_customer_snapshot, segment.trip.customer_id))
+    transaction.on_commit(partial(invalidate_operations_board, segment.scheduled_datetime))
+
+@receiver([post_save, post_delete], sender=TripSegment)
+def invalidate_board_for_segment(sender, instance, **kwargs):
+    """Invalidar el tablero de operaciones del día del segmento (y del anterior si se reprogramó)"""
+    transaction.on_commit(partial(
+        invalidate_operations_board, instance.scheduled_datetime, instance.loaded_value('scheduled_datetime')
+    ))
@@ -0,0 +1,72 @@
+# travel/snapshot.py
+from django.core.cache import cache
+from django.utils import timezone
+from .models import Customer, Trip, Incident
+
+# Subir la versión cuando cambien los campos del snapshot
+SNAPSHOT_VERSION = 1
+SNAPSHOT_TIMEOUT = 300  # 5 minutos
+
+
+class CustomerSnapshot:
+    """Resumen del cliente usado por el contexto global y el home"""
+
+    def __init__(self, unread_notifications=0, unread_incidents=0, active_trip=None, next_trip=None):
+        self.unread_notifications = unread_notifications
+        self.unread_incidents = unread_incidents
+        self.active_trip = active_trip
+        self.next_trip = next_trip
+
+    @classmethod
+    def build(cls, customer_id, today):
+        """Calcular el snapshot desde la base de datos"""
+        active_trip = Trip.objects.filter(
+            customer_id=customer_id,
+            start_date__lte=today,
+            end_date__gte=today
+        ).first()
+
+        next_trip = None
+        if not active_trip:
+            next_trip = Trip.objects.filter(
+                customer_id=customer_id,
+                start_date__gt=today
+            ).first()
+
+        return cls(
+            # Contador desnormalizado en Customer: O(1) en vez de COUNT
+            unread_notifications=Customer.objects.filter(
+                pk=customer_id
+            ).values_list('unread_notifications', flat=True).first() or 0,
+            unread_incidents=Incident.objects.filter(
+                segment__trip__customer_id=customer_id,
+                status__in=['open', 'in_progress']
+            ).count(),
+            active_trip=active_trip,
+            next_trip=next_trip,
+        )
+
+
+def _snapshot_key(customer_id, today):
+    return f'customer-snapshot:{customer_id}:{today.isoformat()}'
+
+
+def get_customer_snapshot(customer_id):
+    """Obtener el snapshot del cliente, calculándolo solo si no está en cache"""
+    today = timezone.localdate()
+    key = _snapshot_key(customer_id, today)
+
+    snapshot = cache.get(key, version=SNAPSHOT_VERSION)
+    if snapshot is None:
+        snapshot = CustomerSnapshot.build(customer_id, today)
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT, version=SNAPSHOT_VERSION)
+    return snapshot
+
+
+def invalidate_customer_snapshot(*customer_ids):
+    """Descartar el snapshot cacheado de uno o más clientes"""
+    today = timezone.localdate()
+    cache.delete_many(
+        [_snapshot_key(customer_id, today) for customer_id in customer_ids if customer_id],
+        version=SNAPSHOT_VERSION
+    )
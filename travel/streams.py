@@ -0,0 +1,95 @@
+# travel/streams.py
+"""Streams SSE (Server-Sent Events) de estado de segmentos.
+
+Vistas async: en producción las sirve el proceso ASGI ``web_events``
+(clmundo/asgi.py, docker-compose.prod.yml). Cada
+conexión queda suscrita a un canal del broker de eventos y recibe los
+cambios de estado apenas se confirman, sin polling.
+"""
+import json
+import time
+from datetime import date
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from .events import get_broker, trip_channel, day_channel
+from .models import Trip, TripSegment
+from .utils import day_range
+
+# Comentario cada N segundos para mantener viva la conexión (proxies, móviles)
+KEEPALIVE_SECONDS = 15
+# Duración máxima de una conexión; el navegador reconecta solo (EventSource)
+MAX_STREAM_SECONDS = 60 * 60
+RETRY_MS = 3000
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def _current_statuses(segments):
+    """Estado actual de los segmentos, enviado al conectar para no perder cambios previos"""
+    labels = dict(TripSegment._meta.get_field('status').choices)
+    return [
+        {
+            'segment_id': row['id'],
+            'trip_id': row['trip_id'],
+            'status': row['status'],
+            'status_display': labels.get(row['status'], row['status']),
+        }
+        async for row in segments.values('id', 'trip_id', 'status').order_by('scheduled_datetime', 'id')
+    ]
+
+
+async def _event_stream(channel, segments):
+    deadline = time.monotonic() + MAX_STREAM_SECONDS
+    # Suscribirse antes de leer el estado actual: un cambio que ocurra entre
+    # ambos pasos llega como evento en vez de perderse
+    async with get_broker().subscribe([channel]) as subscription:
+        yield f'retry: {RETRY_MS}\n\n'
+        yield _sse('snapshot', await _current_statuses(segments))
+
+        while time.monotonic() < deadline:
+            message = await subscription.get(KEEPALIVE_SECONDS)
+            if message is None:
+                yield ': keepalive\n\n'
+            else:
+                yield _sse('status', message)
+
+
+def _stream_response(channel, segments):
+    response = StreamingHttpResponse(_event_stream(channel, segments), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evitar que nginx acumule el stream en su buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+async def trip_status_stream(request, trip_id):
+    """Cambios de estado de los segmentos de un viaje (dueño del viaje o staff)"""
+    user = await request.auser()
+    trips = Trip.objects.filter(id=trip_id)
+    if not user.is_staff:
+        trips = trips.filter(customer__user=user)
+    if not await trips.aexists():
+        return JsonResponse({'error': 'Viaje no encontrado'}, status=404)
+
+    return _stream_response(trip_channel(trip_id), TripSegment.objects.filter(trip_id=trip_id))
+
+
+@login_required
+async def operations_status_stream(request):
+    """Cambios de estado de todos los segmentos de un día (solo staff)"""
+    user = await request.auser()
+    if not user.is_staff:
+        return JsonResponse({'error': 'Sin permisos'}, status=403)
+
+    try:
+        day = date.fromisoformat(request.GET['date']) if request.GET.get('date') else timezone.localdate()
+    except ValueError:
+        return JsonResponse({'error': 'Fecha inválida'}, status=400)
+
+    start, end = day_range(day)
+    segments = TripSegment.objects.filter(scheduled_datetime__gte=start, scheduled_datetime__lt=end)
+    return _stream_response(day_channel(day), segments)
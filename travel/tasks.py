@@ -1,8 +1,24 @@
 # travel/tasks.py
-from celery import shared_task
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from .models import TripSegment, Customer, Incident
+import smtplib
+from celery import shared_task, group
+from django.core.mail import send_mail, get_connection, EmailMessage, EmailMultiAlternatives
+from django.template.loader import render_to_string, get_template
+from django.db import connection, transaction
+from django.db.models import F, Count, OuterRef, Subquery, Value, DateTimeField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from datetime import datetime, timedelta
+from functools import partial
+from .models import TripSegment, Customer, Incident, Notification, OutboundMessage
+from .notifications import queue_notification, EMAIL, WHATSAPP
+from .events import publish_on_commit, segment_event
+from .dashboard import invalidate_operations_board
+from . import reminders
+
+# Tamaño de lote para las tareas que recorren tablas completas
+BATCH_SIZE = 1000
+# Segmentos por tarea de recordatorios (una conexión SMTP por lote)
+REMINDER_CHUNK_SIZE = 200
 
 @shared_task
 def send_incident_notification_email(incident_id):
@@ -47,90 +63,500 @@ def send_incident_notification_email(incident_id):
 
 @shared_task
 def check_overdue_incidents():
-    """Verificar y notificar incidencias vencidas"""
-    from django.utils import timezone
-    from datetime import timedelta
-    
+    """Verificar incidencias vencidas y enviar un resumen al equipo"""
     now = timezone.now()
     
-    # Incidencias críticas > 4 horas sin resolver
-    critical_overdue = Incident.objects.filter(
-        status__in=['open', 'in_progress'],
-        severity='critical',
-        reported_at__lt=now - timedelta(hours=4),
+    # Críticas > 4 horas y altas > 12 horas sin resolver (SLA por severidad)
+    overdue = Incident.objects.overdue(now).filter(
+        severity__in=['critical', 'high'],
         resolved_at__isnull=True
-    )
+    ).select_related('segment__trip__customer__user').order_by('id')
     
-    # Incidencias altas > 12 horas sin resolver
-    high_overdue = Incident.objects.filter(
-        status__in=['open', 'in_progress'],
-        severity='high',
-        reported_at__lt=now - timedelta(hours=12),
-        resolved_at__isnull=True
+    total = overdue.count()
+    parts = -(-total // BATCH_SIZE)
+    processed = 0
+    last_id = 0
+    # Un email resumen por lote sobre una sola conexión SMTP: memoria acotada
+    # aunque haya miles de vencidas
+    with get_connection() as smtp:
+        for part in range(1, parts + 1):
+            chunk = list(overdue.filter(id__gt=last_id)[:BATCH_SIZE])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            
+            lines = [
+                f'#{incident.id} [{incident.get_severity_display()}] {incident.title} - '
+                f'{incident.segment.trip.customer.user.get_full_name()} - '
+                f'{incident.response_time} horas sin resolver'
+                for incident in chunk
+            ]
+            subject = f'ALERTA: {total} incidencias vencidas'
+            if parts > 1:
+                subject += f' (parte {part} de {parts})'
+            send_mail(
+                subject,
+                'Incidencias vencidas sin resolver:\n\n' + '\n'.join(lines),
+                'alerts@andestravel.com',
+                ['soporte@andestravel.com', 'supervisor@andestravel.com'],
+                connection=smtp
+            )
+            processed += len(chunk)
+    
+    return f'Procesadas {processed} incidencias vencidas'
+
+
+def reminder_message(template, segment):
+    """Email de recordatorio de un segmento (con trip, customer, user y service ya cargados)"""
+    customer = segment.trip.customer
+    html = template.render({'customer': customer, 'segment': segment})
+    message = EmailMultiAlternatives(
+        f'Recordatorio: {segment.service.name}',
+        html,
+        'noreply@clmundo.com',
+        [customer.user.email]
     )
+    message.attach_alternative(html, 'text/html')
+    return message
+
+@shared_task
+def send_reminder_batch(segment_ids):
+    """Enviar los recordatorios de un lote: una consulta, una plantilla y una conexión SMTP.
     
-    overdue_incidents = list(critical_overdue) + list(high_overdue)
+    Cada email se envía por separado sobre la misma conexión, así una dirección
+    inválida no hace fallar al resto. Los segmentos que no llegaron por ningún
+    canal por un fallo transitorio se liberan para que la rueda los reintente;
+    ante un error inesperado se libera el lote entero y la excepción sigue.
+    """
+    from .services.whatsapp_async import segment_messages, send_many, whatsapp_recipients
     
-    for incident in overdue_incidents:
-        # Enviar alerta al equipo
-        send_mail(
-            f'ALERTA: Incidencia vencida #{incident.id}',
-            f'La incidencia #{incident.id} lleva {incident.response_time} horas sin resolver.\n'
-            f'Severidad: {incident.get_severity_display()}\n'
-            f'Cliente: {incident.segment.trip.customer.user.get_full_name()}\n'
-            f'Título: {incident.title}',
-            'alerts@andestravel.com',
-            ['soporte@andestravel.com', 'supervisor@andestravel.com']
-        )
+    try:
+        segments = list(TripSegment.objects.filter(
+            id__in=segment_ids
+        ).select_related('trip__customer__user', 'service'))
+        
+        delivered, failed = set(), set()
+        emails_sent = 0
+        # Plantilla compilada una vez por lote, no por email
+        template = get_template('travel/emails/reminder.html')
+        with get_connection() as smtp:
+            for segment in segments:
+                if not segment.trip.customer.user.email:
+                    continue
+                try:
+                    smtp.send_messages([reminder_message(template, segment)])
+                except smtplib.SMTPRecipientsRefused:
+                    # Dirección rechazada: reintentar no cambia el resultado
+                    continue
+                except Exception:
+                    failed.add(segment.id)
+                    continue
+                delivered.add(segment.id)
+                emails_sent += 1
+        
+        # WhatsApp del lote en paralelo sobre un pool HTTP, con límite de tasa
+        recipients = whatsapp_recipients(segments, 'whatsapp_reminders')
+        results = send_many(segment_messages(recipients, 'itinerary_reminder', opt_in='whatsapp_reminders'))
+        whatsapp_sent = 0
+        for segment, result in zip(recipients, results):
+            if result['success']:
+                delivered.add(segment.id)
+                whatsapp_sent += 1
+            elif result['error'] != 'Service not configured':
+                failed.add(segment.id)
+    except Exception:
+        reminders.release(segment_ids)
+        raise
     
-    return f'Procesadas {len(overdue_incidents)} incidencias vencidas'
-
+    released = reminders.release(failed - delivered)
+    summary = f'Enviados {emails_sent} recordatorios ({whatsapp_sent} WhatsApp)'
+    if released:
+        summary += f', {released} liberados para reintentar'
+    return summary
 
 @shared_task
 def send_reminder_email(segment_id):
     """Enviar recordatorio por email antes del servicio"""
-    try:
-        segment = TripSegment.objects.get(id=segment_id)
-        customer = segment.trip.customer
+    return send_reminder_batch([segment_id])
+
+def dispatch_reminders(segment_ids, chunk_size=None, spread=None):
+    """Encolar los recordatorios como un group de tareas de REMINDER_CHUNK_SIZE segmentos.
+    
+    Con ``spread`` (timedelta) los lotes se reparten a lo largo de ese
+    intervalo en vez de salir todos a la vez.
+    """
+    chunk_size = chunk_size or REMINDER_CHUNK_SIZE
+    segment_ids = list(segment_ids)
+    batches = [segment_ids[i:i + chunk_size] for i in range(0, len(segment_ids), chunk_size)]
+    if batches:
+        step = spread.total_seconds() / len(batches) if spread else 0
+        group(
+            send_reminder_batch.s(batch).set(countdown=index * step)
+            for index, batch in enumerate(batches)
+        ).apply_async()
+    return len(batches)
+
+def _enqueue_slot(slot):
+    if reminders.mark_slot_scheduled(slot):
+        send_slot_reminders.apply_async((slot.isoformat(),), eta=slot)
+        return True
+    return False
+
+@shared_task
+def schedule_reminders():
+    """Vuelta de la rueda de recordatorios: encolar con ETA los slots del horizonte"""
+    now = timezone.now()
+    
+    # Recordatorios cuyo slot ya pasó (reprogramaciones, rueda detenida): salen ya
+    late = reminders.claim(reminders.overdue(now))
+    dispatch_reminders(late)
+    
+    enqueued = sum(_enqueue_slot(slot) for slot in reminders.slots_in_horizon(now))
+    return f'{len(late)} recordatorios atrasados, {enqueued} slots encolados'
+
+@shared_task
+def send_slot_reminders(slot):
+    """Enviar los recordatorios de un slot, repartidos a lo largo del slot"""
+    start = datetime.fromisoformat(slot)
+    now = timezone.now()
+    if now < start:
+        # Ejecutada antes de su ETA (p. ej. Celery en modo eager): la próxima vuelta la reencola
+        reminders.release_slot(start)
+        return f'Slot {slot} aún no comienza'
+    
+    ids = reminders.claim(
+        reminders.due_between(start, start + reminders.REMINDER_SLOT).filter(scheduled_datetime__gt=now)
+    )
+    batches = dispatch_reminders(ids, spread=reminders.REMINDER_SLOT)
+    return f'Slot {slot}: {len(ids)} recordatorios en {batches} lotes'
+
+def reschedule_reminder(segment_id):
+    """Tras crear o reprogramar un segmento: recordar ya si su slot pasó, o asegurar que esté encolado"""
+    now = timezone.now()
+    pending = reminders.pending_reminders().filter(id=segment_id, scheduled_datetime__gt=now)
+    scheduled = pending.values_list('scheduled_datetime', flat=True).first()
+    if scheduled is None:
+        return
+    
+    remind_at = scheduled - reminders.REMINDER_LEAD
+    slot = reminders.slot_start(remind_at)
+    if slot < reminders.slot_start(now):
+        dispatch_reminders(reminders.claim(pending))
+    elif remind_at < now + reminders.REMINDER_HORIZON:
+        _enqueue_slot(slot)
+
+@shared_task
+def check_delayed_services():
+    """Verificar servicios atrasados y notificar"""
+    cutoff = timezone.now() - timedelta(minutes=15)
+    pending_statuses = ['pending', 'confirmed']
+    
+    candidates = TripSegment.objects.filter(
+        scheduled_datetime__lt=cutoff,
+        status__in=pending_statuses
+    ).order_by('id')
+    
+    table = connection.ops.quote_name(TripSegment._meta.db_table)
+    delayed_display = dict(TripSegment._meta.get_field('status').choices)['delayed']
+    total = 0
+    last_id = 0
+    while True:
+        rows = list(candidates.filter(id__gt=last_id).values_list(
+            'id', 'trip__customer_id', 'service__name', 'trip_id', 'scheduled_datetime', 'status'
+        )[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1][0]
         
-        subject = f'Recordatorio: {segment.service.name}'
-        message = render_to_string('travel/emails/reminder.html', {
-            'customer': customer,
-            'segment': segment
-        })
+        ids = [row[0] for row in rows]
+        with transaction.atomic():
+            # Un solo UPDATE ... RETURNING por lote: solo se notifican los que
+            # realmente cambiaron (sin signals por fila)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET status = %s "
+                    f"WHERE id IN ({', '.join(['%s'] * len(ids))}) AND status IN (%s, %s) "
+                    f"RETURNING id",
+                    ['delayed', *ids, *pending_statuses]
+                )
+                delayed_ids = {row[0] for row in cursor.fetchall()}
+            
+            # Las notificaciones del lote se insertan con un bulk_create al hacer commit
+            events = []
+            for segment_id, customer_id, service_name, trip_id, scheduled, previous in rows:
+                if segment_id in delayed_ids:
+                    events.append(segment_event(
+                        segment_id, trip_id, 'delayed', delayed_display, scheduled, previous_status=previous
+                    ))
+                    queue_notification(
+                        customer_id,
+                        f"Servicio atrasado: {service_name}",
+                        "Te contactaremos pronto con información actualizada.",
+                        dedupe_key=f'segment:{segment_id}:delayed'
+                    )
+            # El UPDATE crudo no dispara post_save: los streams SSE y el tablero se actualizan aquí
+            publish_on_commit(*events)
+            delayed_days = [row[4] for row in rows if row[0] in delayed_ids]
+            transaction.on_commit(partial(invalidate_operations_board, *delayed_days))
         
-        send_mail(
-            subject,
-            message,
-            'noreply@clmundo.com',
-            [customer.user.email],
-            html_message=message
-        )
+        total += len(delayed_ids)
+    
+    return f'Marcados {total} servicios atrasados'
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def deliver_notifications(self, notification_ids):
+    """Entregar notificaciones por email/WhatsApp (consumidor del outbox).
+    
+    Cada canal se marca entregado según su resultado real y se guarda apenas
+    termina, así un fallo de WhatsApp no reenvía emails ya enviados. Los
+    canales fallidos se reintentan; delivered_at queda fijado cuando a la
+    notificación no le queda ningún canal pendiente.
+    """
+    from .services.whatsapp_async import send_many
+    
+    # Solo las pendientes: un reintento de la tarea no duplica envíos
+    notifications = list(Notification.objects.filter(
+        id__in=notification_ids,
+        delivered_at__isnull=True
+    ).select_related('customer__user'))
+    
+    # Un mensaje por (cliente, título, texto): duplicados se marcan juntos
+    emails = {}
+    whatsapp_messages = {}
+    for notification in notifications:
+        customer = notification.customer
+        key = (customer.id, notification.title, notification.message)
         
-        return f'Email enviado a {customer.user.email}'
-    except Exception as e:
-        return f'Error enviando email: {str(e)}'
+        if (EMAIL in notification.channels and notification.email_delivered_at is None
+                and customer.user.email):
+            if key not in emails:
+                emails[key] = (EmailMessage(
+                    notification.title,
+                    notification.message,
+                    'noreply@andestravel.com',
+                    [customer.user.email]
+                ), [])
+            emails[key][1].append(notification.id)
+        
+        if (WHATSAPP in notification.channels and notification.whatsapp_delivered_at is None
+                and customer.whatsapp_notifications and customer.phone):
+            if key not in whatsapp_messages:
+                whatsapp_messages[key] = ((customer.phone, f"*{notification.title}*\n\n{notification.message}"), [])
+            whatsapp_messages[key][1].append(notification.id)
+    
+    # Ids con algún canal fallido: se reintentan solo esos canales
+    pending = set()
+    
+    email_sent = []
+    if emails:
+        # Una sola conexión SMTP para el lote, un envío por mensaje
+        with get_connection() as smtp:
+            for message, ids in emails.values():
+                try:
+                    smtp.send_messages([message])
+                except Exception:
+                    pending.update(ids)
+                    continue
+                email_sent.extend(ids)
+        Notification.objects.filter(id__in=email_sent).update(email_delivered_at=timezone.now())
+    
+    whatsapp_sent = []
+    if whatsapp_messages:
+        results = send_many([message for message, _ in whatsapp_messages.values()])
+        for (_, ids), result in zip(whatsapp_messages.values(), results):
+            if result['success']:
+                whatsapp_sent.extend(ids)
+            elif result['error'] != 'Service not configured':
+                pending.update(ids)
+        Notification.objects.filter(id__in=whatsapp_sent).update(whatsapp_delivered_at=timezone.now())
+    
+    # Un canal sin email/teléfono (o WhatsApp sin configurar) no queda pendiente
+    complete = [notification.id for notification in notifications if notification.id not in pending]
+    Notification.objects.filter(id__in=complete).update(delivered_at=timezone.now())
+    
+    if pending and self.request.retries < self.max_retries:
+        raise self.retry(args=[sorted(pending)], countdown=self.default_retry_delay * (self.request.retries + 1))
+    summary = f'Entregadas {len(complete)} notificaciones ({len(email_sent)} emails, {len(whatsapp_sent)} WhatsApp)'
+    if pending:
+        summary += f', {len(pending)} con canales fallidos'
+    return summary
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def deliver_outbound_message(self, message_id):
+    """Entregar un OutboundMessage por WhatsApp; los reintentos siguen en su misma cola"""
+    from .services.whatsapp import WhatsAppService
+    
+    # Solo quien lo pasa de queued a sending envía: una tarea entregada dos veces no duplica
+    claimed = OutboundMessage.objects.filter(id=message_id, status='queued').update(
+        status='sending',
+        attempts=F('attempts') + 1,
+        started_at=Coalesce(F('started_at'), Value(timezone.now(), output_field=DateTimeField()))
+    )
+    if not claimed:
+        return f'Mensaje {message_id} ya procesado'
+    
+    message = OutboundMessage.objects.get(id=message_id)
+    result = WhatsAppService().send_message(message.recipient, message.body)
+    
+    if result['success']:
+        OutboundMessage.objects.filter(id=message_id).update(
+            status='sent', provider_id=result['message_sid'] or '', sent_at=timezone.now(), error=''
+        )
+        return f'Mensaje {message_id} enviado'
+    
+    retry = message.attempts <= self.max_retries and result['error'] != 'Service not configured'
+    OutboundMessage.objects.filter(id=message_id).update(
+        status='queued' if retry else 'failed', error=result['error']
+    )
+    if retry:
+        raise self.retry(countdown=self.default_retry_delay * message.attempts, queue=message.queue)
+    return f"Mensaje {message_id} fallido: {result['error']}"
 
 @shared_task
-def check_delayed_services():
-    """Verificar servicios atrasados y notificar"""
-    from datetime import datetime, timedelta
+def requeue_stale_outbound_messages():
+    """Devolver a su cola los mensajes trabados en 'sending' (worker caído a mitad del envío).
+    
+    La entrega queda "al menos una vez": si Twilio alcanzó a aceptar el mensaje
+    antes de la caída, el reintento lo duplica. Tras agotar los intentos el
+    mensaje se marca fallido para no reencolarlo indefinidamente.
+    """
+    from . import outbound
+    
+    now = timezone.now()
+    max_attempts = deliver_outbound_message.max_retries + 1
+    requeued = failed = 0
+    for message_id, queue, attempts in outbound.stale_sending(now).values_list('id', 'queue', 'attempts'):
+        # Filtro repetido en el UPDATE: el worker original pudo terminar entre medio
+        stale = outbound.stale_sending(now).filter(id=message_id)
+        if attempts >= max_attempts:
+            failed += stale.update(status='failed', error='Envío interrumpido')
+        # started_at en blanco: vuelve a contar como pendiente y el nuevo claim lo fecha
+        elif stale.update(status='queued', started_at=None):
+            outbound.enqueue(message_id, queue)
+            requeued += 1
+    return f'{requeued} mensajes reencolados, {failed} fallidos'
+
+@shared_task
+def broadcast_whatsapp(segment_ids, template_name):
+    """Avisar por WhatsApp a todos los pasajeros de los segmentos (p. ej. un retraso)"""
+    from .services.whatsapp_async import broadcast
+    
+    result = broadcast(segment_ids, template_name)
+    return f"WhatsApp '{template_name}': {result['sent']} enviados, {result['failed']} fallidos, {result['skipped']} omitidos"
+
+@shared_task
+def refresh_directions(origin, destination, mode='driving', destination_key=None, segment_id=None):
+    """Refrescar en segundo plano una ruta cacheada vencida"""
+    from .services.google_maps import GoogleMapsService
+    from .services.directions_cache import fetch_directions
+    
+    directions = fetch_directions(
+        GoogleMapsService(), origin, destination, mode, destination_key, segment_id
+    )
+    return f'Ruta actualizada: {directions["duration"]}' if directions else 'Sin ruta'
+
+@shared_task
+def refresh_places_tile(tile, place_type, bucket):
+    """Completar (todas las páginas) o refrescar en segundo plano un tile de lugares"""
+    from .services.google_maps import GoogleMapsService
+    from .services import places_cache
+    
+    maps_service = GoogleMapsService()
+    if not maps_service.is_available():
+        return 'Google Maps no disponible'
+    places = places_cache.fetch_tile(maps_service, tile, place_type, bucket)
+    return f'Tile {tile}: {len(places)} lugares' if places is not None else f'Tile {tile}: sin respuesta'
+
+@shared_task
+def warm_places_cache(place_types=None, radius=1500):
+    """Precargar lugares cercanos para la ubicación por defecto y los destinos próximos"""
+    from django.conf import settings
+    from .services.google_maps import GoogleMapsService
+    from .services import places_cache
     
-    now = datetime.now()
-    delayed_segments = TripSegment.objects.filter(
-        scheduled_datetime__lt=now - timedelta(minutes=15),
-        status__in=['pending', 'confirmed']
+    maps_service = GoogleMapsService()
+    if not maps_service.is_available():
+        return 'Google Maps no disponible'
+    
+    place_types = place_types or getattr(
+        settings, 'PLACES_WARM_TYPES', ['restaurant', 'tourist_attraction']
     )
     
-    for segment in delayed_segments:
-        # Marcar como atrasado y notificar
-        segment.status = 'delayed'
-        segment.save()
+    # Ubicación base + puntos de encuentro de los próximos 7 días (agrupados a ~1 km)
+    now = timezone.now()
+    locations = {
+        (round(settings.DEFAULT_LOCATION['lat'], 2), round(settings.DEFAULT_LOCATION['lng'], 2))
+    }
+    upcoming = TripSegment.objects.filter(
+        scheduled_datetime__gte=now,
+        scheduled_datetime__lt=now + timedelta(days=7),
+        pickup_latitude__isnull=False,
+        pickup_longitude__isnull=False
+    ).values_list('pickup_latitude', 'pickup_longitude').distinct()
+    for lat, lng in upcoming.iterator():
+        locations.add((round(lat, 2), round(lng, 2)))
+    
+    tiles = sum(
+        places_cache.warm_location(maps_service, lat, lng, place_types, radius)
+        for lat, lng in locations
+    )
+    return f'Precargados {tiles} tiles para {len(locations)} ubicaciones'
+
+
+
+@shared_task
+def generate_voucher(segment_id):
+    """Pre-generar el PNG del voucher de un segmento"""
+    from .services import vouchers
+    
+    segment = TripSegment.objects.select_related(
+        'service', 'trip__customer__user'
+    ).filter(pk=segment_id).first()
+    if segment is None:
+        return f'Segmento {segment_id} no existe'
+    
+    path, _ = vouchers.ensure_voucher(segment)
+    return path
+
+
+@shared_task
+def export_report_xlsx(token, name, user_id, params, ids=None):
+    """Generar un exporte XLSX pedido desde /staff/export/ o el admin"""
+    from .services import report_export
+    
+    job = report_export.build_xlsx_export(token, name, user_id, params, ids)
+    if job is None:
+        return f'Exporte {token} vencido'
+    return f'Exporte {token}: {job["status"]}'
+
+
+@shared_task
+def reconcile_unread_counters():
+    """Corregir desvíos de Customer.unread_notifications contra la tabla real"""
+    from .snapshot import invalidate_customer_snapshot
+    
+    unread = Notification.objects.filter(
+        customer=OuterRef('pk'), read=False
+    ).order_by().values('customer').annotate(total=Count('id')).values('total')
+    actual = Coalesce(Subquery(unread), 0)
+    
+    fixed = 0
+    last_id = 0
+    while True:
+        ids = list(Customer.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        last_id = ids[-1]
         
-        # Crear notificación
-        from .models import Notification
-        Notification.objects.create(
-            customer=segment.trip.customer,
-            title=f"Servicio atrasado: {segment.service.name}",
-            message="Te contactaremos pronto con información actualizada."
-        )
\ No newline at end of file
+        drifted = list(
+            Customer.objects.filter(id__in=ids).annotate(actual=actual)
+            .exclude(unread_notifications=F('actual')).values_list('id', flat=True)
+        )
+        if drifted:
+            # El valor se recalcula dentro del mismo UPDATE para no pisar
+            # incrementos que lleguen entre la lectura y la escritura
+            Customer.objects.filter(id__in=drifted).update(unread_notifications=actual)
+            invalidate_customer_snapshot(*drifted)
+            fixed += len(drifted)
+    
+    return f'Corregidos {fixed} contadores de no leídas'
@@ -0,0 +1,88 @@
+# travel/tests/test_admin.py
+from unittest.mock import patch
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from travel.models import Customer, Trip, Service, TripSegment, Incident
+from travel import paginators
+from travel.paginators import EstimatedCountPaginator, estimate_count
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(username='admin_list', password='admin123')
+        self.client.force_login(self.admin_user)
+        self.service = Service.objects.create(name='Navegación Glaciar', service_type='tour')
+        self.count = 0
+        # Primera visita: crea el Customer del staff y cachea su snapshot
+        self.client.get(reverse('admin:index'))
+
+    def _add_rows(self, first_name, amount):
+        user = User.objects.create_user(username=f'{first_name.lower()}_{self.count}', first_name=first_name)
+        trip = Trip.objects.create(
+            customer=Customer.objects.create(user=user),
+            destination='Torres del Paine',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        for _ in range(amount):
+            self.count += 1
+            segment = TripSegment.objects.create(
+                trip=trip, service=self.service, scheduled_datetime=timezone.now(),
+                voucher_code=f'ADM-{self.count:04d}'
+            )
+            Incident.objects.create(segment=segment, title=f'Retraso {self.count}', description='-')
+
+    def _changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """list_select_related evita una consulta por fila al mostrar __str__"""
+        for name in ('travel_tripsegment', 'travel_incident'):
+            url = reverse(f'admin:{name}_changelist')
+            self._add_rows('Pia', 2)
+            few = self._changelist_queries(url)
+            self._add_rows('Tomas', 8)
+            self.assertEqual(self._changelist_queries(url), few, name)
+
+    def test_search_across_related_tables(self):
+        self._add_rows('Pia', 2)
+        self._add_rows('Tomas', 3)
+        url = reverse('admin:travel_incident_changelist')
+
+        response = self.client.get(url, {'q': 'tomas'})
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+
+        # Cada término debe coincidir (AND); el título y el nombre en ramas distintas
+        response = self.client.get(url, {'q': 'pia retraso'})
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+
+        response = self.client.get(reverse('admin:travel_tripsegment_changelist'), {'q': 'ADM-0003'})
+        self.assertEqual([s.voucher_code for s in response.context['cl'].result_list], ['ADM-0003'])
+
+    def test_paginator_prefers_estimate_for_large_tables(self):
+        self._add_rows('Pia', 3)
+        queryset = TripSegment.objects.all()
+
+        with patch.object(paginators, 'estimate_count', return_value=2_500_000):
+            self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 2_500_000)
+        # Estimación bajo el umbral: conteo exacto
+        with patch.object(paginators, 'estimate_count', return_value=40):
+            self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 3)
+
+    def test_filtered_listing_is_counted_exactly(self):
+        self._add_rows('Pia', 3)
+        queryset = TripSegment.objects.filter(voucher_code__startswith='ADM')
+        self.assertIsNone(estimate_count(queryset))
+        self.assertEqual(EstimatedCountPaginator(queryset, 100).count, queryset.count())
+
+    def test_estimate_needs_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('Solo aplica a otros motores')
+        self.assertIsNone(estimate_count(TripSegment.objects.all()))
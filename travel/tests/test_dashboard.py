@@ -0,0 +1,78 @@
+# travel/tests/test_dashboard.py
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from travel.models import Customer, Trip, Service, TripSegment, Incident
+
+class OperationsBoardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='ops_staff', password='test123', is_staff=True)
+        customer = Customer.objects.create(user=User.objects.create_user(username='ops_client'))
+        trip = Trip.objects.create(
+            customer=customer,
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        flight = Service.objects.create(name='Vuelo LA123', service_type='flight')
+        transfer = Service.objects.create(name='Traslado', service_type='transfer')
+        now = timezone.now()
+        self.segments = [
+            TripSegment.objects.create(trip=trip, service=flight, scheduled_datetime=now,
+                                       voucher_code=f'OPS-F{i}', status=status)
+            for i, status in enumerate(['confirmed', 'confirmed', 'pending', 'en_route'])
+        ]
+        self.transfer = TripSegment.objects.create(trip=trip, service=transfer, scheduled_datetime=now,
+                                                   voucher_code='OPS-T1', status='en_route')
+        Incident.objects.create(segment=self.transfer, title='Bus atrasado', description='-')
+        self.client.login(username='ops_staff', password='test123')
+        # Dejar en cache el snapshot del usuario (contexto global) para medir solo el tablero
+        self.client.get(reverse('notifications'))
+
+    def board_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('operations'))
+        self.assertEqual(response.status_code, 200)
+        tables = ('"travel_tripsegment"', '"travel_incident"')
+        return response, [q for q in queries if any(table in q['sql'] for table in tables)]
+
+    def test_board_uses_three_queries_and_correct_metrics(self):
+        """Listas en una consulta combinada + incidencias + métricas agregadas"""
+        response, queries = self.board_queries()
+        self.assertEqual(len(queries), 3)
+
+        content = response.content.decode()
+        board = response.context['board']
+        self.assertEqual(len(board['arrivals_today']), 4)
+        self.assertEqual(len(board['in_progress']), 2)
+        self.assertEqual(board['metrics'], {
+            'total_arrivals': 4,
+            'confirmed_arrivals': 2,
+            'pending_arrivals': 1,
+            'incidents_count': 1,
+        })
+        self.assertIn('Bus atrasado', content)
+
+    def test_board_fragment_is_cached_and_invalidated(self):
+        """Un segundo operador no consulta la BD hasta que cambia un segmento"""
+        self.board_queries()
+        _, queries = self.board_queries()
+        self.assertEqual(queries, [])
+
+        segment = self.segments[2]
+        segment.status = 'confirmed'
+        with self.captureOnCommitCallbacks(execute=True):
+            segment.save()
+        response, queries = self.board_queries()
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(response.context['board']['metrics']['pending_arrivals'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Incident.objects.create(segment=segment, title='Equipaje perdido', description='-')
+        response, _ = self.board_queries()
+        self.assertIn('Equipaje perdido', response.content.decode())
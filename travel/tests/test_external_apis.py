@@ -4,10 +4,18 @@ from django.urls import reverse
 from unittest.mock import patch, MagicMock
 from travel.services.google_maps import GoogleMapsService
 from travel.services.whatsapp import WhatsAppService
+from travel.services.geocoding_cache import geocoding_cache, normalize_address
+from travel.services import directions_cache, places_cache
+from travel.models import GeocodedAddress, Customer, Trip, Service, TripSegment
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
 
 class ExternalAPIsTest(TestCase):
     def setUp(self):
         self.client = Client()
+        geocoding_cache.clear()
+        cache.clear()
 
     def test_google_maps_service_initialization(self):
         """Test inicialización del servicio de Google Maps"""
@@ -70,4 +78,211 @@ class ExternalAPIsTest(TestCase):
         result = service.send_message('+56912345678', 'Test message')
         
         self.assertTrue(result['success'])
-        self.assertEqual(result['message_sid'], 'test_sid')
\ No newline at end of file
+        self.assertEqual(result['message_sid'], 'test_sid')
+
+    def test_geocoding_cache_avoids_repeated_calls(self):
+        """Direcciones repetidas se resuelven desde el cache"""
+        mock_client_instance = MagicMock()
+        mock_client_instance.geocode.return_value = [{
+            'geometry': {'location': {'lat': -41.3195, 'lng': -72.9854}},
+            'formatted_address': 'Puerto Varas, Chile',
+            'place_id': 'pv_place_id'
+        }]
+        service = GoogleMapsService()
+        service.client = mock_client_instance
+
+        first = service.geocode_address('Av. Costanera 123, Puerto Varas')
+        second = service.geocode_address('  av. costanera 123 ,  PUERTO VARAS ')
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_client_instance.geocode.call_count, 1)
+        self.assertEqual(geocoding_cache.stats['memory_hits'], 1)
+
+        # Un proceso nuevo (memoria vacía) lee desde la tabla
+        geocoding_cache.clear()
+        self.assertEqual(service.geocode_address('Av. Costanera 123, Puerto Varas')['place_id'], 'pv_place_id')
+        self.assertEqual(mock_client_instance.geocode.call_count, 1)
+        self.assertEqual(geocoding_cache.stats['db_hits'], 1)
+
+    def test_geocoding_negative_cache(self):
+        """Direcciones no encontradas no se vuelven a consultar"""
+        mock_client_instance = MagicMock()
+        mock_client_instance.geocode.return_value = []
+        service = GoogleMapsService()
+        service.client = mock_client_instance
+
+        self.assertIsNone(service.geocode_address('Dirección inexistente'))
+        self.assertIsNone(service.geocode_address('Dirección inexistente'))
+        self.assertEqual(mock_client_instance.geocode.call_count, 1)
+        self.assertFalse(GeocodedAddress.objects.get(address_key=normalize_address('Dirección inexistente')).found)
+
+    def test_geocoding_errors_are_not_cached(self):
+        """Los errores transitorios de la API no se cachean"""
+        mock_client_instance = MagicMock()
+        mock_client_instance.geocode.side_effect = Exception('OVER_QUERY_LIMIT')
+        service = GoogleMapsService()
+        service.client = mock_client_instance
+
+        self.assertIsNone(service.geocode_address('Puerto Montt'))
+        self.assertFalse(GeocodedAddress.objects.exists())
+
+    def _directions_service(self):
+        service = MagicMock()
+        service.get_directions.return_value = {
+            'duration': '12 min',
+            'duration_value': 720,
+            'distance': '3,1 km',
+            'distance_value': 3100,
+            'steps': [],
+            'polyline': ''
+        }
+        return service
+
+    def test_directions_cache_shares_nearby_origins(self):
+        """Orígenes a pocos metros reutilizan la misma ruta cacheada"""
+        user = User.objects.create_user(username='directions_test')
+        trip = Trip.objects.create(
+            customer=Customer.objects.create(user=user),
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        segment = TripSegment.objects.create(
+            trip=trip,
+            service=Service.objects.create(name='Tour', service_type='tour'),
+            scheduled_datetime=timezone.now(),
+            voucher_code='DIR-001'
+        )
+        service = self._directions_service()
+
+        first, info = directions_cache.get_directions(
+            service, '-41.31900,-72.98500', 'Hotel Cumbres', destination_key='place_1', segment_id=segment.id
+        )
+        self.assertFalse(info['hit'])
+        second, info = directions_cache.get_directions(
+            service, '-41.31920,-72.98530', 'Hotel Cumbres', destination_key='place_1', segment_id=segment.id
+        )
+        self.assertTrue(info['hit'])
+        self.assertEqual(first, second)
+        self.assertEqual(service.get_directions.call_count, 1)
+
+        segment.refresh_from_db()
+        self.assertEqual(segment.directions_duration, '12 min')
+        self.assertIsNotNone(segment.last_directions_update)
+
+    @patch('travel.tasks.refresh_directions.delay')
+    def test_directions_cache_serves_stale_and_refreshes(self, mock_refresh):
+        """Una ruta vencida se sirve igual y se refresca en segundo plano"""
+        service = self._directions_service()
+        directions_cache.get_directions(service, '-41.319,-72.985', 'Hotel', destination_key='place_2')
+
+        with patch('travel.services.directions_cache.time.time',
+                   return_value=directions_cache.time.time() + directions_cache.DIRECTIONS_MAX_AGE + 1):
+            directions, info = directions_cache.get_directions(
+                service, '-41.319,-72.985', 'Hotel', destination_key='place_2'
+            )
+
+        self.assertTrue(info['stale'])
+        self.assertEqual(directions['duration'], '12 min')
+        self.assertEqual(service.get_directions.call_count, 1)
+        mock_refresh.assert_called_once()
+
+    def test_mock_directions_are_not_cached(self):
+        """Sin API disponible no se cachean rutas mock"""
+        service = GoogleMapsService()
+        service.client = None
+        directions_cache.get_directions(service, '-41.319,-72.985', 'Hotel', destination_key='place_3')
+        _, info = directions_cache.get_directions(service, '-41.319,-72.985', 'Hotel', destination_key='place_3')
+        self.assertFalse(info['hit'])
+
+    def _places_service(self, places):
+        service = MagicMock()
+        service.is_available.return_value = True
+        service.search_nearby_places.return_value = places
+        return service
+
+    def test_geohash_roundtrip(self):
+        """El bbox de un geohash contiene el punto codificado"""
+        tile = places_cache.geohash_encode(-41.3195, -72.9854, 6)
+        lat_min, lat_max, lng_min, lng_max = places_cache.geohash_bbox(tile)
+        self.assertTrue(lat_min <= -41.3195 <= lat_max)
+        self.assertTrue(lng_min <= -72.9854 <= lng_max)
+
+    def test_one_tile_covers_the_requested_radius(self):
+        """Un request usa un tile cuyo círculo de búsqueda contiene el del usuario"""
+        for radius in (500, 1500, 5000, 20000):
+            tile, bucket = places_cache.tile_for(-41.3195, -72.9854, radius)
+            center_lat, center_lng, search_radius = places_cache.tile_search(tile, bucket)
+            offset = places_cache.haversine(-41.3195, -72.9854, center_lat, center_lng)
+            self.assertGreaterEqual(search_radius, offset + radius)
+            # Cerca del radio pedido: los resultados caen casi todos dentro
+            self.assertLess(search_radius, 1.5 * bucket)
+        self.assertEqual(places_cache.tile_for(-41.3195, -72.9854, 1500)[1], 1500)
+
+    @patch('travel.tasks.refresh_places_tile.delay')
+    def test_cold_tile_fetches_one_page_and_completes_in_background(self, refresh):
+        """Tile nuevo: una consulta en el request, el resto de las páginas en segundo plano"""
+        service = self._places_service([
+            {'name': 'Cerca', 'place_id': 'a', 'lat': -41.3190, 'lng': -72.9850},
+        ])
+        places_cache.nearby_places(service, -41.3195, -72.9854, 'restaurant', 1500)
+
+        service.search_nearby_places.assert_called_once()
+        self.assertEqual(service.search_nearby_places.call_args.kwargs['pages'], 1)
+        tile, bucket = places_cache.tile_for(-41.3195, -72.9854, 1500)
+        refresh.assert_called_once_with(tile, 'restaurant', bucket)
+
+        places_cache.fetch_tile(service, tile, 'restaurant', bucket)
+        self.assertEqual(service.search_nearby_places.call_args.kwargs['pages'], places_cache.PLACES_MAX_PAGES)
+        refresh.reset_mock()
+        places_cache.nearby_places(service, -41.3195, -72.9854, 'restaurant', 1500)
+        refresh.assert_not_called()
+
+    @patch('travel.services.google_maps.time.sleep')
+    def test_search_nearby_places_follows_page_tokens(self, sleep):
+        place = {
+            'name': 'Café', 'vicinity': 'Centro', 'place_id': 'p', 'types': ['cafe'],
+            'geometry': {'location': {'lat': -41.3, 'lng': -72.9}}
+        }
+        service = GoogleMapsService()
+        service.client = MagicMock()
+        service.client.places_nearby.side_effect = [
+            {'results': [place], 'next_page_token': 'T1'},
+            {'results': [dict(place, place_id='q')]},
+        ]
+
+        places = service.search_nearby_places(-41.3, -72.9, 'cafe', 1600, pages=3)
+        self.assertEqual([p['place_id'] for p in places], ['p', 'q'])
+        service.client.places_nearby.assert_called_with(page_token='T1')
+        sleep.assert_called_once()
+
+    def test_nearby_places_served_from_tiles(self):
+        """Después del primer request los lugares salen de los tiles cacheados"""
+        places = [
+            {'name': 'Cerca', 'place_id': 'a', 'lat': -41.3190, 'lng': -72.9850, 'rating': 4.5},
+            {'name': 'Lejos', 'place_id': 'b', 'lat': -41.4500, 'lng': -72.9850, 'rating': 4.8},
+        ]
+        service = self._places_service(places)
+
+        first = places_cache.nearby_places(service, -41.3195, -72.9854, 'restaurant', 1500)
+        calls = service.search_nearby_places.call_count
+        # Otro usuario dentro del mismo tile (~150 m)
+        self.assertEqual(places_cache.tile_for(-41.3190, -72.9860, 1500), places_cache.tile_for(-41.3195, -72.9854, 1500))
+        second = places_cache.nearby_places(service, -41.3190, -72.9860, 'restaurant', 1500)
+
+        self.assertEqual([p['name'] for p in first], ['Cerca'])
+        self.assertEqual([p['name'] for p in second], ['Cerca'])
+        self.assertEqual(service.search_nearby_places.call_count, calls)
+
+    def test_nearby_places_survive_quota_errors(self):
+        """Con la cuota agotada se siguen sirviendo los tiles vencidos"""
+        service = self._places_service([
+            {'name': 'Cerca', 'place_id': 'a', 'lat': -41.3190, 'lng': -72.9850},
+        ])
+        places_cache.nearby_places(service, -41.3195, -72.9854, 'restaurant', 1500)
+
+        service.search_nearby_places.side_effect = Exception('OVER_QUERY_LIMIT')
+        with patch('travel.services.places_cache.time.time',
+                   return_value=places_cache.time.time() + places_cache.PLACES_CACHE_TTL + 1):
+            places = places_cache.nearby_places(service, -41.3195, -72.9854, 'restaurant', 1500)
+        self.assertEqual([p['name'] for p in places], ['Cerca'])
@@ -0,0 +1,118 @@
+# travel/tests/test_incident_stats.py
+from datetime import timedelta
+from io import StringIO
+from django.test import TestCase, RequestFactory
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from travel.models import Customer, Trip, Service, TripSegment, Incident, IncidentStatRollup
+from travel.incident_stats import dashboard_stats
+
+
+class IncidentStatRollupTest(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(user=User.objects.create_user(username='rollup_test'))
+        trip = Trip.objects.create(
+            customer=customer,
+            destination='Chiloé',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        self.segment = TripSegment.objects.create(
+            trip=trip,
+            service=Service.objects.create(name='Ferry', service_type='transfer'),
+            scheduled_datetime=timezone.now(),
+            voucher_code='ROLLUP-001'
+        )
+
+    def _incident(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Incident.objects.create(segment=self.segment, title='Incidencia', description='-', **fields)
+
+    def _save(self, incident, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(incident, name, value)
+            incident.save()
+
+    @staticmethod
+    def _rollups():
+        return {
+            (row.period, row.bucket, row.metric, row.key, row.count, round(row.total, 6))
+            for row in IncidentStatRollup.objects.all()
+            if row.count or row.total
+        }
+
+    def test_incremental_rollups_match_backfill(self):
+        """Los rollups mantenidos en cada transición coinciden con un backfill completo"""
+        first = self._incident(category='transport', severity='high')
+        second = self._incident(category='weather', severity='low')
+        third = self._incident(category='transport', severity='critical')
+
+        self._save(first, status='in_progress')
+        self._save(first, status='resolved')
+        self._save(first, customer_satisfaction=4)
+        self._save(second, category='health', severity='medium')
+        self._save(third, status='closed', resolved_at=timezone.now() + timedelta(hours=30))
+        self._save(third, status='open')
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+
+        incremental = self._rollups()
+        call_command('backfill_incident_stats', stdout=StringIO())
+        self.assertEqual(incremental, self._rollups())
+
+    def test_admin_bulk_resolve_updates_rollups(self):
+        incidents = [self._incident(severity='high') for _ in range(3)]
+        request = RequestFactory().post('/')
+        request.user = User.objects.create_superuser(username='rollup_admin')
+        admin = site._registry[Incident]
+        admin.message_user = lambda *args, **kwargs: None
+
+        with self.captureOnCommitCallbacks(execute=True):
+            admin.mark_resolved(request, Incident.objects.filter(id__in=[i.id for i in incidents[:2]]))
+
+        stats = dashboard_stats()
+        self.assertEqual((stats['total_open'], stats['resolved_today']), (1, 2))
+
+        incremental = self._rollups()
+        call_command('backfill_incident_stats', stdout=StringIO())
+        self.assertEqual(incremental, self._rollups())
+
+    def test_dashboard_reads_rollups(self):
+        self._incident(category='transport')
+        self._incident(category='transport', status='in_progress')
+        resolved = self._incident(category='weather')
+        self._save(resolved, status='resolved', customer_satisfaction=5)
+        rated = self._incident(category='health')
+        self._save(rated, status='resolved', customer_satisfaction=3)
+
+        stats = dashboard_stats()
+        self.assertEqual(stats['total_open'], 1)
+        self.assertEqual(stats['total_in_progress'], 1)
+        self.assertEqual(stats['resolved_today'], 2)
+        self.assertEqual(stats['avg_satisfaction'], 4)
+        self.assertEqual(stats['category_stats'][0], {'category': 'transport', 'count': 2})
+
+        staff = User.objects.create_user(username='rollup_staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('staff_incidents_dashboard'))
+        self.assertEqual(response.context['stats']['resolved_today'], 2)
+
+    def test_resolution_histogram(self):
+        incident = self._incident()
+        resolved_at = incident.reported_at + timedelta(hours=5)
+        self._save(incident, status='resolved', resolved_at=resolved_at)
+
+        row = IncidentStatRollup.objects.get(period='all', metric='resolved')
+        self.assertEqual((row.key, row.count, round(row.total, 2)), ('4-12', 1, 5.0))
+
+    def test_backfill_command(self):
+        self._incident()
+        IncidentStatRollup.objects.all().delete()
+        out = StringIO()
+        call_command('backfill_incident_stats', stdout=out)
+        self.assertIn('1 incidencias', out.getvalue())
+        self.assertEqual(dashboard_stats()['total_open'], 1)
@@ -136,4 +136,83 @@ class IncidentSystemTest(TestCase):
         # Verificar que se actualizó
         incident.refresh_from_db()
         self.assertEqual(incident.status, 'resolved')
-        self.assertIsNotNone(incident.resolved_at)
\ No newline at end of file
+        self.assertIsNotNone(incident.resolved_at)
+
+class IncidentSLAQuerySetTest(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(user=User.objects.create_user(username='sla_test'))
+        trip = Trip.objects.create(
+            customer=customer,
+            destination='Valdivia',
+            start_date=timezone.now().date(),
+            end_date=timezone.now().date()
+        )
+        self.segment = TripSegment.objects.create(
+            trip=trip,
+            service=Service.objects.create(name='Traslado SLA', service_type='transfer'),
+            scheduled_datetime=timezone.now(),
+            voucher_code='SLA-001'
+        )
+        self.now = timezone.now()
+
+    def _incident(self, severity, hours_ago, status='open'):
+        incident = Incident.objects.create(
+            segment=self.segment, title=f'{severity} {hours_ago}h', description='-',
+            severity=severity, status=status
+        )
+        # reported_at es auto_now_add: se retrocede con update()
+        Incident.objects.filter(id=incident.id).update(reported_at=self.now - timedelta(hours=hours_ago))
+        return incident
+
+    def test_overdue_follows_sla_per_severity(self):
+        expected = {
+            self._incident('critical', 5).id,
+            self._incident('high', 13).id,
+            self._incident('medium', 25, status='in_progress').id,
+            self._incident('low', 49).id,
+        }
+        self._incident('critical', 3)
+        self._incident('high', 11)
+        self._incident('low', 47)
+        self._incident('critical', 10, status='resolved')
+
+        overdue = set(Incident.objects.overdue(self.now).values_list('id', flat=True))
+        self.assertEqual(overdue, expected)
+
+    def test_annotation_matches_python_property(self):
+        """is_overdue anotado en SQL coincide con el cálculo en Python"""
+        for severity, hours in Incident.SLA_HOURS.items():
+            self._incident(severity, hours + 1)
+            self._incident(severity, hours - 1)
+        self._incident('high', 30, status='closed')
+
+        annotated = {incident.id: incident for incident in Incident.objects.with_sla(self.now)}
+        for incident in Incident.objects.all():
+            row = annotated[incident.id]
+            self.assertEqual(row.is_overdue, incident.is_overdue, incident.title)
+            self.assertEqual(
+                row.sla_deadline,
+                incident.reported_at + timedelta(hours=Incident.SLA_HOURS[incident.severity])
+            )
+        self.assertEqual(
+            Incident.objects.with_sla(self.now).filter(is_overdue=True).count(),
+            Incident.objects.overdue(self.now).count()
+        )
+
+    def test_dashboard_counts_only_overdue(self):
+        self._incident('critical', 5)
+        self._incident('low', 2)
+        staff = User.objects.create_user(username='sla_staff', password='staff123', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get(reverse('staff_incidents_dashboard'))
+        self.assertEqual(response.context['stats']['overdue'], 1)
+
+    def test_admin_filter(self):
+        overdue = self._incident('critical', 5)
+        self._incident('critical', 1)
+        admin_user = User.objects.create_superuser(username='sla_admin', password='admin123')
+        self.client.force_login(admin_user)
+
+        response = self.client.get(reverse('admin:travel_incident_changelist'), {'sla': 'overdue'})
+        self.assertEqual([row.id for row in response.context['cl'].result_list], [overdue.id])
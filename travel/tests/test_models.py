@@ -1,6 +1,9 @@
 # travel/tests/test_models.py
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from datetime import date, datetime, timedelta
 from travel.models import Customer, Trip, Service, TripSegment, Incident
 
@@ -57,3 +60,34 @@ class ModelsTest(TestCase):
         )
         
         self.assertEqual(segment.voucher_code, 'TEST-001')
+
+    def test_changed_fields_tracking(self):
+        """Los cambios de estado se detectan sin releer la fila"""
+        service = Service.objects.create(name='Test Service', service_type='tour')
+        trip = Trip.objects.create(
+            customer=self.customer,
+            destination='Test',
+            start_date=date.today(),
+            end_date=date.today() + timedelta(days=1)
+        )
+        segment = TripSegment.objects.create(
+            trip=trip,
+            service=service,
+            scheduled_datetime=timezone.now(),
+            voucher_code='TRACK-001'
+        )
+        incident = Incident.objects.create(segment=segment, title='Retraso', description='Bus atrasado')
+        
+        incident = Incident.objects.get(pk=incident.pk)
+        self.assertEqual(incident.changed_fields, set())
+        
+        incident.status = 'resolved'
+        self.assertEqual(incident.changed_fields, {'status'})
+        self.assertEqual(incident.loaded_value('status'), 'open')
+        
+        with CaptureQueriesContext(connection) as queries:
+            incident.save()
+        selects = [q for q in queries if q['sql'].startswith('SELECT') and 'FROM "travel_incident"' in q['sql']]
+        self.assertEqual(selects, [])
+        self.assertIsNotNone(incident.resolved_at)
+        self.assertEqual(incident.changed_fields, set())
@@ -0,0 +1,248 @@
+# travel/tests/test_notifications.py
+import asyncio
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core import mail
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+from unittest.mock import patch
+from travel.models import Customer, Trip, Service, TripSegment, Incident, Notification
+from travel.notifications import (
+    queue_notification, mark_notifications_read, encode_cursor, NotificationOutbox, EMAIL, WHATSAPP
+)
+from travel.tasks import reconcile_unread_counters, deliver_notifications
+
+class NotificationOutboxTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='outbox_test',
+            email='outbox@test.com',
+            password='test123'
+        )
+        self.customer = Customer.objects.create(user=self.user)
+        self.trip = Trip.objects.create(
+            customer=self.customer,
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=2)
+        )
+        self.service = Service.objects.create(name='Tour Lago', service_type='tour')
+        self.segment = TripSegment.objects.create(
+            trip=self.trip,
+            service=self.service,
+            scheduled_datetime=timezone.now(),
+            voucher_code='OUTBOX-001'
+        )
+
+    def test_incident_creation_inserts_single_notification(self):
+        """Crear una incidencia genera una sola notificación y un email"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Incident.objects.create(segment=self.segment, title='Retraso', description='Bus atrasado')
+
+        self.assertEqual(Notification.objects.filter(customer=self.customer).count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNotNone(Notification.objects.get(customer=self.customer).delivered_at)
+
+    def test_events_are_flushed_once_on_commit(self):
+        """Los eventos de una transacción se insertan juntos al hacer commit"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                queue_notification(self.customer.pk, 'Uno', 'Mensaje 1')
+                queue_notification(self.customer.pk, 'Dos', 'Mensaje 2')
+                queue_notification(self.customer.pk, 'Uno', 'Mensaje 1', channels=(EMAIL,))
+                self.assertEqual(Notification.objects.count(), 0)
+
+        self.assertEqual(sum(isinstance(callback, NotificationOutbox) for callback in callbacks), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(Notification.objects.get(title='Uno').channels, [EMAIL])
+
+    def test_rollback_discards_events(self):
+        """Si la transacción falla no se crean notificaciones"""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    queue_notification(self.customer.pk, 'Uno', 'Mensaje 1')
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                queue_notification(self.customer.pk, 'Dos', 'Mensaje 2')
+
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['Dos'])
+
+    def test_savepoint_rollback_discards_its_events(self):
+        """Lo emitido en un savepoint revertido no se entrega aunque la transacción confirme"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                queue_notification(self.customer.pk, 'Antes', 'Mensaje')
+                try:
+                    with transaction.atomic():
+                        queue_notification(self.customer.pk, 'Dentro', 'Mensaje')
+                        queue_notification(self.customer.pk, 'Antes', 'Mensaje', channels=(EMAIL,))
+                        raise ValueError
+                except ValueError:
+                    pass
+                queue_notification(self.customer.pk, 'Después', 'Mensaje')
+
+        self.assertEqual(set(Notification.objects.values_list('title', flat=True)), {'Antes', 'Después'})
+        self.assertEqual(Notification.objects.get(title='Antes').channels, [])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_channels_are_marked_from_actual_results(self):
+        """Un fallo de WhatsApp no reenvía el email ya entregado"""
+        self.customer.phone = '912345678'
+        self.customer.save()
+        notification = Notification.objects.create(
+            customer=self.customer, title='Aviso', message='-', channels=[EMAIL, WHATSAPP]
+        )
+        failure = [{'success': False, 'error': 'Timeout'}]
+        with patch('travel.services.whatsapp_async.send_many', return_value=failure) as send_many:
+            deliver_notifications.delay([notification.id])
+
+        # Se reintenta solo WhatsApp: el email salió una vez
+        self.assertEqual(send_many.call_count, 4)
+        self.assertEqual(len(mail.outbox), 1)
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.email_delivered_at)
+        self.assertIsNone(notification.whatsapp_delivered_at)
+        self.assertIsNone(notification.delivered_at)
+
+        with patch('travel.services.whatsapp_async.send_many', return_value=[{'success': True}]):
+            deliver_notifications([notification.id])
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.whatsapp_delivered_at)
+        self.assertIsNotNone(notification.delivered_at)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class UnreadCounterTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter_test', password='test123')
+        self.customer = Customer.objects.create(user=self.user)
+
+    def unread(self):
+        self.customer.refresh_from_db(fields=['unread_notifications'])
+        return self.customer.unread_notifications
+
+    def test_counter_follows_creates_and_reads(self):
+        """El contador sigue las altas (bulk y fila a fila) y las lecturas"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                queue_notification(self.customer.pk, 'Uno', 'Mensaje 1')
+                queue_notification(self.customer.pk, 'Dos', 'Mensaje 2')
+                queue_notification(self.customer.pk, 'Tres', 'Mensaje 3')
+        notification = Notification.objects.create(customer=self.customer, title='Cuatro', message='-')
+        self.assertEqual(self.unread(), 4)
+
+        notification.read = True
+        notification.save()
+        self.assertEqual(self.unread(), 3)
+
+        self.assertEqual(mark_notifications_read(self.customer.pk), 3)
+        self.assertEqual(mark_notifications_read(self.customer.pk), 0)
+        self.assertEqual(self.unread(), 0)
+
+    def test_deleting_unread_notification_decrements(self):
+        notification = Notification.objects.create(customer=self.customer, title='Uno', message='-')
+        notification.delete()
+        self.assertEqual(self.unread(), 0)
+
+    def test_full_save_keeps_concurrent_increments(self):
+        """Un save() con una copia vieja del cliente no pisa el contador"""
+        stale = Customer.objects.get(pk=self.customer.pk)
+        Notification.objects.create(customer=self.customer, title='Uno', message='-')
+
+        stale.phone = '912345678'
+        stale.save()
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(Customer.objects.get(pk=self.customer.pk).phone, '912345678')
+
+    def test_reconcile_fixes_drift(self):
+        """La tarea periódica corrige contadores desviados"""
+        Notification.objects.bulk_create([
+            Notification(customer=self.customer, title=f'N{i}', message='-') for i in range(3)
+        ])
+        Customer.objects.filter(pk=self.customer.pk).update(unread_notifications=7)
+
+        self.assertEqual(reconcile_unread_counters(), 'Corregidos 1 contadores de no leídas')
+        self.assertEqual(self.unread(), 3)
+        self.assertEqual(reconcile_unread_counters(), 'Corregidos 0 contadores de no leídas')
+
+
+class NotificationFeedTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='feed_test', password='test123')
+        self.customer = Customer.objects.create(user=self.user)
+        Notification.objects.bulk_create([
+            Notification(customer=self.customer, title=f'N{i:02d}', message='-') for i in range(45)
+        ])
+        # Mismo created_at para todas: el id desempata el orden
+        Notification.objects.update(created_at=timezone.now())
+        self.client.login(username='feed_test', password='test123')
+
+    def test_cursor_pages_cover_feed_without_gaps(self):
+        """Recorrer el feed por cursor devuelve cada notificación una sola vez"""
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 20}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(reverse('notifications_feed'), params).json()
+            seen += [n['id'] for n in data['notifications']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        expected = list(Notification.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_only_returned_window_is_marked_read(self):
+        """Solo se marcan como leídas las notificaciones de la página devuelta"""
+        response = self.client.get(reverse('notifications'))
+        self.assertEqual(len(response.context['notifications']), 20)
+        self.assertEqual(Notification.objects.filter(read=True).count(), 20)
+        self.assertTrue(response.context['next_cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('notifications_feed'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_poll_returns_newer_notifications(self):
+        """El long-poll devuelve solo lo posterior al cursor"""
+        cursor = self.client.get(reverse('notifications_feed'), {'limit': 1}).json()['notifications'][0]['cursor']
+
+        data = self.client.get(reverse('notifications_poll'), {'after': cursor, 'timeout': 0}).json()
+        self.assertEqual(data['notifications'], [])
+        self.assertEqual(data['cursor'], cursor)
+
+        Notification.objects.create(customer=self.customer, title='Nueva', message='-')
+        data = self.client.get(reverse('notifications_poll'), {'after': cursor, 'timeout': 0}).json()
+        self.assertEqual([n['title'] for n in data['notifications']], ['Nueva'])
+
+    def test_poll_rejects_non_finite_timeout(self):
+        for timeout in ('nan', 'inf', '-inf', 'abc'):
+            response = self.client.get(reverse('notifications_poll'), {'timeout': timeout})
+            self.assertEqual(response.status_code, 400)
+
+    async def test_poll_wakes_up_on_new_notification(self):
+        """El long-poll espera en el broker y responde al confirmarse una notificación"""
+        await self.async_client.aforce_login(self.user)
+        latest = await Notification.objects.order_by('-created_at', '-id').afirst()
+        cursor = encode_cursor(latest)
+        poll = asyncio.create_task(
+            self.async_client.get(reverse('notifications_poll'), {'after': cursor, 'timeout': 10})
+        )
+        await asyncio.sleep(0.2)
+        self.assertFalse(poll.done())
+
+        def notify():
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(customer=self.customer, title='En vivo', message='-')
+        await sync_to_async(notify)()
+
+        response = await asyncio.wait_for(poll, 5)
+        self.assertEqual([n['title'] for n in response.json()['notifications']], ['En vivo'])
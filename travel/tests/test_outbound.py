@@ -0,0 +1,200 @@
+# travel/tests/test_outbound.py
+import json
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from travel.models import Customer, Trip, Service, TripSegment, OutboundMessage
+from travel.monitoring import queue_lag
+from travel.tasks import deliver_outbound_message, requeue_stale_outbound_messages
+
+SENT = {'success': True, 'message_sid': 'SM123', 'status': 'queued'}
+
+
+@patch('travel.services.whatsapp.WhatsAppService.send_message', return_value=SENT)
+class OutboundMessageViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='viajera', password='test123', first_name='Rosa', last_name='Díaz')
+        self.customer = Customer.objects.create(user=self.user, phone='+56 9 1234 5678')
+        trip = Trip.objects.create(
+            customer=self.customer,
+            destination='San Pedro de Atacama',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=2)
+        )
+        self.segment = TripSegment.objects.create(
+            trip=trip,
+            service=Service.objects.create(name='Géiseres del Tatio', service_type='tour'),
+            scheduled_datetime=timezone.now() + timedelta(days=1),
+            voucher_code='ATA-001'
+        )
+        self.client.login(username='viajera', password='test123')
+
+    def test_reminder_is_queued_and_delivered_off_request(self, send_message):
+        url = reverse('send_whatsapp_reminder', args=[self.segment.id])
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 202)
+        # Twilio no se llama dentro del request
+        send_message.assert_not_called()
+        delivery = response.json()['delivery']
+        self.assertEqual(delivery['status'], 'queued')
+
+        message = OutboundMessage.objects.get(id=delivery['id'])
+        self.assertEqual(message.queue, 'messaging')
+        self.assertIn('Géiseres del Tatio', message.body)
+
+        for callback in callbacks:
+            callback()
+        send_message.assert_called_once_with('+56 9 1234 5678', message.body)
+
+        status = self.client.get(delivery['status_url']).json()
+        self.assertEqual(status['status'], 'sent')
+        self.assertIsNotNone(status['sent_at'])
+        self.assertNotIn('body', status)
+
+    @override_settings(EMERGENCY_STAFF_WHATSAPP='+56911112222')
+    def test_emergency_uses_emergency_queue_staff_first(self, send_message):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('emergency_whatsapp_contact'),
+                json.dumps({'type': 'medical', 'location': 'Valle de la Luna'}),
+                content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, 202)
+        deliveries = response.json()['deliveries']
+        self.assertEqual([d['kind'] for d in deliveries], ['emergency_staff', 'emergency_contact'])
+        self.assertEqual(set(OutboundMessage.objects.values_list('queue', flat=True)), {'emergency'})
+        self.assertEqual(send_message.call_args_list[0].args[0], '+56911112222')
+        self.assertIn('Valle de la Luna', send_message.call_args_list[0].args[1])
+        self.assertEqual(OutboundMessage.objects.filter(status='sent').count(), 2)
+
+    def test_delivery_status_is_private(self, send_message):
+        message = OutboundMessage.objects.create(
+            customer=self.customer, kind='itinerary_reminder', queue='messaging', recipient='912345678', body='-'
+        )
+        other = User.objects.create_user(username='otro', password='test123')
+        Customer.objects.create(user=other)
+        self.client.login(username='otro', password='test123')
+        response = self.client.get(reverse('delivery_status', args=[message.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class DeliverOutboundMessageTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='cola')
+        self.message = OutboundMessage.objects.create(
+            customer=Customer.objects.create(user=user, phone='912345678'),
+            kind='emergency_contact', queue='emergency', recipient='912345678', body='Hola'
+        )
+
+    @patch('travel.services.whatsapp.WhatsAppService.send_message', return_value=SENT)
+    def test_duplicate_task_does_not_resend(self, send_message):
+        deliver_outbound_message(self.message.id)
+        result = deliver_outbound_message(self.message.id)
+        self.assertIn('ya procesado', result)
+        send_message.assert_called_once()
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.provider_id), ('sent', 'SM123'))
+        self.assertIsNotNone(self.message.started_at)
+
+    @patch('travel.services.whatsapp.WhatsAppService.send_message',
+           return_value={'success': False, 'error': 'Timeout'})
+    def test_transient_errors_are_retried_then_fail(self, send_message):
+        deliver_outbound_message.delay(self.message.id)
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.status, 'failed')
+        self.assertEqual(self.message.attempts, 4)
+        self.assertEqual(send_message.call_count, 4)
+
+    @patch('travel.services.whatsapp.WhatsAppService.send_message',
+           return_value={'success': False, 'error': 'Service not configured'})
+    def test_missing_credentials_fail_without_retry(self, send_message):
+        deliver_outbound_message.delay(self.message.id)
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.attempts), ('failed', 1))
+
+
+    @patch('travel.services.whatsapp.WhatsAppService.send_message', return_value=SENT)
+    def test_stale_sending_claims_are_requeued(self, send_message):
+        # Worker caído a mitad del envío: quedó en 'sending' hace 20 minutos
+        OutboundMessage.objects.filter(id=self.message.id).update(
+            status='sending', attempts=1, started_at=timezone.now() - timedelta(minutes=20)
+        )
+        recent = OutboundMessage.objects.create(
+            customer=self.message.customer, kind='x', queue='messaging', recipient='1', body='-',
+            status='sending', attempts=1, started_at=timezone.now()
+        )
+        exhausted = OutboundMessage.objects.create(
+            customer=self.message.customer, kind='x', queue='messaging', recipient='1', body='-',
+            status='sending', attempts=4, started_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertIn('1 mensajes reencolados, 1 fallidos', requeue_stale_outbound_messages())
+        send_message.assert_called_once_with('912345678', 'Hola')
+        self.message.refresh_from_db()
+        self.assertEqual((self.message.status, self.message.attempts), ('sent', 2))
+        self.assertEqual(OutboundMessage.objects.get(id=recent.id).status, 'sending')
+        self.assertEqual(OutboundMessage.objects.get(id=exhausted.id).status, 'failed')
+
+
+class QueueLagMetricsTest(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(user=User.objects.create_user(username='metricas'))
+        self.now = timezone.now()
+
+    def _message(self, queue, created_ago, waited=None):
+        message = OutboundMessage.objects.create(
+            customer=self.customer, kind='x', queue=queue, recipient='1', body='-'
+        )
+        created_at = self.now - timedelta(seconds=created_ago)
+        started_at = created_at + timedelta(seconds=waited) if waited is not None else None
+        OutboundMessage.objects.filter(id=message.id).update(
+            created_at=created_at, started_at=started_at, status='sent' if started_at else 'queued'
+        )
+
+    def test_lag_percentiles_and_backlog_per_queue(self):
+        for waited in range(1, 11):
+            self._message('emergency', 60, waited)
+        self._message('messaging', 300, 120)
+        self._message('messaging', 90)
+        self._message('messaging', 30)
+        # Fuera de la ventana
+        self._message('emergency', 7200, 500)
+
+        stats = queue_lag(now=self.now)
+        self.assertEqual(stats['emergency']['samples'], 10)
+        self.assertEqual(stats['emergency']['p50'], 5)
+        self.assertEqual(stats['emergency']['p95'], 10)
+        self.assertEqual(stats['emergency']['pending'], 0)
+        self.assertEqual(stats['messaging']['pending'], 2)
+        self.assertEqual(stats['messaging']['oldest_pending_seconds'], 90)
+        self.assertEqual(stats['messaging']['max'], 120)
+
+    def test_stale_sending_claims_raise_an_alert(self):
+        self._message('emergency', 1800, 10)
+        OutboundMessage.objects.update(status='sending')
+        self._message('messaging', 30, 5)
+        OutboundMessage.objects.filter(queue='messaging').update(status='sending')
+
+        with self.assertLogs('clmundo', 'WARNING') as logs:
+            stats = queue_lag(now=self.now)
+        self.assertEqual(stats['emergency']['stale_sending'], 1)
+        self.assertEqual(stats['messaging']['stale_sending'], 0)
+        self.assertIn('queue emergency', logs.output[0])
+
+    def test_metrics_endpoint_is_staff_only(self):
+        User.objects.create_user(username='ops', password='ops123', is_staff=True)
+        User.objects.create_user(username='cliente', password='cli123')
+
+        self.client.login(username='cliente', password='cli123')
+        self.assertEqual(self.client.get(reverse('queue_metrics')).status_code, 403)
+
+        self.client.login(username='ops', password='ops123')
+        response = self.client.get(reverse('queue_metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['queues']), {'emergency', 'messaging'})
@@ -0,0 +1,123 @@
+# travel/tests/test_query_plans.py
+import os
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+from travel.models import Customer, Trip, Service, TripSegment, Incident
+from travel.utils import day_range
+
+# Cantidad de segmentos sembrados. En CI con PostgreSQL usar
+# QUERY_PLAN_SEGMENTS=1000000 para validar el plan con volumen real.
+SEGMENT_COUNT = int(os.environ.get('QUERY_PLAN_SEGMENTS', 5000))
+BATCH_SIZE = 5000
+
+
+class TripSegmentQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='plan_test')
+        customer = Customer.objects.create(user=user)
+        today = timezone.localdate()
+
+        cls.trips = Trip.objects.bulk_create([
+            Trip(
+                customer=customer,
+                destination=f'Destino {i}',
+                start_date=today,
+                end_date=today + timedelta(days=3)
+            ) for i in range(50)
+        ])
+        cls.service = Service.objects.create(name='Vuelo plan', service_type='flight')
+
+        start = timezone.now() - timedelta(days=180)
+        statuses = ['confirmed', 'pending', 'en_route', 'completed', 'cancelled']
+        for offset in range(0, SEGMENT_COUNT, BATCH_SIZE):
+            TripSegment.objects.bulk_create([
+                TripSegment(
+                    trip=cls.trips[i % len(cls.trips)],
+                    service=cls.service,
+                    scheduled_datetime=start + timedelta(minutes=7 * i),
+                    voucher_code=f'PLAN-{i:07d}',
+                    status=statuses[i % len(statuses)]
+                ) for i in range(offset, min(offset + BATCH_SIZE, SEGMENT_COUNT))
+            ])
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f'Plan inesperado:\n{plan}')
+
+    def test_day_window_by_status_uses_composite_index(self):
+        """Ventana del día filtrada por estado usa (scheduled_datetime, status)"""
+        today_start, today_end = day_range()
+        queryset = TripSegment.objects.filter(
+            scheduled_datetime__gte=today_start,
+            scheduled_datetime__lt=today_end,
+            status='en_route'
+        )
+        self.assertUsesIndex(queryset, 'segment_sched_status_idx')
+
+    def test_trip_day_window_uses_trip_index(self):
+        """Segmentos de un viaje en el día usan (trip, scheduled_datetime)"""
+        today_start, today_end = day_range()
+        queryset = TripSegment.objects.filter(
+            trip=self.trips[0],
+            scheduled_datetime__gte=today_start,
+            scheduled_datetime__lt=today_end
+        ).order_by('scheduled_datetime')
+        self.assertUsesIndex(queryset, 'segment_trip_sched_idx')
+
+    def test_day_range_is_half_open(self):
+        """El rango del día incluye medianoche y excluye el día siguiente"""
+        today = timezone.localdate()
+        today_start, today_end = day_range(today)
+        self.assertEqual(timezone.localtime(today_start).date(), today)
+        self.assertEqual(timezone.localtime(today_end).date(), today + timedelta(days=1))
+        self.assertEqual(timezone.localtime(today_end).hour, 0)
+
+
+class IncidentQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(user=User.objects.create_user(username='incident_plan'))
+        trip = Trip.objects.create(
+            customer=customer, destination='Destino', start_date=timezone.localdate(), end_date=timezone.localdate()
+        )
+        segment = TripSegment.objects.create(
+            trip=trip,
+            service=Service.objects.create(name='Tour plan', service_type='tour'),
+            scheduled_datetime=timezone.now(),
+            voucher_code='PLAN-INC'
+        )
+        # Casi todas resueltas: el índice parcial solo guarda las abiertas
+        severities = [key for key, _ in Incident.SEVERITY_CHOICES]
+        Incident.objects.bulk_create([
+            Incident(
+                segment=segment, title=f'Incidencia {i}', description='-',
+                severity=severities[i % len(severities)],
+                status='open' if i % 50 == 0 else 'resolved'
+            ) for i in range(SEGMENT_COUNT)
+        ])
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _explain(self, queryset):
+        if connection.vendor != 'sqlite':
+            return queryset.explain()
+        # psycopg2 interpola los parámetros en el cliente y PostgreSQL ve
+        # literales; SQLite no prueba el predicado de un índice parcial contra
+        # parámetros ligados, así que se explica el SQL ya interpolado
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + connection.ops.last_executed_query(cursor, sql, params))
+            return '\n'.join(str(row) for row in cursor.fetchall())
+
+    def test_overdue_uses_open_sla_index(self):
+        """Las vencidas se calculan sobre el índice parcial de abiertas"""
+        plan = self._explain(Incident.objects.overdue())
+        self.assertIn('incident_open_sla_idx', plan, f'Plan inesperado:\n{plan}')
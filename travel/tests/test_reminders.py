@@ -0,0 +1,116 @@
+# travel/tests/test_reminders.py
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.utils import timezone
+from travel.models import Customer, Trip, Service, TripSegment
+from travel import reminders
+from travel.tasks import schedule_reminders, send_slot_reminders, dispatch_reminders
+
+
+class ReminderTimeWheelTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='rueda', email='rueda@test.com', first_name='Inés')
+        self.trip = Trip.objects.create(
+            customer=Customer.objects.create(user=user),
+            destination='Pucón',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=3)
+        )
+        self.service = Service.objects.create(name='Ascenso Volcán Villarrica', service_type='tour')
+        self.now = timezone.now()
+
+    def _segment(self, code, starts_in):
+        # Sin ejecutar on_commit: la rueda se prueba aparte del signal
+        return TripSegment.objects.create(
+            trip=self.trip, service=self.service,
+            scheduled_datetime=self.now + starts_in, voucher_code=code
+        )
+
+    def test_slot_start_is_aligned(self):
+        slot = reminders.slot_start(self.now)
+        self.assertEqual(slot.timestamp() % reminders.REMINDER_SLOT.total_seconds(), 0)
+        self.assertLessEqual(slot, self.now)
+        self.assertGreater(slot + reminders.REMINDER_SLOT, self.now)
+
+    def test_wheel_enqueues_each_slot_once_with_eta(self):
+        lead = reminders.REMINDER_LEAD
+        self._segment('WHEEL-1', lead + timedelta(hours=2))
+        self._segment('WHEEL-2', lead + timedelta(hours=2, seconds=1))
+        self._segment('WHEEL-3', lead + timedelta(hours=7))
+        # Fuera del horizonte
+        self._segment('WHEEL-4', lead + reminders.REMINDER_HORIZON + timedelta(hours=1))
+
+        with patch('travel.tasks.send_slot_reminders.apply_async') as apply_async:
+            schedule_reminders()
+            schedule_reminders()
+
+        etas = [call.kwargs['eta'] for call in apply_async.call_args_list]
+        self.assertEqual(len(etas), len(set(etas)))
+        self.assertIn(len(etas), (2, 3))
+        for eta in etas:
+            self.assertEqual(eta, reminders.slot_start(eta))
+            self.assertGreater(eta, self.now + timedelta(hours=1))
+
+    def test_slot_sends_once_and_follows_reschedules(self):
+        segment = self._segment('SLOT-1', reminders.REMINDER_LEAD + timedelta(minutes=1))
+        self._segment('SLOT-OTHER', reminders.REMINDER_LEAD + timedelta(hours=3))
+        slot = reminders.slot_start(segment.scheduled_datetime - reminders.REMINDER_LEAD)
+
+        with patch('travel.tasks.timezone.now', return_value=slot + timedelta(seconds=1)):
+            send_slot_reminders(slot.isoformat())
+            send_slot_reminders(slot.isoformat())
+        self.assertEqual(len(mail.outbox), 1)
+        segment.refresh_from_db()
+        self.assertEqual(segment.reminder_sent_for, segment.scheduled_datetime)
+
+        # Reprogramado: vuelve a quedar pendiente para la nueva fecha
+        moved_to = segment.scheduled_datetime + timedelta(hours=4)
+        TripSegment.objects.filter(id=segment.id).update(scheduled_datetime=moved_to)
+        new_slot = reminders.slot_start(moved_to - reminders.REMINDER_LEAD)
+        with patch('travel.tasks.timezone.now', return_value=new_slot + timedelta(seconds=1)):
+            send_slot_reminders(new_slot.isoformat())
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_early_slot_is_released(self):
+        slot = reminders.slot_start(self.now + timedelta(hours=1))
+        reminders.mark_slot_scheduled(slot)
+        result = send_slot_reminders(slot.isoformat())
+        self.assertIn('aún no comienza', result)
+        self.assertTrue(reminders.mark_slot_scheduled(slot))
+
+    def test_rescheduled_into_the_past_slot_is_sent_now(self):
+        """Un servicio movido a menos de REMINDER_LEAD de distancia se recuerda de inmediato"""
+        segment = self._segment('MOVE-1', reminders.REMINDER_LEAD + timedelta(hours=10))
+        with self.captureOnCommitCallbacks(execute=True):
+            segment.scheduled_datetime = timezone.now() + timedelta(hours=3)
+            segment.save()
+        self.assertEqual(len(mail.outbox), 1)
+
+        # Ni la rueda ni otro cambio sin reprogramar lo vuelven a enviar
+        schedule_reminders()
+        with self.captureOnCommitCallbacks(execute=True):
+            segment.notes = 'Traer bastones'
+            segment.save()
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_wheel_sends_overdue_and_skips_cancelled(self):
+        self._segment('LATE-1', timedelta(hours=5))
+        cancelled = self._segment('LATE-2', timedelta(hours=6))
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        self._segment('PAST-1', -timedelta(hours=1))
+
+        result = schedule_reminders()
+        self.assertTrue(result.startswith('1 recordatorios atrasados'))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_dispatch_spreads_batches_over_the_slot(self):
+        with patch('travel.tasks.group') as group:
+            dispatch_reminders(range(10), chunk_size=4, spread=timedelta(minutes=6))
+        countdowns = [signature.options['countdown'] for signature in group.call_args.args[0]]
+        self.assertEqual(countdowns, [0, 120, 240])
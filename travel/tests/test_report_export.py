@@ -0,0 +1,164 @@
+# travel/tests/test_report_export.py
+import csv
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User, Permission
+from django.contrib.messages import get_messages
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from asgiref.sync import sync_to_async
+from travel.models import Customer, Trip, Service, TripSegment, Incident
+from travel.services import report_export
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ReportExportTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        user = User.objects.create_user(username='export_test', first_name='Ana', last_name='Rojas')
+        trip = Trip.objects.create(
+            customer=Customer.objects.create(user=user),
+            destination='Atacama',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        service = Service.objects.create(name='Geysers', service_type='tour')
+        self.segments = [
+            TripSegment.objects.create(
+                trip=trip, service=service, scheduled_datetime=timezone.now(),
+                voucher_code=f'EXP-{i:03d}', status='pending' if i % 2 else 'confirmed'
+            ) for i in range(5)
+        ]
+        for i, segment in enumerate(self.segments):
+            Incident.objects.create(
+                segment=segment, title=f'=HYPERLINK("x") {i}' if i == 0 else f'Incidencia {i}',
+                description='-', status='open' if i < 3 else 'resolved', severity='high'
+            )
+        self.staff = User.objects.create_superuser(username='export_staff', password='staff123')
+        self.client.force_login(self.staff)
+
+    @staticmethod
+    def _csv_rows(response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(StringIO(content.lstrip('\ufeff'))))
+
+    def test_csv_export_applies_admin_filters(self):
+        response = self.client.get(reverse('staff_export', args=['incidents']), {'status__exact': 'open'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('incidencias-', response['Content-Disposition'])
+
+        rows = self._csv_rows(response)
+        self.assertEqual(rows[0][:3], ['ID', 'Reportada', 'Título'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row[5] for row in rows[1:]}, {'Abierta'})
+        self.assertEqual({row[6] for row in rows[1:]}, {'Ana'})
+        # Texto que Excel tomaría como fórmula queda escapado
+        self.assertIn("'=HYPERLINK(\"x\") 0", [row[2] for row in rows])
+
+    def test_csv_is_streamed_in_chunks(self):
+        with patch.object(report_export, 'EXPORT_CHUNK_SIZE', 2):
+            response = self.client.get(reverse('staff_export', args=['segments']))
+            chunks = list(response.streaming_content)
+        self.assertGreaterEqual(len(chunks), 3)
+        rows = list(csv.reader(StringIO(b''.join(chunks).decode('utf-8').lstrip('\ufeff'))))
+        self.assertEqual(len(rows), 6)
+
+    @staticmethod
+    def _xlsx_rows(response):
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        return list(workbook.worksheets[0].iter_rows(values_only=True))
+
+    def test_xlsx_export_is_built_in_background(self):
+        response = self.client.get(
+            reverse('staff_export', args=['segments']), {'format': 'xlsx', 'status__exact': 'pending'}
+        )
+        self.assertEqual(response.status_code, 202)
+        download_url = response.json()['download_url']
+
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('segmentos-', response['Content-Disposition'])
+        rows = self._xlsx_rows(response)
+        self.assertEqual(rows[0][:2], ('ID', 'Voucher'))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row[3] for row in rows[1:]}, {'Pendiente'})
+
+        # El link es solo de quien pidió el exporte
+        self.client.force_login(User.objects.create_superuser(username='otro_staff', password='x'))
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+
+    def test_xlsx_download_pending(self):
+        with patch('travel.tasks.export_report_xlsx.delay'):
+            response = self.client.get(reverse('staff_export', args=['incidents']), {'format': 'xlsx'})
+        self.assertEqual(self.client.get(response.json()['download_url']).status_code, 202)
+
+    async def test_async_csv_matches_sync(self):
+        queryset = Incident.objects.order_by('id')
+        columns = report_export.INCIDENT_COLUMNS
+        with patch.object(report_export, 'EXPORT_CHUNK_SIZE', 2):
+            chunks = [chunk async for chunk in report_export.astream_csv(queryset, columns)]
+            expected = await sync_to_async(lambda: list(report_export.stream_csv(queryset, columns)))()
+        self.assertEqual(chunks, expected)
+        self.assertEqual(len(chunks), 4)
+
+        # Por ASGI la vista responde con el iterador async
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('staff_export', args=['incidents']))
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        self.assertEqual(len(list(csv.reader(StringIO(content.lstrip('\ufeff'))))), 6)
+
+    def test_xlsx_splits_sheets(self):
+        with patch.object(report_export, 'XLSX_SHEET_ROWS', 2):
+            output = BytesIO()
+            report_export.write_xlsx(TripSegment.objects.all(), report_export.SEGMENT_COLUMNS, output)
+        workbook = load_workbook(BytesIO(output.getvalue()), read_only=True)
+        self.assertEqual(len(workbook.worksheets), 3)
+
+    def test_admin_action_exports_selection(self):
+        selected = [segment.pk for segment in self.segments[:2]]
+        response = self.client.post(reverse('admin:travel_tripsegment_changelist'), {
+            'action': 'export_csv',
+            '_selected_action': selected,
+        })
+        rows = self._csv_rows(response)
+        self.assertEqual(sorted(int(row[0]) for row in rows[1:]), selected)
+
+    def test_admin_action_queues_xlsx_of_selection(self):
+        selected = [segment.pk for segment in self.segments[:2]]
+        response = self.client.post(reverse('admin:travel_tripsegment_changelist'), {
+            'action': 'export_xlsx',
+            '_selected_action': selected,
+        })
+        self.assertEqual(response.status_code, 302)
+        message = str(list(get_messages(response.wsgi_request))[0])
+        download_url = message.split('href="')[1].split('"')[0]
+
+        rows = self._xlsx_rows(self.client.get(download_url))
+        self.assertEqual(sorted(row[0] for row in rows[1:]), selected)
+
+    def test_invalid_requests(self):
+        url = reverse('staff_export', args=['incidents'])
+        self.assertEqual(self.client.get(url, {'format': 'pdf'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'nonexistent_field': '1'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('staff_export', args=['trips'])).status_code, 404)
+
+        # Staff sin permiso de ver el modelo en el admin
+        staff = User.objects.create_user(username='export_staff_limitado', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        staff.user_permissions.add(Permission.objects.get(codename='view_incident'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.force_login(User.objects.create_user(username='export_cliente'))
+        self.assertRedirects(self.client.get(url), reverse('home'), fetch_redirect_response=False)
@@ -0,0 +1,89 @@
+# travel/tests/test_snapshot.py
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import timedelta
+from travel.models import Customer, Trip, Service, TripSegment, Incident, Notification
+from travel.snapshot import get_customer_snapshot
+
+class CustomerSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='snapshot_test', password='test123')
+        self.customer = Customer.objects.create(user=self.user)
+        self.trip = Trip.objects.create(
+            customer=self.customer,
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=2)
+        )
+        self.service = Service.objects.create(name='Tour Lago', service_type='tour')
+        self.segment = TripSegment.objects.create(
+            trip=self.trip,
+            service=self.service,
+            scheduled_datetime=timezone.now(),
+            voucher_code='SNAP-001'
+        )
+
+    def test_snapshot_is_cached(self):
+        """El segundo acceso al snapshot no consulta la base de datos"""
+        snapshot = get_customer_snapshot(self.customer.pk)
+        self.assertEqual(snapshot.active_trip, self.trip)
+
+        with self.assertNumQueries(0):
+            cached = get_customer_snapshot(self.customer.pk)
+        self.assertEqual(cached.active_trip, self.trip)
+
+    def test_notification_invalidates_snapshot(self):
+        """Crear una notificación actualiza el contador no leído"""
+        self.assertEqual(get_customer_snapshot(self.customer.pk).unread_notifications, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(customer=self.customer, title='Hola', message='Mensaje')
+        self.assertEqual(get_customer_snapshot(self.customer.pk).unread_notifications, 1)
+
+    def test_incident_invalidates_snapshot(self):
+        """Reportar una incidencia actualiza el contador de incidencias abiertas"""
+        self.assertEqual(get_customer_snapshot(self.customer.pk).unread_incidents, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Incident.objects.create(segment=self.segment, title='Retraso', description='Bus atrasado')
+        self.assertEqual(get_customer_snapshot(self.customer.pk).unread_incidents, 1)
+
+    def test_snapshot_is_invalidated_after_commit(self):
+        """Un snapshot reconstruido antes del commit no sobrevive a la invalidación"""
+        get_customer_snapshot(self.customer.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Incident.objects.create(segment=self.segment, title='Retraso', description='Bus atrasado')
+            # Request concurrente antes del commit: todavía ve el snapshot previo
+            self.assertEqual(get_customer_snapshot(self.customer.pk).unread_incidents, 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_customer_snapshot(self.customer.pk).unread_incidents, 1)
+
+    def test_incident_save_reuses_loaded_segment(self):
+        """Invalidar por una incidencia no vuelve a consultar su segmento; sin cambios no invalida"""
+        Incident.objects.create(segment=self.segment, title='Retraso', description='Bus atrasado')
+        incident = Incident.objects.select_related('segment__trip').get()
+        get_customer_snapshot(self.customer.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            incident.save()
+        with self.assertNumQueries(0):
+            get_customer_snapshot(self.customer.pk)
+
+        incident.status = 'in_progress'
+        with CaptureQueriesContext(connection) as queries:
+            incident.save()
+        self.assertFalse([q for q in queries if 'FROM "travel_tripsegment"' in q['sql']])
+
+    def test_notifications_page_resets_unread_count(self):
+        """Ver las notificaciones deja el contador en cero"""
+        Notification.objects.create(customer=self.customer, title='Hola', message='Mensaje')
+        self.client.login(username='snapshot_test', password='test123')
+
+        self.client.get('/notifications/')
+        self.assertEqual(get_customer_snapshot(self.customer.pk).unread_notifications, 0)
@@ -0,0 +1,113 @@
+# travel/tests/test_streams.py
+import json
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from unittest.mock import patch
+from travel.models import Customer, Trip, Service, TripSegment
+from travel.events import publish_segment_events, segment_event
+from travel import streams
+
+class SegmentStatusStreamTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='stream_test', password='test123')
+        self.staff = User.objects.create_user(username='stream_staff', password='test123', is_staff=True)
+        self.customer = Customer.objects.create(user=self.user)
+        self.trip = Trip.objects.create(
+            customer=self.customer,
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        self.segment = TripSegment.objects.create(
+            trip=self.trip,
+            service=Service.objects.create(name='Traslado', service_type='transfer'),
+            scheduled_datetime=timezone.now(),
+            voucher_code='STREAM-001'
+        )
+
+    def _event(self, status='en_route', display='En camino'):
+        return segment_event(
+            self.segment.id, self.trip.id, status, display,
+            self.segment.scheduled_datetime, previous_status='confirmed'
+        )
+
+    @staticmethod
+    async def _next_event(stream):
+        chunk = (await anext(stream)).decode()
+        lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        return lines['event'], json.loads(lines['data'])
+
+    async def test_trip_stream_sends_snapshot_then_changes(self):
+        """El viajero recibe el estado actual y luego cada cambio publicado"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('trip_status_stream', args=[self.trip.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = response.streaming_content
+        try:
+            self.assertTrue((await anext(stream)).startswith(b'retry:'))
+            event, data = await self._next_event(stream)
+            self.assertEqual(event, 'snapshot')
+            self.assertEqual(data[0]['status'], 'confirmed')
+
+            publish_segment_events([self._event()])
+            event, data = await self._next_event(stream)
+            self.assertEqual(event, 'status')
+            self.assertEqual((data['segment_id'], data['status']), (self.segment.id, 'en_route'))
+        finally:
+            await stream.aclose()
+
+    async def test_operations_stream_receives_day_channel(self):
+        """El staff recibe los cambios del día sin importar el viaje"""
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('operations_status_stream'))
+        stream = response.streaming_content
+        try:
+            await anext(stream)
+            await self._next_event(stream)
+
+            publish_segment_events([self._event('delayed', 'Atrasado')])
+            event, data = await self._next_event(stream)
+            self.assertEqual(data['status'], 'delayed')
+        finally:
+            await stream.aclose()
+
+    async def test_idle_stream_sends_keepalive(self):
+        await self.async_client.aforce_login(self.user)
+        with patch.object(streams, 'KEEPALIVE_SECONDS', 0.05):
+            response = await self.async_client.get(reverse('trip_status_stream', args=[self.trip.id]))
+            stream = response.streaming_content
+            try:
+                await anext(stream)
+                await anext(stream)
+                self.assertEqual(await anext(stream), b': keepalive\n\n')
+            finally:
+                await stream.aclose()
+
+    async def test_stream_access_is_restricted(self):
+        """Otro cliente no ve el viaje y solo el staff ve el stream del día"""
+        other = await sync_to_async(User.objects.create_user)(username='otro', password='test123')
+        await self.async_client.aforce_login(other)
+        response = await self.async_client.get(reverse('trip_status_stream', args=[self.trip.id]))
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.get(reverse('operations_status_stream'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_status_change_publishes_on_commit(self):
+        """El post_save publica el cambio solo al confirmar la transacción"""
+        with patch('travel.events.publish_segment_events') as publish:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                self.segment.status = 'en_route'
+                self.segment.save()
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        events = [event for call in publish.call_args_list for event in call.args[0]]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['previous_status'], 'confirmed')
+        self.assertEqual(events[0]['status'], 'en_route')
@@ -0,0 +1,158 @@
+# travel/tests/test_tasks.py
+import smtplib
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.utils import timezone
+from datetime import timedelta
+from unittest.mock import patch
+from travel.models import Customer, Trip, Service, TripSegment, Incident, Notification
+from io import StringIO
+from django.core.management import call_command
+from travel.tasks import check_delayed_services, check_overdue_incidents, send_reminder_batch
+from travel import reminders
+
+class PeriodicTasksTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='tasks_test',
+            email='tasks@test.com',
+            first_name='Ana',
+            last_name='Silva'
+        )
+        self.customer = Customer.objects.create(user=self.user)
+        self.trip = Trip.objects.create(
+            customer=self.customer,
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate() + timedelta(days=2)
+        )
+        self.service = Service.objects.create(name='Traslado aeropuerto', service_type='transfer')
+
+    def _segment(self, code, minutes_ago, status='confirmed'):
+        return TripSegment.objects.create(
+            trip=self.trip,
+            service=self.service,
+            scheduled_datetime=timezone.now() - timedelta(minutes=minutes_ago),
+            voucher_code=code,
+            status=status
+        )
+
+    @patch('travel.tasks.BATCH_SIZE', 2)
+    def test_check_delayed_services(self):
+        """Marca como atrasados solo los servicios vencidos y notifica una vez por segmento"""
+        late = [self._segment(f'LATE-{i}', 60) for i in range(5)]
+        on_time = self._segment('ON-TIME', 5)
+        done = self._segment('DONE', 60, status='completed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = check_delayed_services()
+
+        self.assertEqual(result, 'Marcados 5 servicios atrasados')
+        self.assertEqual(
+            TripSegment.objects.filter(status='delayed').count(), len(late)
+        )
+        on_time.refresh_from_db()
+        done.refresh_from_db()
+        self.assertEqual(on_time.status, 'confirmed')
+        self.assertEqual(done.status, 'completed')
+        self.assertEqual(Notification.objects.filter(customer=self.customer).count(), 5)
+
+    @patch('travel.tasks.BATCH_SIZE', 2)
+    def test_check_overdue_incidents_sends_one_digest_per_batch(self):
+        """Las incidencias vencidas se reportan en un email resumen por lote"""
+        segment = self._segment('INC-1', 0)
+        for severity in ['critical', 'critical', 'high', 'low']:
+            Incident.objects.create(segment=segment, title=f'Caso {severity}', description='-', severity=severity)
+        Incident.objects.update(reported_at=timezone.now() - timedelta(hours=13))
+
+        result = check_overdue_incidents()
+
+        self.assertEqual(result, 'Procesadas 3 incidencias vencidas')
+        self.assertEqual(
+            [message.subject for message in mail.outbox],
+            ['ALERTA: 3 incidencias vencidas (parte 1 de 2)', 'ALERTA: 3 incidencias vencidas (parte 2 de 2)']
+        )
+        self.assertIn('Ana Silva', mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].body.count('Caso critical'), 2)
+        self.assertIn('Caso high', mail.outbox[1].body)
+        self.assertFalse(any('Caso low' in message.body for message in mail.outbox))
+
+
+class ReminderDispatchTest(TestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Tour Valle de la Luna', service_type='tour')
+        self.tomorrow = timezone.now() + timedelta(days=1)
+        self.segments = []
+        for i in range(5):
+            user = User.objects.create_user(
+                username=f'viajero{i}', email=f'viajero{i}@test.com' if i else '', first_name=f'Viajero{i}'
+            )
+            trip = Trip.objects.create(
+                customer=Customer.objects.create(user=user),
+                destination='San Pedro de Atacama',
+                start_date=timezone.localdate(),
+                end_date=timezone.localdate() + timedelta(days=2)
+            )
+            self.segments.append(TripSegment.objects.create(
+                trip=trip, service=self.service, scheduled_datetime=self.tomorrow, voucher_code=f'REM-{i}'
+            ))
+
+    def test_batch_loads_segments_in_one_query(self):
+        """El lote carga segmento, viaje, cliente, usuario y servicio en una sola consulta"""
+        with self.assertNumQueries(1):
+            result = send_reminder_batch([segment.id for segment in self.segments])
+
+        # El cliente sin email se omite
+        self.assertEqual(result, 'Enviados 4 recordatorios (0 WhatsApp)')
+        self.assertEqual(len(mail.outbox), 4)
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, 'Recordatorio: Tour Valle de la Luna')
+        self.assertEqual(message.alternatives[0].mimetype, 'text/html')
+
+    def test_batch_reuses_one_connection(self):
+        with patch('travel.tasks.get_connection', wraps=mail.get_connection) as get_connection:
+            send_reminder_batch([segment.id for segment in self.segments])
+        self.assertEqual(get_connection.call_count, 1)
+
+    def test_failed_email_is_released_without_sinking_the_batch(self):
+        """Un envío fallido no corta el lote y su recordatorio vuelve a pendiente"""
+        ids = reminders.claim(TripSegment.objects.filter(id__in=[s.id for s in self.segments]))
+        send_messages = locmem.EmailBackend.send_messages
+
+        def flaky(backend, messages):
+            if messages[0].to == ['viajero2@test.com']:
+                raise smtplib.SMTPServerDisconnected('timeout')
+            if messages[0].to == ['viajero3@test.com']:
+                raise smtplib.SMTPRecipientsRefused({'viajero3@test.com': (550, b'No such user')})
+            return send_messages(backend, messages)
+
+        with patch.object(locmem.EmailBackend, 'send_messages', flaky):
+            result = send_reminder_batch(ids)
+
+        self.assertEqual(result, 'Enviados 2 recordatorios (0 WhatsApp), 1 liberados para reintentar')
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['viajero1@test.com', 'viajero4@test.com'])
+        pending = reminders.pending_reminders().filter(id__in=ids)
+        # El rechazo permanente de la dirección no se reintenta
+        self.assertEqual(list(pending.values_list('voucher_code', flat=True)), ['REM-2'])
+
+    def test_unexpected_error_releases_batch_and_raises(self):
+        ids = reminders.claim(TripSegment.objects.filter(id__in=[s.id for s in self.segments]))
+        with patch('travel.tasks.get_template', side_effect=RuntimeError('plantilla rota')):
+            with self.assertRaises(RuntimeError):
+                send_reminder_batch(ids)
+        self.assertEqual(reminders.pending_reminders().filter(id__in=ids).count(), 5)
+
+    @patch('travel.tasks.REMINDER_CHUNK_SIZE', 2)
+    def test_command_dispatches_chunks(self):
+        self.segments[4].status = 'cancelled'
+        self.segments[4].save()
+        out = StringIO()
+
+        with patch('travel.tasks.send_reminder_batch.run', wraps=send_reminder_batch.run) as run:
+            call_command('send_daily_reminders', stdout=out)
+
+        self.assertEqual([len(call.args[0]) for call in run.call_args_list], [2, 2])
+        self.assertIn('Programados 4 recordatorios en 2 lotes', out.getvalue())
+        self.assertEqual(len(mail.outbox), 3)
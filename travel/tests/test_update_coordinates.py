@@ -0,0 +1,105 @@
+# travel/tests/test_update_coordinates.py
+import threading
+from io import StringIO
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from unittest.mock import patch
+from googlemaps import exceptions as maps_errors
+from travel.models import Customer, Trip, Service, TripSegment, GeocodedAddress
+from travel.services.geocoding_cache import geocoding_cache
+from travel.management.commands import update_coordinates
+
+
+class StubGeocoder:
+    """Geocoder local: cuenta llamadas y simula un rate limit en la primera"""
+
+    def __init__(self, rate_limit_once=False):
+        self.calls = []
+        self.rate_limit_once = rate_limit_once
+        self._lock = threading.Lock()
+
+    def __call__(self, address):
+        with self._lock:
+            self.calls.append(address)
+            if self.rate_limit_once:
+                self.rate_limit_once = False
+                raise maps_errors._OverQueryLimit('OVER_QUERY_LIMIT')
+        if 'desconocida' in address.lower():
+            return None
+        return {'lat': -41.3, 'lng': -72.9, 'formatted_address': address, 'place_id': f'id-{address}'}
+
+
+class UpdateCoordinatesCommandTest(TestCase):
+    def setUp(self):
+        geocoding_cache.clear()
+        user = User.objects.create_user(username='coords_test')
+        self.trip = Trip.objects.create(
+            customer=Customer.objects.create(user=user),
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        self.service = Service.objects.create(name='Traslado', service_type='transfer')
+        locations = ['Hotel Cumbres', 'hotel cumbres ', 'HOTEL CUMBRES', 'Plaza de Armas', 'Calle desconocida']
+        for i, location in enumerate(locations):
+            TripSegment.objects.create(
+                trip=self.trip,
+                service=self.service,
+                scheduled_datetime=timezone.now(),
+                voucher_code=f'COORD-{i}',
+                pickup_location=location
+            )
+
+    def run_command(self, geocoder, *args):
+        out = StringIO()
+        with patch.object(update_coordinates.Command, 'get_geocoder', return_value=geocoder), \
+                patch.object(update_coordinates.RateLimiter, 'backoff'):
+            call_command('update_coordinates', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_dedupes_addresses_and_bulk_updates(self):
+        """Cada dirección única se geocodifica una sola vez"""
+        geocoder = StubGeocoder()
+        output = self.run_command(geocoder, '--workers', '3', '--batch-size', '2')
+
+        self.assertEqual(len(geocoder.calls), 3)
+        self.assertEqual(TripSegment.objects.filter(pickup_latitude__isnull=False).count(), 4)
+        self.assertEqual(GeocodedAddress.objects.count(), 3)
+        self.assertIn('Actualizados 4 segmentos', output)
+
+    def test_retries_after_rate_limit(self):
+        """Un rate limit se reintenta en lugar de perder la dirección"""
+        geocoder = StubGeocoder(rate_limit_once=True)
+        self.run_command(geocoder, '--workers', '1')
+
+        self.assertEqual(len(geocoder.calls), 4)
+        self.assertEqual(TripSegment.objects.filter(pickup_latitude__isnull=False).count(), 4)
+
+    def test_rate_limit_is_detected_by_exception_type(self):
+        """Solo cuota agotada o HTTP 429 activan el backoff, no un texto con "429" """
+        self.assertTrue(update_coordinates.is_rate_limited(maps_errors._OverQueryLimit('OVER_QUERY_LIMIT')))
+        self.assertTrue(update_coordinates.is_rate_limited(maps_errors.HTTPError(429)))
+        self.assertFalse(update_coordinates.is_rate_limited(maps_errors.HTTPError(500)))
+        self.assertFalse(update_coordinates.is_rate_limited(maps_errors.ApiError('INVALID_REQUEST', 'Calle 429')))
+        self.assertFalse(update_coordinates.is_rate_limited(Exception('Pasaje 429, rate limit')))
+
+    def test_dry_run_does_not_write(self):
+        """--dry-run no modifica segmentos ni cache"""
+        output = self.run_command(StubGeocoder(), '--dry-run')
+
+        self.assertFalse(TripSegment.objects.filter(pickup_latitude__isnull=False).exists())
+        self.assertFalse(GeocodedAddress.objects.exists())
+        self.assertIn('[dry-run]', output)
+
+    def test_second_run_uses_cache(self):
+        """Las direcciones ya resueltas no vuelven a la API"""
+        self.run_command(StubGeocoder())
+        TripSegment.objects.update(pickup_latitude=None, pickup_longitude=None)
+        geocoding_cache.clear()
+
+        geocoder = StubGeocoder()
+        self.run_command(geocoder)
+        self.assertEqual(geocoder.calls, [])
+        self.assertEqual(TripSegment.objects.filter(pickup_latitude__isnull=False).count(), 4)
@@ -2,10 +2,14 @@
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.db import connection
+from django.core.cache import cache
+from django.test.utils import CaptureQueriesContext
 from travel.models import Customer
 
 class ViewsTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(
             username='testuser',
@@ -26,4 +30,24 @@ class ViewsTest(TestCase):
     def test_magic_link_login(self):
         """Test simulación de magic link"""
         response = self.client.post(reverse('magic_link_login'))
-        self.assertEqual(response.status_code, 302)
\ No newline at end of file
+        self.assertEqual(response.status_code, 302)
+
+    def test_customer_is_cached_in_session(self):
+        """El customer se resuelve una vez por sesión y no en cada request"""
+        self.client.login(username='testuser', password='testpass123')
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.session['_customer_id'], self.customer.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        customer_queries = [q for q in queries if 'FROM "travel_customer"' in q['sql']]
+        self.assertLessEqual(len(customer_queries), 1)
+
+    def test_customer_created_on_first_request(self):
+        """Un usuario sin Customer obtiene uno automáticamente"""
+        User.objects.create_user(username='nuevo', password='testpass123')
+        self.client.login(username='nuevo', password='testpass123')
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Customer.objects.filter(user__username='nuevo').exists())
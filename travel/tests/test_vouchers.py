@@ -0,0 +1,212 @@
+# travel/tests/test_vouchers.py
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from unittest.mock import patch
+from travel.models import Customer, Trip, Service, TripSegment
+from travel.services import vouchers
+from travel.tasks import generate_voucher
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class VoucherTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='voucher_test',
+            password='testpass123',
+            first_name='Ana',
+            last_name='Silva'
+        )
+        self.customer = Customer.objects.create(user=self.user)
+        trip = Trip.objects.create(
+            customer=self.customer,
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        self.segment = TripSegment.objects.create(
+            trip=trip,
+            service=Service.objects.create(name='Traslado', service_type='transfer'),
+            scheduled_datetime=timezone.now(),
+            voucher_code='VOUCHER-001',
+            pickup_location='Hotel Cumbres'
+        )
+        self.url = reverse('download_voucher', args=[self.segment.id])
+        self.client.login(username='voucher_test', password='testpass123')
+
+    def test_payload_hash_is_stable(self):
+        """El mismo contenido produce siempre el mismo hash"""
+        first, data = vouchers.voucher_version(self.segment)
+        second, _ = vouchers.voucher_version(TripSegment.objects.get(pk=self.segment.pk))
+        self.assertEqual(first, second)
+        self.assertIn('"voucher_code":"VOUCHER-001"', data)
+
+    def test_download_serves_png_with_etag(self):
+        """El endpoint responde un PNG binario con ETag"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'\x89PNG'))
+
+        content_hash, _ = vouchers.voucher_version(self.segment)
+        self.assertEqual(response['ETag'], f'"{content_hash}"')
+        self.assertTrue(default_storage.exists(vouchers.voucher_path('VOUCHER-001', content_hash)))
+
+    def test_if_none_match_returns_304_without_rendering(self):
+        """Con el ETag vigente no se genera ni se lee la imagen"""
+        etag = self.client.get(self.url)['ETag']
+        with patch('travel.services.vouchers.generate_qr_png') as render:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+    def test_versioned_url_is_immutable(self):
+        """La URL con ?v=<hash> se cachea a largo plazo"""
+        content_hash, _ = vouchers.voucher_version(self.segment)
+        response = self.client.get(self.url, {'v': content_hash})
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('no-cache', self.client.get(self.url)['Cache-Control'])
+
+    def test_png_rendered_once_per_version(self):
+        """La tarea pre-genera el PNG y las descargas no lo vuelven a renderizar"""
+        generate_voucher(self.segment.id)
+        with patch('travel.services.vouchers.generate_qr_png') as render:
+            self.client.get(self.url)
+        render.assert_not_called()
+
+        # Un cambio de contenido crea una versión nueva y elimina la anterior
+        old_hash, _ = vouchers.voucher_version(self.segment)
+        self.segment.pickup_location = 'Aeropuerto El Tepual'
+        self.segment.save()
+        new_hash, _ = vouchers.voucher_version(self.segment)
+        self.client.get(self.url)
+        self.assertNotEqual(old_hash, new_hash)
+        self.assertFalse(default_storage.exists(vouchers.voucher_path('VOUCHER-001', old_hash)))
+        self.assertTrue(default_storage.exists(vouchers.voucher_path('VOUCHER-001', new_hash)))
+
+    def test_segment_creation_enqueues_generation(self):
+        """Crear un segmento encola la pre-generación al confirmar la transacción"""
+        with patch('travel.tasks.generate_voucher.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                segment = TripSegment.objects.create(
+                    trip=self.segment.trip,
+                    service=self.segment.service,
+                    scheduled_datetime=timezone.now(),
+                    voucher_code='VOUCHER-002'
+                )
+        delay.assert_called_once_with(segment.id)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, VOUCHER_RENDER_WORKERS=2)
+class TripVoucherExportTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='export_test', password='testpass123')
+        self.customer = Customer.objects.create(user=self.user)
+        self.trip = Trip.objects.create(
+            customer=self.customer,
+            destination='Puerto Varas',
+            start_date=timezone.localdate(),
+            end_date=timezone.localdate()
+        )
+        service = Service.objects.create(name='Excursión (día completo)', service_type='tour')
+        for i in range(7):
+            TripSegment.objects.create(
+                trip=self.trip,
+                service=service,
+                scheduled_datetime=timezone.now() + timezone.timedelta(hours=i),
+                voucher_code=f'EXPORT-{i:03d}',
+                pickup_location='Plaza de Armas'
+            )
+        self.url = reverse('export_trip_vouchers', args=[self.trip.id])
+        self.client.login(username='export_test', password='testpass123')
+
+    def test_zip_contains_every_voucher(self):
+        """El ZIP trae un PNG por segmento, en orden"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(names, [f'{i + 1:03d}-EXPORT-{i:03d}.png' for i in range(7)])
+        self.assertTrue(archive.read(names[0]).startswith(b'\x89PNG'))
+
+    def test_pdf_has_one_page_per_voucher(self):
+        """El PDF tiene una página por segmento y una tabla xref válida"""
+        response = self.client.get(self.url, {'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        pdf = b''.join(response.streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Count 7', pdf)
+        self.assertEqual(pdf.count(b'/Type /Page '), 7)
+
+        # Cada entrada de la xref apunta al inicio de su objeto
+        xref_offset = int(pdf.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+        entries = pdf[xref_offset:].split(b'\n')[3:3 + 22]
+        for number, entry in enumerate(entries, start=1):
+            offset = int(entry.split()[0])
+            self.assertTrue(pdf[offset:].startswith(b'%d 0 obj' % number))
+
+    def test_pdf_pages_follow_materialised_ids(self):
+        """Altas y bajas entre el cálculo de versión y la emisión no rompen el PDF"""
+        from travel.services import voucher_export
+
+        segments = self.trip.segments.select_related('service', 'trip__customer__user').order_by('scheduled_datetime', 'id')
+        _, segment_ids = voucher_export.export_version(segments, 'pdf')
+        TripSegment.objects.get(voucher_code='EXPORT-003').delete()
+        TripSegment.objects.create(
+            trip=self.trip, service=Service.objects.first(),
+            scheduled_datetime=timezone.now(), voucher_code='EXPORT-NEW'
+        )
+
+        pdf = b''.join(voucher_export.stream_pdf(segments, segment_ids))
+        self.assertIn(b'/Count 7', pdf)
+        self.assertEqual(pdf.count(b'/Type /Page '), 7)
+        xref_offset = int(pdf.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+        entries = pdf[xref_offset:].split(b'\n')[3:3 + 24]
+        self.assertEqual(len(entries), 24)
+        for number, entry in enumerate(entries, start=1):
+            offset = int(entry.split()[0])
+            self.assertTrue(pdf[offset:].startswith(b'%d 0 obj' % number))
+
+        names = zipfile.ZipFile(BytesIO(b''.join(voucher_export.stream_zip(segments, segment_ids)))).namelist()
+        self.assertEqual(len(names), 6)
+        self.assertNotIn('EXPORT-NEW', ''.join(names))
+
+    def test_unchanged_trip_is_cheap(self):
+        """Los QR ya generados se reutilizan y el ETag permite un 304"""
+        first = self.client.get(self.url)
+        b''.join(first.streaming_content)
+        etag = first['ETag']
+        with patch('travel.services.vouchers.generate_qr_png') as render:
+            b''.join(self.client.get(self.url).streaming_content)
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        render.assert_not_called()
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_customers_cannot_export(self):
+        """Solo el dueño del viaje (o staff) puede exportar"""
+        User.objects.create_user(username='otro', password='testpass123')
+        self.client.login(username='otro', password='testpass123')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
@@ -0,0 +1,166 @@
+# travel/tests/test_whatsapp_async.py
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from aiohttp import web
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from travel.models import Customer, Trip, Service, TripSegment
+from travel.services import whatsapp_async
+from travel.services.whatsapp_async import TokenBucket, broadcast, send_many
+
+
+class FakeTwilioServer:
+    """API de mensajes de Twilio mínima sobre aiohttp, en un hilo propio"""
+
+    def __init__(self, delay=0, throttled=0):
+        self.delay = delay
+        self.throttled = throttled
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create_message(self, request):
+        data = await request.post()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.throttled:
+            self.throttled -= 1
+            return web.json_response({'code': 20429, 'message': 'Too Many Requests', 'status': 429}, status=429)
+        self.requests.append(dict(data))
+        return web.json_response({
+            'sid': f'SM{len(self.requests):032d}',
+            'status': 'queued',
+            'to': data['To'],
+            'body': data['Body'],
+        }, status=201)
+
+    def __enter__(self):
+        app = web.Application()
+        app.router.add_post('/2010-04-01/Accounts/{sid}/Messages.json', self.create_message)
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.url = 'http://127.0.0.1:%d' % self.runner.addresses[0][1]
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+TWILIO_TEST_SETTINGS = {
+    'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+    'TWILIO_AUTH_TOKEN': 'token',
+    'TWILIO_WHATSAPP_FROM': 'whatsapp:+14155238886',
+}
+
+
+class AsyncWhatsAppSenderTest(TestCase):
+    def _send(self, server, count, **options):
+        with override_settings(TWILIO_API_BASE_URL=server.url, **TWILIO_TEST_SETTINGS):
+            return send_many([(f'9{index:08d}', f'Mensaje {index}') for index in range(count)], **options)
+
+    def test_messages_go_through_the_async_client(self):
+        with FakeTwilioServer() as server:
+            results = self._send(server, 5)
+
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertEqual(len(server.requests), 5)
+        self.assertEqual(server.requests[0]['From'], 'whatsapp:+14155238886')
+        self.assertEqual(server.requests[0]['To'], 'whatsapp:+56900000000')
+        self.assertEqual(results[0]['status'], 'queued')
+
+    def test_concurrency_is_bounded(self):
+        with FakeTwilioServer(delay=0.05) as server:
+            results = self._send(server, 12, rate=1000, concurrency=3)
+
+        self.assertEqual(len(results), 12)
+        self.assertEqual(server.max_in_flight, 3)
+
+    def test_rate_limit_per_sender(self):
+        started = time.monotonic()
+        with FakeTwilioServer() as server:
+            self._send(server, 6, rate=20, burst=1)
+        # Primer mensaje inmediato, los otros 5 a 1/20 s cada uno
+        self.assertGreaterEqual(time.monotonic() - started, 0.24)
+
+    def test_throttled_requests_are_retried(self):
+        with FakeTwilioServer(throttled=1) as server:
+            results = self._send(server, 1)
+        self.assertTrue(results[0]['success'])
+        self.assertEqual(len(server.requests), 1)
+
+    def test_without_credentials_nothing_is_sent(self):
+        with override_settings(TWILIO_ACCOUNT_SID='', TWILIO_AUTH_TOKEN=''):
+            results = send_many([('912345678', 'Hola')])
+        self.assertEqual(results, [{'success': False, 'error': 'Service not configured'}])
+
+    def test_token_bucket_allows_burst_then_paces(self):
+        async def acquire_all():
+            bucket = TokenBucket(rate=50, capacity=3)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            for _ in range(3):
+                await bucket.acquire()
+            burst = loop.time() - started
+            for _ in range(2):
+                await bucket.acquire()
+            return burst, loop.time() - started
+
+        burst, total = asyncio.run(acquire_all())
+        self.assertLess(burst, 0.02)
+        self.assertGreaterEqual(total, 0.035)
+
+
+class WhatsAppBroadcastTest(TestCase):
+    def setUp(self):
+        service = Service.objects.create(name='Bus Santiago - Valparaíso', service_type='transfer')
+        departure = timezone.now() + timedelta(hours=2)
+        self.segment_ids = []
+        for index, (phone, opted_in) in enumerate([('912345678', True), ('987654321', True), ('', True), ('955555555', False)]):
+            user = User.objects.create_user(username=f'pasajero{index}', first_name=f'Pasajero{index}')
+            trip = Trip.objects.create(
+                customer=Customer.objects.create(user=user, phone=phone, whatsapp_notifications=opted_in),
+                destination='Valparaíso',
+                start_date=timezone.localdate(),
+                end_date=timezone.localdate()
+            )
+            segment = TripSegment.objects.create(
+                trip=trip, service=service, scheduled_datetime=departure, voucher_code=f'BUS-{index}'
+            )
+            self.segment_ids.append(segment.id)
+
+    def test_broadcast_notifies_opted_in_passengers(self):
+        with FakeTwilioServer() as server:
+            with override_settings(TWILIO_API_BASE_URL=server.url, **TWILIO_TEST_SETTINGS):
+                result = broadcast(self.segment_ids, 'departure_delay')
+
+        self.assertEqual(result, {'sent': 2, 'failed': 0, 'skipped': 2})
+        self.assertEqual(
+            sorted(request['To'] for request in server.requests),
+            ['whatsapp:+56912345678', 'whatsapp:+56987654321']
+        )
+        self.assertIn('Bus Santiago - Valparaíso', server.requests[0]['Body'])
+        self.assertIn('retraso', server.requests[0]['Body'])
+
+    def test_unknown_template_fails_before_sending(self):
+        with self.assertRaises(ValueError):
+            broadcast(self.segment_ids, 'no_existe')
+
+    def test_failed_sends_are_counted(self):
+        with override_settings(TWILIO_API_BASE_URL='http://127.0.0.1:9', **TWILIO_TEST_SETTINGS):
+            result = broadcast(self.segment_ids, 'departure_delay')
+        self.assertEqual(result, {'sent': 0, 'failed': 2, 'skipped': 2})
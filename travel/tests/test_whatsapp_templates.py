@@ -0,0 +1,87 @@
+# travel/tests/test_whatsapp_templates.py
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from travel.models import Customer, Trip, Service, TripSegment, OutboundMessage
+from travel.services.whatsapp import WhatsAppService
+from travel.services.whatsapp_templates import (
+    TemplateRegistry, TemplateError, TemplateNotFound, WhatsAppTemplate, registry
+)
+
+REMINDER = {
+    'name': 'Ana',
+    'service_name': 'Tour Isla Negra',
+    'datetime': '12/01/2026 09:00',
+    'location': 'Hotel Cumbres',
+    'voucher_code': 'ISN-7'
+}
+
+
+class WhatsAppTemplateRegistryTest(TestCase):
+    def test_declared_variables_are_validated_at_registration(self):
+        with self.assertRaises(TemplateError):
+            WhatsAppTemplate('saludo', 'Hola {name}, tu código es {code}', ['name'], 'es')
+        with self.assertRaises(TemplateError):
+            WhatsAppTemplate('saludo', 'Hola {name}', ['name', 'code'], 'es')
+        with self.assertRaises(TemplateError):
+            WhatsAppTemplate('saludo', 'Total {amount:.2f}', ['amount'], 'es')
+
+    def test_precompiled_render_matches_format(self):
+        text = 'Hola {name}! {{literal}} {name} en {place}'
+        template = WhatsAppTemplate('saludo', text, ['name', 'place'], 'es')
+        values = {'name': 'Ana', 'place': 42, 'extra': 'ignorado'}
+        self.assertEqual(template.render(values), text.format(**values))
+
+    def test_missing_variable_is_reported_not_raised_on_send(self):
+        with self.assertRaisesMessage(TemplateError, 'location, voucher_code'):
+            registry.render('itinerary_reminder', {'name': 'Ana', 'service_name': 'x', 'datetime': 'y'})
+
+        with patch.object(WhatsAppService, 'send_message') as send_message:
+            result = WhatsAppService().send_template_message('912345678', 'itinerary_reminder', {'name': 'Ana'})
+        send_message.assert_not_called()
+        self.assertFalse(result['success'])
+        self.assertIn('faltan variables', result['error'])
+
+    def test_language_variants_fall_back_to_default(self):
+        self.assertIn('Reminder', registry.render('itinerary_reminder', REMINDER, 'en-us'))
+        self.assertIn('Recordatorio', registry.render('itinerary_reminder', REMINDER, 'pt'))
+        self.assertIn('Recordatorio', registry.render('itinerary_reminder', REMINDER))
+        with self.assertRaises(TemplateNotFound):
+            registry.get('no_existe', 'en')
+
+    def test_render_many_looks_up_the_template_once(self):
+        local = TemplateRegistry()
+        local.register('aviso', 'Hola {name}', ['name'], language='es')
+        rows = [{'name': f'Pasajero {index}'} for index in range(500)]
+
+        with patch.object(local, 'get', wraps=local.get) as get:
+            bodies = local.render_many('aviso', rows)
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(bodies[0], 'Hola Pasajero 0')
+        self.assertEqual(bodies[-1], 'Hola Pasajero 499')
+
+
+class WhatsAppTemplateLanguageViewTest(TestCase):
+    def test_reminder_uses_request_language(self):
+        user = User.objects.create_user(username='tourist', password='test123', first_name='Jane')
+        customer = Customer.objects.create(user=user, phone='912345678')
+        trip = Trip.objects.create(
+            customer=customer, destination='Valparaíso',
+            start_date=timezone.localdate(), end_date=timezone.localdate()
+        )
+        segment = TripSegment.objects.create(
+            trip=trip, service=Service.objects.create(name='Cerro Alegre Walk', service_type='tour'),
+            scheduled_datetime=timezone.now() + timedelta(days=1), voucher_code='VAL-1'
+        )
+        self.client.login(username='tourist', password='test123')
+
+        response = self.client.post(
+            reverse('send_whatsapp_reminder', args=[segment.id]), HTTP_ACCEPT_LANGUAGE='en'
+        )
+        self.assertEqual(response.status_code, 202)
+        body = OutboundMessage.objects.get().body
+        self.assertIn('Your activity tomorrow', body)
+        self.assertIn('Cerro Alegre Walk', body)
@@ -1,6 +1,6 @@
 # travel/urls.py (actualizado)
 from django.urls import path
-from . import views, api
+from . import views, api, streams
 from django.contrib.auth import views as auth_views
 
 urlpatterns = [
@@ -19,9 +19,13 @@ urlpatterns = [
     path('api/incident/<int:segment_id>/', views.report_incident, name='report_incident'),
     path('api/segment/<int:segment_id>/status/', views.update_segment_status, name='update_segment_status'),
     path('api/segment/<int:segment_id>/status-info/', api.get_segment_status, name='get_segment_status'),
+    path('api/stream/trip/<int:trip_id>/', streams.trip_status_stream, name='trip_status_stream'),
+    path('api/stream/operations/', streams.operations_status_stream, name='operations_status_stream'),
     path('api/voucher/<int:segment_id>/download/', views.download_voucher, name='download_voucher'),
-    path('api/directions/<int:segment_id>/', views.get_directions, name='get_directions'),
+    path('api/trip/<int:trip_id>/vouchers/', views.export_trip_vouchers, name='export_trip_vouchers'),
     path('api/emergency/', api.emergency_contact, name='emergency_contact'),
+    path('api/notifications/', api.notifications_feed, name='notifications_feed'),
+    path('api/notifications/poll/', api.notifications_poll, name='notifications_poll'),
     # Incidencias - Cliente
     path('api/incident/<int:segment_id>/', views.report_incident, name='report_incident'),
     path('my-incidents/', views.incident_list, name='incident_list'),
@@ -30,6 +34,8 @@ urlpatterns = [
     # Incidencias - Staff
     path('staff/incidents/', views.staff_incidents_dashboard, name='staff_incidents_dashboard'),
     path('staff/incident/<int:incident_id>/', views.staff_incident_detail, name='staff_incident_detail'),
+    path('staff/export/<str:model_name>/', views.staff_export, name='staff_export'),
+    path('staff/export/download/<str:token>/', views.staff_export_download, name='staff_export_download'),
     
     # Incidencias
     path('my-incidents/', views.incident_list, name='incident_list'),
@@ -39,7 +45,9 @@ urlpatterns = [
     path('api/directions/<int:segment_id>/', views.get_directions_api, name='get_directions_api'),
     path('api/nearby-places/', views.nearby_recommendations, name='nearby_recommendations'),
     path('api/whatsapp-reminder/<int:segment_id>/', views.send_whatsapp_reminder, name='send_whatsapp_reminder'),
-    path('api/emergency/', views.emergency_whatsapp_contact, name='emergency_whatsapp_contact'),
+    path('api/emergency/whatsapp/', views.emergency_whatsapp_contact, name='emergency_whatsapp_contact'),
+    path('api/messages/<int:message_id>/', api.delivery_status, name='delivery_status'),
+    path('api/staff/queue-metrics/', api.queue_metrics, name='queue_metrics'),
     path('api/incident/<int:segment_id>/', views.report_incident, name='report_incident'),
     path('api/voucher/<int:segment_id>/download/', views.download_voucher, name='download_voucher'),
     
@@ -3,9 +3,11 @@ import qrcode
 from io import BytesIO
 from django.core.files.base import ContentFile
 import base64
+from datetime import datetime, time, timedelta
+from django.utils import timezone
 
-def generate_qr_code(data):
-    """Generar código QR para voucher"""
+def generate_qr_png(data):
+    """Generar código QR como bytes PNG"""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -17,10 +19,14 @@ def generate_qr_code(data):
     
     img = qr.make_image(fill_color="black", back_color="white")
     
-    # Convertir a base64 para mostrar en template
     buffer = BytesIO()
     img.save(buffer, format='PNG')
-    img_str = base64.b64encode(buffer.getvalue()).decode()
+    return buffer.getvalue()
+
+def generate_qr_code(data):
+    """Generar código QR para voucher"""
+    # Convertir a base64 para mostrar en template
+    img_str = base64.b64encode(generate_qr_png(data)).decode()
     
     return f"data:image/png;base64,{img_str}"
 
@@ -28,4 +34,15 @@ def format_voucher_code(trip_id, segment_id):
     """Generar código de voucher único"""
     from datetime import date
     today = date.today()
-    return f"AT-{trip_id:02d}-{today.strftime('%y%m%d')}-{segment_id:03d}"
\ No newline at end of file
+    return f"AT-{trip_id:02d}-{today.strftime('%y%m%d')}-{segment_id:03d}"
+
+def day_range(day=None):
+    """Rango semiabierto [inicio, fin) de un día en la zona horaria actual.
+
+    Filtrar con ``scheduled_datetime__gte``/``__lt`` permite usar los índices
+    sobre la columna, a diferencia de ``scheduled_datetime__date``.
+    """
+    day = day or timezone.localdate()
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
@@ -1,24 +1,33 @@
 # travel/views.py
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
-from django.contrib import messages
+from django.contrib import messages, admin
+from django.contrib.admin.options import IncorrectLookupParameters
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.core.files.storage import default_storage
 from django.views.decorators.csrf import csrf_exempt
-from datetime import date, timedelta
+from datetime import timedelta
 from .models import Customer, Trip, TripSegment, Incident, Notification
 from .forms import MagicLinkForm, OTPForm, IncidentReportForm, IncidentResolutionForm, CustomerSatisfactionForm
-from .utils import generate_qr_code
+from .utils import day_range
+from .notifications import queue_notification, mark_notifications_read, notification_page, encode_cursor
 from django.template.loader import get_template
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Q
 from .services.google_maps import GoogleMapsService
 from .services.whatsapp import WhatsAppService
+from .services import directions_cache, places_cache, vouchers, voucher_export, report_export
+from .dashboard import operations_board, OPERATIONS_BOARD_TTL
+from . import incident_stats, outbound
+from django.utils.functional import SimpleLazyObject
 import json
 from django.conf import settings
-from . import models
 from django.contrib.auth import logout
 
 try:
@@ -72,40 +81,83 @@ def magic_link_login(request):
 
 @login_required
 def download_voucher(request, segment_id):
-    """Descargar voucher como imagen QR"""
-    customer = get_object_or_404(Customer, user=request.user)
-    segment = get_object_or_404(TripSegment, id=segment_id, trip__customer=customer)
+    """Descargar voucher como imagen QR (PNG pre-generado en el storage)"""
+    segment = get_object_or_404(
+        TripSegment.objects.select_related('service', 'trip__customer__user'),
+        id=segment_id, trip__customer=request.customer
+    )
     
-    # Datos para el QR
-    qr_data = {
-        'voucher_code': segment.voucher_code,
-        'service': segment.service.name,
-        'date': segment.scheduled_datetime.strftime('%Y-%m-%d %H:%M'),
-        'customer': customer.user.get_full_name(),
-        'location': segment.pickup_location
-    }
+    # El hash del contenido sirve de ETag: si el cliente ya tiene esta versión
+    # se responde 304 sin tocar el storage
+    content_hash, _ = vouchers.voucher_version(segment)
+    etag = f'"{content_hash}"'
+    response = get_conditional_response(request, etag=etag)
+    
+    if response is None:
+        path, _ = vouchers.ensure_voucher(segment)
+        response = FileResponse(
+            default_storage.open(path, 'rb'),
+            content_type='image/png',
+            filename=f'voucher-{segment.voucher_code}.png'
+        )
     
-    qr_image = generate_qr_code(str(qr_data))
+    response['ETag'] = etag
+    if request.GET.get('v') == content_hash:
+        # URL versionada: el contenido de esa URL no cambia nunca
+        patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+def export_trip_vouchers(request, trip_id):
+    """Exportar todos los vouchers de un viaje como ZIP de PNG o PDF multipágina"""
+    export_format = request.GET.get('format', 'zip')
+    if export_format not in ('zip', 'pdf'):
+        return JsonResponse({'error': 'Formato no soportado (zip o pdf)'}, status=400)
+    
+    trips = Trip.objects.all() if request.user.is_staff else Trip.objects.filter(customer=request.customer)
+    trip = get_object_or_404(trips, id=trip_id)
+    segments = trip.segments.select_related('service', 'trip__customer__user').order_by('scheduled_datetime', 'id')
+    
+    export_hash, segment_ids = voucher_export.export_version(segments, export_format)
+    if not segment_ids:
+        return JsonResponse({'error': 'El viaje no tiene servicios'}, status=404)
+    
+    etag = f'"{export_hash}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if export_format == 'pdf':
+            response = StreamingHttpResponse(voucher_export.stream_pdf(segments, segment_ids), content_type='application/pdf')
+        else:
+            response = StreamingHttpResponse(voucher_export.stream_zip(segments, segment_ids), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="vouchers-viaje-{trip.id}.{export_format}"'
     
-    # En un entorno real, aquí generarías un PDF o imagen
-    # Por ahora retornamos los datos del QR
-    return JsonResponse({
-        'voucher_code': segment.voucher_code,
-        'qr_image': qr_image,
-        'service': segment.service.name
-    })
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required 
 def notifications_list(request):
     """Lista de notificaciones del usuario"""
-    customer = get_object_or_404(Customer, user=request.user)
-    notifications = customer.notifications.all()[:10]
+    customer = request.customer
+    cursor = request.GET.get('cursor')
+    try:
+        notifications, next_cursor = notification_page(customer.pk, cursor)
+    except ValueError:
+        return redirect('notifications')
     
-    # Marcar como leídas
-    customer.notifications.filter(read=False).update(read=True)
+    # Marcar como leídas solo las de esta página (las que el usuario ve)
+    unread_ids = [n.id for n in notifications if not n.read]
+    if unread_ids:
+        mark_notifications_read(customer.pk, unread_ids)
     
     context = {
-        'notifications': notifications
+        'notifications': notifications,
+        'next_cursor': next_cursor,
+        # Solo la primera página recibe notificaciones nuevas por long-poll
+        'poll_cursor': encode_cursor(notifications[0]) if notifications and not cursor else '',
+        'is_first_page': not cursor,
     }
     return render(request, 'travel/notifications.html', context)
 
@@ -113,7 +165,7 @@ def notifications_list(request):
 @login_required
 def get_directions(request, segment_id):
     """Obtener direcciones para llegar al punto de encuentro"""
-    customer = get_object_or_404(Customer, user=request.user)
+    customer = request.customer
     segment = get_object_or_404(TripSegment, id=segment_id, trip__customer=customer)
     
     # En un entorno real, aquí integrarías con Google Maps API
@@ -144,31 +196,15 @@ def landing_page(request):
 @login_required
 def home(request):
     """Página principal con itinerario del día"""
-    try:
-        customer = request.user.customer
-    except Customer.DoesNotExist:
-        # Si por alguna razón no existe customer, crearlo
-        customer = Customer.objects.create(
-            user=request.user,
-            phone='',
-            emergency_contact=''
-        )
+    customer = request.customer
     
-    today = date.today()
+    today = timezone.localdate()
+    today_start, today_end = day_range(today)
     
-    # Buscar viaje activo
-    active_trip = Trip.objects.filter(
-        customer=customer,
-        start_date__lte=today,
-        end_date__gte=today
-    ).first()
+    snapshot = request.customer_snapshot
     
-    if not active_trip:
-        # Buscar próximo viaje
-        active_trip = Trip.objects.filter(
-            customer=customer,
-            start_date__gt=today
-        ).first()
+    # Viaje activo o, si no hay, el próximo viaje
+    active_trip = snapshot.active_trip or snapshot.next_trip
     
     today_segments = []
     upcoming_segments = []
@@ -177,28 +213,23 @@ def home(request):
         # Segmentos de hoy
         today_segments = TripSegment.objects.filter(
             trip=active_trip,
-            scheduled_datetime__date=today
+            scheduled_datetime__gte=today_start,
+            scheduled_datetime__lt=today_end
         ).order_by('scheduled_datetime')
         
         # Próximos segmentos (siguientes 3 días)
         upcoming_segments = TripSegment.objects.filter(
             trip=active_trip,
-            scheduled_datetime__date__gt=today,
-            scheduled_datetime__date__lte=today + timedelta(days=3)
+            scheduled_datetime__gte=today_end,
+            scheduled_datetime__lt=day_range(today + timedelta(days=3))[1]
         ).order_by('scheduled_datetime')[:3]
     
-    # Notificaciones no leídas
-    try:
-        unread_notifications = customer.notifications.filter(read=False).count()
-    except:
-        unread_notifications = 0
-    
     context = {
         'customer': customer,
         'active_trip': active_trip,
         'today_segments': today_segments,
         'upcoming_segments': upcoming_segments,
-        'unread_notifications': unread_notifications,
+        'unread_notifications': snapshot.unread_notifications,
         'today': today,
         'current_language': request.LANGUAGE_CODE,
     }
@@ -207,13 +238,18 @@ def home(request):
 @login_required
 def segment_detail(request, segment_id):
     """Detalle de un segmento del viaje"""
-    customer = get_object_or_404(Customer, user=request.user)
-    segment = get_object_or_404(TripSegment, id=segment_id, trip__customer=customer)
+    customer = request.customer
+    segment = get_object_or_404(
+        TripSegment.objects.select_related('service', 'trip__customer__user'),
+        id=segment_id, trip__customer=customer
+    )
+    voucher_hash, _ = vouchers.voucher_version(segment)
     
     context = {
         'segment': segment,
+        'voucher_hash': voucher_hash,
         'incident_form': IncidentReportForm(),
-        'customer': request.user.customer,
+        'customer': customer,
     }
     return render(request, 'travel/segment_detail.html', context)
 
@@ -224,47 +260,14 @@ def operations_dashboard(request):
         messages.error(request, 'No tienes permisos para acceder a esta sección')
         return redirect('home')
     
-    today = date.today()
-    
-    # Arribos de hoy
-    arrivals_today = TripSegment.objects.filter(
-        scheduled_datetime__date=today,
-        service__service_type='flight'
-    ).select_related('trip__customer__user', 'service')
-    
-    # Servicios en curso
-    in_progress = TripSegment.objects.filter(
-        scheduled_datetime__date=today,
-        status='en_route'
-    ).select_related('trip__customer__user', 'service')
-    
-    # Incidencias activas
-    active_incidents = Incident.objects.filter(
-        resolved_at__isnull=True,
-        segment__scheduled_datetime__date=today
-    ).select_related('segment__trip__customer__user', 'segment__service')
-    
-    # Métricas del día
-    total_arrivals = TripSegment.objects.filter(
-        scheduled_datetime__date=today,
-        service__service_type='flight'
-    ).count()
-    
-    confirmed_arrivals = arrivals_today.filter(status='confirmed').count()
-    pending_arrivals = arrivals_today.filter(status='pending').count()
-    incidents_count = active_incidents.count()
+    today = timezone.localdate()
     
+    # Las consultas solo corren si el fragmento del tablero no está en cache
     context = {
-        'arrivals_today': arrivals_today,
-        'in_progress': in_progress,
-        'active_incidents': active_incidents,
         'today': today,
-        'metrics': {
-            'total_arrivals': total_arrivals,
-            'confirmed_arrivals': confirmed_arrivals,
-            'pending_arrivals': pending_arrivals,
-            'incidents_count': incidents_count,
-        }
+        'today_key': today.isoformat(),
+        'board': SimpleLazyObject(lambda: operations_board(today)),
+        'board_ttl': OPERATIONS_BOARD_TTL,
     }
     return render(request, 'travel/operations.html', context)
 
@@ -272,22 +275,17 @@ def operations_dashboard(request):
 @login_required
 def report_incident(request, segment_id):
     """Reportar incidencia para un segmento"""
-    customer = get_object_or_404(Customer, user=request.user)
+    customer = request.customer
     segment = get_object_or_404(TripSegment, id=segment_id, trip__customer=customer)
     
     if request.method == 'POST':
         form = IncidentReportForm(request.POST)
         if form.is_valid():
-            incident = form.save(commit=False)
-            incident.segment = segment
-            incident.save()
-            
-            # Crear notificación para el cliente
-            Notification.objects.create(
-                customer=customer,
-                title="Incidencia reportada",
-                message=f"Hemos recibido tu reporte: '{incident.title}'. Código de seguimiento: #{incident.id}"
-            )
+            # La notificación al cliente la encola el signal post_save de Incident
+            with transaction.atomic():
+                incident = form.save(commit=False)
+                incident.segment = segment
+                incident.save()
             
             messages.success(request, f'Incidencia reportada correctamente. Código de seguimiento: #{incident.id}')
             
@@ -325,12 +323,12 @@ def update_segment_status(request, segment_id):
 @login_required
 def incident_list(request):
     """Lista de incidencias del usuario"""
-    customer = get_object_or_404(Customer, user=request.user)
+    customer = request.customer
     
     # Filtrar incidencias del cliente
     incidents = Incident.objects.filter(
         segment__trip__customer=customer
-    ).select_related('segment__service', 'assigned_to')
+    ).with_sla().select_related('segment__service', 'assigned_to')
     
     # Filtros
     status_filter = request.GET.get('status')
@@ -358,7 +356,7 @@ def incident_list(request):
 @login_required
 def incident_detail(request, incident_id):
     """Detalle de una incidencia específica"""
-    customer = get_object_or_404(Customer, user=request.user)
+    customer = request.customer
     incident = get_object_or_404(
         Incident, 
         id=incident_id, 
@@ -390,37 +388,15 @@ def staff_incidents_dashboard(request):
         messages.error(request, 'No tienes permisos para acceder a esta sección')
         return redirect('home')
     
-    # Estadísticas generales
-    today = timezone.now().date()
-    
-    stats = {
-        'total_open': Incident.objects.filter(status='open').count(),
-        'total_in_progress': Incident.objects.filter(status='in_progress').count(),
-        'overdue': Incident.objects.filter(
-            status__in=['open', 'in_progress']
-        ).count(),  # Simplificado - implementar is_overdue en queryset después
-        'resolved_today': Incident.objects.filter(
-            resolved_at__date=today
-        ).count(),
-        'avg_satisfaction': Incident.objects.filter(
-            customer_satisfaction__isnull=False
-        ).aggregate(
-            avg=models.Avg('customer_satisfaction')
-        )['avg'] or 0
-    }
-    
-    # Incidencias por categoría (últimos 7 días)
-    week_ago = today - timedelta(days=7)
-    category_stats = Incident.objects.filter(
-        reported_at__date__gte=week_ago
-    ).values('category').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    # Estadísticas desde los rollups (filas pre-agregadas, no la tabla completa);
+    # las vencidas dependen de la hora actual y salen del índice parcial de abiertas
+    now = timezone.now()
+    rollup = incident_stats.dashboard_stats(timezone.localdate(now))
+    category_stats = rollup.pop('category_stats')
+    stats = {**rollup, 'overdue': Incident.objects.overdue(now).count()}
     
     # Incidencias recientes
-    recent_incidents = Incident.objects.filter(
-        status__in=['open', 'in_progress']
-    ).select_related(
+    recent_incidents = Incident.objects.open().with_sla(now).select_related(
         'segment__trip__customer__user', 'segment__service', 'assigned_to'
     ).order_by('-reported_at')[:10]
     
@@ -431,6 +407,62 @@ def staff_incidents_dashboard(request):
     }
     return render(request, 'travel/staff_incidents_dashboard.html', context)
 
+@login_required
+def staff_export(request, model_name):
+    """Exportar incidencias o segmentos (CSV/XLSX) con los mismos filtros del admin"""
+    if not request.user.is_staff:
+        messages.error(request, 'No tienes permisos')
+        return redirect('home')
+    
+    if model_name not in report_export.EXPORTS:
+        return JsonResponse({'error': 'Exporte no encontrado'}, status=404)
+    
+    model, columns, filename = report_export.EXPORTS[model_name]
+    if not admin.site.get_model_admin(model).has_view_permission(request):
+        return JsonResponse({'error': 'No tienes permisos'}, status=403)
+    
+    request.GET = request.GET.copy()
+    export_format = request.GET.pop('format', ['csv'])[-1]
+    if export_format not in ('csv', 'xlsx'):
+        return JsonResponse({'error': 'Formato no soportado (csv o xlsx)'}, status=400)
+    
+    # El changelist del admin interpreta los parámetros restantes: list_filter,
+    # búsqueda (q), jerarquía de fechas y orden, igual que en /admin/
+    try:
+        queryset = report_export.changelist_queryset(request, model)
+    except IncorrectLookupParameters:
+        return JsonResponse({'error': 'Filtros inválidos'}, status=400)
+    
+    if export_format == 'xlsx':
+        # El libro se arma en Celery; el request solo entrega el link
+        token = report_export.start_xlsx_export(request.user, model_name, dict(request.GET.lists()))
+        return JsonResponse({
+            'status': 'pending',
+            'download_url': reverse('staff_export_download', args=[token]),
+        }, status=202)
+    
+    return report_export.csv_response(request, queryset, columns, filename)
+
+@login_required
+def staff_export_download(request, token):
+    """Descargar un exporte XLSX generado en segundo plano (202 mientras se genera)"""
+    if not request.user.is_staff:
+        messages.error(request, 'No tienes permisos')
+        return redirect('home')
+    
+    job = report_export.export_job(token, request.user)
+    if job is None:
+        return JsonResponse({'error': 'Exporte no encontrado o vencido'}, status=404)
+    if job['status'] == 'pending':
+        return JsonResponse({'status': 'pending'}, status=202)
+    if job['status'] == 'failed':
+        return JsonResponse({'status': 'failed', 'error': job.get('error', '')}, status=500)
+    
+    return FileResponse(
+        default_storage.open(job['path'], 'rb'), as_attachment=True,
+        filename=job['filename'], content_type=report_export.XLSX_CONTENT_TYPE
+    )
+
 @login_required
 def staff_incident_detail(request, incident_id):
     """Detalle y resolución de incidencia para staff"""
@@ -449,14 +481,16 @@ def staff_incident_detail(request, incident_id):
             if incident.status in ['resolved', 'closed'] and not incident.resolved_at:
                 incident.resolved_at = timezone.now()
             
-            incident.save()
-            
-            # Notificar al cliente
-            Notification.objects.create(
-                customer=incident.segment.trip.customer,
-                title=f"Actualización de incidencia #{incident.id}",
-                message=f"Tu incidencia '{incident.title}' ha sido actualizada: {incident.get_status_display()}"
-            )
+            with transaction.atomic():
+                incident.save()
+                
+                # Notificar al cliente (se une con la del cambio de estado, si la hay)
+                queue_notification(
+                    incident.segment.trip.customer_id,
+                    f"Actualización de incidencia #{incident.id}",
+                    f"Tu incidencia '{incident.title}' ha sido actualizada: {incident.get_status_display()}",
+                    dedupe_key=f'incident:{incident.pk}:update'
+                )
             
             messages.success(request, 'Incidencia actualizada correctamente')
             return redirect('staff_incident_detail', incident_id=incident_id)
@@ -473,7 +507,7 @@ def staff_incident_detail(request, incident_id):
 @login_required
 def get_directions_api(request, segment_id):
     """API mejorada para obtener direcciones con Google Maps"""
-    customer = get_object_or_404(Customer, user=request.user)
+    customer = request.customer
     segment = get_object_or_404(TripSegment, id=segment_id, trip__customer=customer)
     
     # Obtener ubicación actual del usuario (si se proporciona)
@@ -488,11 +522,25 @@ def get_directions_api(request, segment_id):
     
     # Usar ubicación actual o ubicación por defecto
     origin = current_location or f"{settings.DEFAULT_LOCATION['lat']},{settings.DEFAULT_LOCATION['lng']}"
-    
-    # Obtener direcciones
-    directions = maps_service.get_directions(origin, destination)
+    mode = request.GET.get('mode', 'driving')
+    if mode not in ('driving', 'walking', 'transit', 'bicycling'):
+        mode = 'driving'
+    
+    # Coordenadas del destino (cacheadas); el place_id identifica el destino en el cache de rutas
+    coordinates = maps_service.geocode_address(destination)
+    
+    # Obtener direcciones (cache por celda de origen + destino + modo)
+    directions, cache_info = directions_cache.get_directions(
+        maps_service,
+        origin,
+        destination,
+        mode=mode,
+        destination_key=coordinates['place_id'] if coordinates else None,
+        segment_id=segment.id
+    )
     
     if directions:
+        directions = dict(directions)
         # Agregar información adicional
         directions.update({
             'segment_info': {
@@ -503,14 +551,17 @@ def get_directions_api(request, segment_id):
             'destination_info': {
                 'name': segment.service.name,
                 'address': destination,
-                'coordinates': maps_service.geocode_address(destination)
+                'coordinates': coordinates
             }
         })
         
-        return JsonResponse({
+        response = JsonResponse({
             'success': True,
-            'directions': directions
+            'directions': directions,
+            'cache': cache_info
         })
+        response['Cache-Control'] = f'private, max-age={max(directions_cache.DIRECTIONS_MAX_AGE - cache_info["age"], 0)}'
+        return response
     else:
         return JsonResponse({
             'success': False,
@@ -520,9 +571,11 @@ def get_directions_api(request, segment_id):
 @csrf_exempt
 @login_required
 def send_whatsapp_reminder(request, segment_id):
-    """Enviar recordatorio por WhatsApp"""
-    customer = get_object_or_404(Customer, user=request.user)
-    segment = get_object_or_404(TripSegment, id=segment_id, trip__customer=customer)
+    """Encolar recordatorio por WhatsApp (202; el estado se consulta en status_url)"""
+    customer = request.customer
+    segment = get_object_or_404(
+        TripSegment.objects.select_related('service'), id=segment_id, trip__customer=customer
+    )
     
     if not customer.phone:
         return JsonResponse({
@@ -539,30 +592,25 @@ def send_whatsapp_reminder(request, segment_id):
         'voucher_code': segment.voucher_code
     }
     
-    # Enviar mensaje
-    result = whatsapp_service.send_template_message(
-        customer.phone, 
-        'itinerary_reminder', 
-        variables
+    # La llamada a Twilio ocurre en la cola de mensajería, no en este request
+    message = outbound.queue_whatsapp(
+        customer,
+        customer.phone,
+        whatsapp_service.render_template('itinerary_reminder', variables, request.LANGUAGE_CODE),
+        'itinerary_reminder'
     )
     
-    if result['success']:
-        # Crear notificación
-        Notification.objects.create(
-            customer=customer,
-            title="Recordatorio enviado por WhatsApp",
-            message=f"Se envió recordatorio de {segment.service.name} a tu WhatsApp"
-        )
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Recordatorio enviado por WhatsApp'
-        })
-    else:
-        return JsonResponse({
-            'success': False,
-            'error': result['error']
-        })
+    queue_notification(
+        customer.pk,
+        "Recordatorio por WhatsApp en camino",
+        f"Estamos enviando el recordatorio de {segment.service.name} a tu WhatsApp"
+    )
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Recordatorio en camino por WhatsApp',
+        'delivery': outbound.delivery_info(message)
+    }, status=202)
 
 @login_required
 def nearby_recommendations(request):
@@ -578,8 +626,13 @@ def nearby_recommendations(request):
         lat = settings.DEFAULT_LOCATION['lat']
         lng = settings.DEFAULT_LOCATION['lng']
     
-    # Obtener lugares cercanos
-    places = maps_service.find_nearby_places(lat, lng, place_type)
+    try:
+        radius = min(max(int(request.GET.get('radius', 1500)), 100), 20000)
+    except (ValueError, TypeError):
+        radius = 1500
+    
+    # Obtener lugares cercanos (tiles geohash cacheados)
+    places = places_cache.nearby_places(maps_service, lat, lng, place_type, radius)
     
     return JsonResponse({
         'success': True,
@@ -590,9 +643,9 @@ def nearby_recommendations(request):
 @csrf_exempt
 @login_required  
 def emergency_whatsapp_contact(request):
-    """Contacto de emergencia vía WhatsApp"""
+    """Contacto de emergencia vía WhatsApp (cola de emergencias, responde 202)"""
     if request.method == 'POST':
-        customer = get_object_or_404(Customer, user=request.user)
+        customer = request.customer
         
         if not customer.phone:
             return JsonResponse({
@@ -614,14 +667,7 @@ def emergency_whatsapp_contact(request):
             'details': details
         }
         
-        # Enviar mensaje de emergencia
-        result = whatsapp_service.send_template_message(
-            customer.phone,
-            'emergency_contact',
-            variables
-        )
-        
-        # También notificar al equipo de emergencias
+        # Mensaje al equipo de emergencias
         emergency_message = f"""
 🚨 EMERGENCIA REPORTADA
 
@@ -634,27 +680,40 @@ Detalles: {details}
 Contactar inmediatamente.
         """
         
-        # Enviar a número de emergencias del equipo
-        whatsapp_service.send_message('+56999990000', emergency_message)
+        # Ambos mensajes van a la cola de emergencias (worker reservado); el
+        # equipo primero
+        with transaction.atomic():
+            deliveries = [
+                outbound.queue_whatsapp(
+                    customer, settings.EMERGENCY_STAFF_WHATSAPP, emergency_message,
+                    'emergency_staff', queue=outbound.EMERGENCY_QUEUE
+                ),
+                outbound.queue_whatsapp(
+                    customer, customer.phone,
+                    whatsapp_service.render_template('emergency_contact', variables, request.LANGUAGE_CODE),
+                    'emergency_contact', queue=outbound.EMERGENCY_QUEUE
+                ),
+            ]
         
         # Crear notificación
-        Notification.objects.create(
-            customer=customer,
-            title="Contacto de emergencia activado",
-            message="Hemos recibido tu solicitud de emergencia. Te contactaremos inmediatamente."
+        queue_notification(
+            customer.pk,
+            "Contacto de emergencia activado",
+            "Hemos recibido tu solicitud de emergencia. Te contactaremos inmediatamente."
         )
         
         return JsonResponse({
             'success': True,
-            'message': 'Emergencia reportada. Te contactaremos en 5 minutos.'
-        })
+            'message': 'Emergencia reportada. Te contactaremos en 5 minutos.',
+            'deliveries': [outbound.delivery_info(message) for message in deliveries]
+        }, status=202)
     
     return JsonResponse({'success': False, 'error': 'Método no permitido'})
 
 @login_required
 def recommendations_view(request):
     """Vista de recomendaciones de lugares"""
-    customer = get_object_or_404(Customer, user=request.user)
+    customer = request.customer
     
     context = {
         'customer': customer,